@@ -8,7 +8,7 @@ from sqlalchemy import text
 from datetime import datetime
 
 from shared_db.models import Hospital, User, HospitalStatus, UserRole, AuditLog
-from shared_db.database import engine
+from shared_db.database import engine, use_tenant_schema
 from shared_db.seed import seed_tenant_defaults
 from admin_app.auth import super_admin_required
 from admin_app.forms import HospitalForm
@@ -391,26 +391,20 @@ def get_tenant_stats(schema_name):
     """
     try:
         with engine.connect() as conn:
-            # Set search path to tenant schema
-            conn.execute(text(f'SET search_path TO "{schema_name}", public'))
-            conn.commit()
+            # raw SQL ไม่ผ่าน schema_translate_map — ระบุ schema ในชื่อตารางเอง
 
             # Count patients
-            result = conn.execute(text('SELECT COUNT(*) FROM patients'))
+            result = conn.execute(text(f'SELECT COUNT(*) FROM "{schema_name}".patients'))
             patient_count = result.scalar() or 0
 
             # Count providers
-            result = conn.execute(text('SELECT COUNT(*) FROM providers'))
+            result = conn.execute(text(f'SELECT COUNT(*) FROM "{schema_name}".providers'))
             provider_count = result.scalar() or 0
 
             # Count appointments
-            result = conn.execute(text('SELECT COUNT(*) FROM appointments'))
+            result = conn.execute(text(f'SELECT COUNT(*) FROM "{schema_name}".appointments'))
             appointment_count = result.scalar() or 0
 
-            # Reset search path
-            conn.execute(text('SET search_path TO public'))
-            conn.commit()
-
             return {
                 'patients': patient_count,
                 'providers': provider_count,
@@ -435,10 +429,9 @@ def view_tenant_audit_logs(tenant_id):
     
     tenant_schema = tenant.schema_name
     
-    # 1. Switch search path to Tenant Schema (+ public for User join)
-    # Using text() for safety, though schema_name comes from our DB.
+    # 1. Route tenant models to the tenant schema (User join stays in public)
     try:
-        g.db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(g.db, tenant_schema)
         
         # 2. Query Audit Logs (ordered by newest first)
         # Limit to 100 for now to avoid overload, can add pagination later
@@ -0,0 +1,12 @@
+"""
+Benchmark ของ booking engine บน tenant สังเคราะห์ (ไม่ต้องใช้ service ภายนอกนอกจาก Postgres ในเครื่อง)
+
+    python -m benchmarks list
+    python -m benchmarks run busy_day many_providers --iterations 50
+    python -m benchmarks run --save-baseline        # บันทึกผลเป็น baseline
+    python -m benchmarks run --compare              # เทียบกับ baseline — exit 1 ถ้าช้าลงเกิน tolerance
+    python -m benchmarks explain                    # EXPLAIN query ของ booking — exit 1 ถ้ามี Seq Scan บนตารางหลัก
+
+รันจากโฟลเดอร์ hospital-booking/ โดยตั้ง DATABASE_URL (หรือ --database-url) ไปที่ Postgres สำหรับทดสอบ
+แต่ละ scenario สร้าง schema tenant_bench_* ชั่วคราวแล้วลบทิ้งเมื่อจบ (--keep-tenant เพื่อเก็บไว้ดู)
+"""
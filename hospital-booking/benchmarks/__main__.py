@@ -0,0 +1,66 @@
+# benchmarks/__main__.py - CLI: python -m benchmarks {list,run,explain}
+
+import argparse
+import os
+import sys
+
+from .scenarios import SCENARIOS
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Booking engine benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="show scenarios")
+
+    run_parser = subparsers.add_parser("run", help="run scenarios (all when none given)")
+    run_parser.add_argument("scenarios", nargs="*", help="scenario names (see list)")
+    run_parser.add_argument("--iterations", type=int, default=30)
+    run_parser.add_argument("--database-url", help="Postgres for the throwaway tenants (default: DATABASE_URL)")
+    run_parser.add_argument("--save-baseline", action="store_true")
+    run_parser.add_argument("--compare", action="store_true", help="exit 1 on regression against the saved baseline")
+    run_parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    run_parser.add_argument("--keep-tenant", action="store_true", help="do not drop the synthetic schema")
+    run_parser.add_argument("--with-cache", action="store_true", help="leave the Redis availability cache enabled")
+
+    explain_parser = subparsers.add_parser("explain", help="fail when booking queries fall back to sequential scans")
+    explain_parser.add_argument("--database-url", help="Postgres for the throwaway tenant (default: DATABASE_URL)")
+    explain_parser.add_argument("--keep-tenant", action="store_true", help="do not drop the synthetic schema")
+    explain_parser.add_argument("--verbose", action="store_true", help="print every statement, not only failures")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, config in SCENARIOS.items():
+            print(f"{name:<16} {config['description']}  [{', '.join(config['operations'])}]")
+        return 0
+
+    if args.command == "run":
+        unknown = [name for name in args.scenarios if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    # ต้องตั้งค่าก่อน import engine / availability_cache (อ่าน env ตอน import)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if not getattr(args, "with_cache", False):
+        os.environ["AVAILABILITY_CACHE_ENABLED"] = "false"
+
+    if args.command == "explain":
+        from .explain import run_explain
+
+        return run_explain(keep_tenant=args.keep_tenant, verbose=args.verbose)
+
+    from .runner import run_scenarios
+
+    return run_scenarios(
+        args.scenarios or list(SCENARIOS),
+        iterations=args.iterations,
+        save=args.save_baseline,
+        check=args.compare,
+        tolerance=args.tolerance,
+        keep_tenant=args.keep_tenant,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# benchmarks/explain.py - EXPLAIN regression check for the booking queries
+
+"""
+รัน endpoint / helper ของ booking.py กับ tenant สังเคราะห์ เก็บ SELECT ทุกตัวที่ส่งถึงฐานข้อมูล
+แล้ว EXPLAIN แต่ละตัวด้วย enable_seqscan = off — ถ้ายังได้ Seq Scan บนตารางใน CHECKED_TABLES
+แปลว่าไม่มี index ที่ใช้กับ predicate นั้นได้ (ตารางเล็กแค่ไหนก็ไม่หลบไป seq scan เอง)
+
+handler ที่ห่อด้วย runs_on_async_session / runs_in_threadpool เรียกผ่าน __wrapped__ บน sync Session (psycopg2)
+statement ที่เก็บได้จึงมี schema ของ tenant และพารามิเตอร์ครบ EXPLAIN ซ้ำได้ทันที
+
+    python -m benchmarks explain            # exit 1 เมื่อพบ seq scan
+"""
+
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import event, text
+
+from shared_db import models
+from shared_db.database import SessionLocal, engine, use_tenant_schema
+
+from fastapi_app.app import booking
+
+from .synthetic import drop_tenant, provision_tenant, slot_starts
+
+# ตารางที่โตตามการใช้งาน — query ที่แตะตารางเหล่านี้ต้องมี index รองรับ
+CHECKED_TABLES = {
+    models.Appointment.__tablename__,
+    models.ProviderSchedule.__tablename__,
+    models.ProviderLeave.__tablename__,
+    models.DateOverride.__tablename__,
+    models.Holiday.__tablename__,
+}
+
+EXPLAIN_SPEC = {
+    'providers': 10,
+    'leaves': 40,
+    'overrides': 30,
+    'appointments_per_day': 40,
+    'appointment_days': 30,
+    'max_advance_days': 120,
+}
+
+_SKIP_PREFIXES = ('SELECT set_config', 'SELECT pg_advisory', 'SELECT count(pg_advisory')
+
+
+class StatementCapture:
+    """เก็บ SELECT ที่ engine (sync) ส่งออกไประหว่าง capture(label)"""
+
+    def __init__(self):
+        self.label = None
+        self.statements: List[Tuple[str, str, object]] = []
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def close(self):
+        event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.label is None or executemany:
+            return
+        stripped = statement.lstrip()
+        if stripped[:6].upper() == 'SELECT' and not stripped.startswith(_SKIP_PREFIXES):
+            self.statements.append((self.label, statement, parameters))
+
+    @contextmanager
+    def capture(self, label: str) -> Iterator[None]:
+        self.label = label
+        try:
+            yield
+        finally:
+            self.label = None
+
+
+def run_operations(tenant: Dict, capture: StatementCapture):
+    """เรียกเส้นทางหลักของ booking.py ครั้งละหนึ่งรอบ (ไม่ commit อะไร)"""
+    subdomain = tenant['subdomain']
+    event_type_id = tenant['event_type_id']
+    busy_date = tenant['busy_date']
+
+    db = SessionLocal()
+    try:
+        use_tenant_schema(db, tenant['schema_name'])
+        with capture.capture('availability'):
+            booking.get_booking_availability.__wrapped__(
+                subdomain=subdomain, event_type_id=event_type_id, date=busy_date.isoformat(), db=db
+            )
+        with capture.capture('availability_range'):
+            booking.get_booking_availability_range.__wrapped__(
+                subdomain=subdomain,
+                event_type_id=event_type_id,
+                start=busy_date.isoformat(),
+                end=(busy_date + timedelta(days=30)).isoformat(),
+                db=db
+            )
+        with capture.capture('next_available'):
+            booking.get_next_available_slots.__wrapped__(
+                subdomain=subdomain, event_type_ids=str(event_type_id), limit=5, db=db
+            )
+        with capture.capture('ensure_slot_capacity'):
+            event_type = db.get(models.EventType, event_type_id)
+            slot_start = slot_starts(busy_date, tenant['duration_minutes'])[0]
+            try:
+                booking.ensure_slot_capacity(
+                    db,
+                    event_type,
+                    event_type.availability_template,
+                    slot_start,
+                    slot_start + timedelta(minutes=event_type.duration_minutes)
+                )
+            except HTTPException:
+                pass  # slot เต็มก็ได้ query ครบเหมือนกัน
+        reference = db.query(models.Appointment.booking_reference).filter(
+            models.Appointment.event_type_id == event_type_id
+        ).limit(1).scalar()
+        with capture.capture('booking_details'):
+            booking.get_booking_details.__wrapped__(subdomain=subdomain, booking_reference=reference, db=db)
+    finally:
+        db.rollback()
+        db.close()
+
+
+def plan_seq_scans(plan: Dict) -> List[str]:
+    """ชื่อตารางใน CHECKED_TABLES ที่ plan อ่านด้วย Seq Scan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in CHECKED_TABLES:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(plan_seq_scans(child))
+    return found
+
+
+def explain_statements(statements: List[Tuple[str, str, object]]) -> List[Dict]:
+    results = []
+    seen = set()
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for label, statement, parameters in statements:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                row = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                plan = (json.loads(row) if isinstance(row, str) else row)[0]['Plan']
+                results.append({
+                    'operation': label,
+                    'statement': statement,
+                    'seq_scans': plan_seq_scans(plan),
+                })
+    return results
+
+
+def analyze_tenant(schema_name: str):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in sorted(CHECKED_TABLES):
+            conn.execute(text(f'ANALYZE "{schema_name}".{table}'))
+
+
+def run_explain(keep_tenant: bool = False, verbose: bool = False) -> int:
+    tenant = provision_tenant(EXPLAIN_SPEC)
+    capture = StatementCapture()
+    try:
+        analyze_tenant(tenant['schema_name'])
+        run_operations(tenant, capture)
+        results = explain_statements(capture.statements)
+    finally:
+        capture.close()
+        if not keep_tenant:
+            drop_tenant(tenant['schema_name'])
+
+    failures = [result for result in results if result['seq_scans']]
+    print(f"EXPLAIN {len(results)} distinct statements from {len({r['operation'] for r in results})} operations")
+    for result in results:
+        if verbose or result['seq_scans']:
+            status = f"SEQ SCAN on {', '.join(sorted(set(result['seq_scans'])))}" if result['seq_scans'] else "ok"
+            print(f"\n[{result['operation']}] {status}\n  {' '.join(result['statement'].split())[:400]}")
+
+    if failures:
+        print(f"\n{len(failures)} statement(s) fall back to sequential scans — add or fix an index (see migrations/add_tenant_indexes.py)")
+        return 1
+    print("all checked tables are read through indexes")
+    return 0
@@ -0,0 +1,348 @@
+# benchmarks/runner.py - Run scenarios in-process and compare against baselines
+
+"""
+ขับ router ของ FastAPI ใน process เดียวกันผ่าน TestClient (ไม่ผ่าน network / uvicorn)
+และนับ SQL ด้วย engine events ทั้ง sync engine และ async engine ของ router
+
+ผลต่อ operation: จำนวนครั้ง, p50/p95/p99 (ms), SQL statement เฉลี่ยต่อครั้ง, status ที่ได้
+baseline เก็บเป็น JSON ที่ benchmarks/baselines/<scenario>.json
+
+scenario ที่ตั้ง background_load วัดขณะที่มี thread ยิง availability_range วนอยู่ตลอด — TestClient ส่งทุก request
+เข้า event loop เดียวกัน (เหมือน uvicorn worker หนึ่งตัว) p95 จึงบอกว่า handler ที่หนักกั้น request อื่นแค่ไหน
+SQL ต่อครั้งรวมของ thread เบื้องหลังจึงไม่บันทึก ('-')
+"""
+
+import json
+import os
+import time as time_module
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, time, timedelta
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from shared_db import models
+from shared_db.async_database import async_engine
+from shared_db.database import SessionLocal, engine, use_tenant_schema
+
+from fastapi_app.app import booking
+from fastapi_app.app.booking import router as booking_router
+from fastapi_app.app.day_availability import AvailabilityWindow, DayAvailability
+
+from .scenarios import DEFAULT_RANGE_DAYS, SCENARIOS
+from .synthetic import drop_tenant, provision_tenant, slot_starts, working_dates
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+class StatementCounter:
+    """นับ SQL statement ที่ส่งถึงฐานข้อมูล (ทุก connection ของทั้งสอง engine)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = Lock()
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_app() -> FastAPI:
+    """แอปขนาดเล็กที่มีเฉพาะ booking router — ไม่สร้างตาราง public / ไม่แตะ Stripe เหมือน main.py"""
+    app = FastAPI(title="booking benchmark")
+    app.include_router(booking_router)
+    return app
+
+
+def slot_matrix_mismatches(day: DayAvailability, slot_bounds: List) -> List[str]:
+    """เทียบ SlotMatrix กับ DayAvailability.available_providers / OccupancyIndex ทีละ slot — คืนรายการที่ไม่ตรง"""
+    matrix = day.slot_matrix(slot_bounds)
+    mismatches = []
+    for index, (slot_start, slot_end) in enumerate(slot_bounds):
+        pool = day.available_providers(slot_start, slot_end)
+        booked = day.occupancy.booked_provider_ids(slot_start, slot_end)
+        expected = {
+            'pool': pool,
+            'count': day.occupancy.count(slot_start, slot_end),
+            'unassigned': day.occupancy.unassigned_count(slot_start, slot_end),
+            'booked_providers': len(booked),
+            'unbooked': [pid for pid in pool if pid not in booked],
+        }
+        actual = {
+            'pool': matrix.pool(index),
+            'count': int(matrix.booked_count[index]),
+            'unassigned': int(matrix.unassigned_count[index]),
+            'booked_providers': int(matrix.booked_provider_count[index]),
+            'unbooked': matrix.unbooked(index),
+        }
+        for field, value in expected.items():
+            if actual[field] != value:
+                mismatches.append(f"{slot_start:%Y-%m-%d %H:%M} {field}: scalar {value} != matrix {actual[field]}")
+    return mismatches
+
+
+class ScenarioRun:
+    def __init__(self, name: str, client: TestClient, counter: StatementCounter, iterations: int):
+        self.name = name
+        self.config = SCENARIOS[name]
+        self.client = client
+        self.counter = counter
+        self.iterations = iterations
+        self.tenant: Optional[Dict] = None
+        self._matrix_db = None
+        self._matrix_input = None
+
+    # --- operations (คืน status code) ---
+
+    def _api(self, path: str) -> str:
+        return f"/api/v1/tenants/{self.tenant['subdomain']}{path}"
+
+    def availability(self, iteration: int) -> int:
+        response = self.client.get(
+            self._api(f"/booking/availability/{self.tenant['event_type_id']}"),
+            params={'date': self.tenant['busy_date'].isoformat()}
+        )
+        return response.status_code
+
+    def availability_range(self, iteration: int) -> int:
+        start = self.tenant['busy_date']
+        end = start + timedelta(days=self.config.get('range_days', DEFAULT_RANGE_DAYS) - 1)
+        response = self.client.get(
+            self._api(f"/booking/availability/{self.tenant['event_type_id']}/range"),
+            params={'start': start.isoformat(), 'end': end.isoformat()}
+        )
+        return response.status_code
+
+    def event_type(self, iteration: int) -> int:
+        response = self.client.get(self._api(f"/event-types/{self.tenant['event_type_id']}"))
+        return response.status_code
+
+    def ensure_slot_capacity(self, iteration: int) -> int:
+        starts = slot_starts(self.tenant['busy_date'], self.tenant['duration_minutes'])
+        slot_start = starts[iteration % len(starts)]
+        db = SessionLocal()
+        try:
+            use_tenant_schema(db, self.tenant['schema_name'])
+            event_type = db.get(models.EventType, self.tenant['event_type_id'])
+            booking.ensure_slot_capacity(
+                db,
+                event_type,
+                event_type.availability_template,
+                slot_start,
+                slot_start + timedelta(minutes=event_type.duration_minutes)
+            )
+            return 200
+        except HTTPException as exc:
+            return exc.status_code
+        finally:
+            db.rollback()
+            db.close()
+
+    def create_booking(self, iteration: int) -> int:
+        # วันหลังช่วงที่มีนัดเดิม — แต่ละ iteration ได้ slot ของตัวเองจนกว่าจะวนครบ
+        spec = self.tenant['spec']
+        dates = working_dates(self.tenant['busy_date'], spec['appointment_days'] + 5)[spec['appointment_days']:]
+        starts = slot_starts(dates[0], self.tenant['duration_minutes'])
+        target_date = dates[(iteration // len(starts)) % len(dates)]
+        slot_start = starts[iteration % len(starts)]
+        response = self.client.post(self._api("/booking/create"), json={
+            'event_type_id': self.tenant['event_type_id'],
+            'date': target_date.isoformat(),
+            'time': slot_start.strftime('%H:%M'),
+            'guest_name': f"Benchmark {iteration}",
+            'guest_phone': '0800000000',
+        })
+        return response.status_code
+
+    def _day_and_slots(self):
+        """DayAvailability ของ busy_date กับ slot ของวัน + slot ที่จบตอน/ข้ามเที่ยงคืน — โหลดครั้งเดียวต่อ scenario"""
+        if self._matrix_input is None:
+            self._matrix_db = SessionLocal()
+            use_tenant_schema(self._matrix_db, self.tenant['schema_name'])
+            event_type = self._matrix_db.get(models.EventType, self.tenant['event_type_id'])
+            target_date = self.tenant['busy_date']
+            window = AvailabilityWindow(
+                self._matrix_db, event_type.id, event_type.availability_template, target_date, target_date
+            )
+            duration = timedelta(minutes=event_type.duration_minutes)
+            next_day = datetime.combine(target_date + timedelta(days=1), time.min)
+            starts = slot_starts(target_date, self.tenant['duration_minutes'])
+            starts += [next_day - duration, next_day - duration / 2]
+            self._matrix_input = (window.day(target_date), [(start, start + duration) for start in starts])
+        return self._matrix_input
+
+    def slot_matrix(self, iteration: int) -> int:
+        day, slot_bounds = self._day_and_slots()
+        if iteration == 0:
+            # warm-up ของ measure() — ตรวจความเท่ากันกับ engine เดิมครั้งเดียว (ไม่รวมในเวลาที่วัด)
+            mismatches = slot_matrix_mismatches(day, slot_bounds)
+            if mismatches:
+                raise AssertionError("SlotMatrix differs from DayAvailability:\n  " + "\n  ".join(mismatches[:20]))
+        day.slot_matrix(slot_bounds)
+        return 200
+
+    def slot_scalar(self, iteration: int) -> int:
+        """คำถามชุดเดียวกับ slot_matrix แต่ถามทีละ slot ผ่าน DayAvailability / OccupancyIndex"""
+        day, slot_bounds = self._day_and_slots()
+        answers = []
+        for slot_start, slot_end in slot_bounds:
+            pool = day.available_providers(slot_start, slot_end)
+            booked = day.occupancy.booked_provider_ids(slot_start, slot_end)
+            answers.append((
+                pool,
+                day.occupancy.count(slot_start, slot_end),
+                day.occupancy.unassigned_count(slot_start, slot_end),
+                [pid for pid in pool if pid not in booked],
+            ))
+        return 200
+
+    # --- run ---
+
+    @contextmanager
+    def background_load(self, threads: int):
+        """threads ตัวเรียก availability_range ซ้ำจนกว่าจะออกจาก block"""
+        stop = Event()
+
+        def keep_busy():
+            while not stop.is_set():
+                self.availability_range(0)
+
+        workers = [Thread(target=keep_busy, daemon=True) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    def measure(self, operation: Callable[[int], int], count_sql: bool = True) -> Dict:
+        operation(0)  # warm-up (import, connection pool, mapper configuration)
+        latencies, statements, statuses = [], [], {}
+        for iteration in range(1, self.iterations + 1):
+            before = self.counter.count
+            started = time_module.perf_counter()
+            status = operation(iteration)
+            latencies.append(time_module.perf_counter() - started)
+            statements.append(self.counter.count - before)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'iterations': len(latencies),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'sql_per_call': round(sum(statements) / len(statements), 1) if count_sql else None,
+            'statuses': statuses,
+        }
+
+    def run(self, keep_tenant: bool = False) -> Dict:
+        self.tenant = provision_tenant(self.config['spec'])
+        load = self.config.get('background_load', 0)
+        try:
+            with self.background_load(load) if load else nullcontext():
+                return {
+                    operation: self.measure(getattr(self, operation), count_sql=not load)
+                    for operation in self.config['operations']
+                }
+        finally:
+            if self._matrix_db is not None:
+                self._matrix_db.close()
+            if not keep_tenant:
+                drop_tenant(self.tenant['schema_name'])
+
+
+# --- baselines ---
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, results: Dict):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w', encoding='utf-8') as handle:
+        json.dump({'recorded_at': datetime.now().isoformat(timespec='seconds'), 'results': results}, handle, indent=2)
+
+
+def load_baseline(name: str) -> Optional[Dict]:
+    try:
+        with open(baseline_path(name), encoding='utf-8') as handle:
+            return json.load(handle)['results']
+    except FileNotFoundError:
+        return None
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """รายการ regression: p95 ช้าลงเกิน tolerance หรือ SQL ต่อครั้งเพิ่มขึ้น"""
+    regressions = []
+    for operation, current in results.items():
+        previous = baseline.get(operation)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{operation}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['sql_per_call'] is None or previous['sql_per_call'] is None:
+            continue
+        if current['sql_per_call'] > previous['sql_per_call']:
+            regressions.append(f"{operation}: SQL/call {previous['sql_per_call']} -> {current['sql_per_call']}")
+    return regressions
+
+
+def print_results(name: str, results: Dict, baseline: Optional[Dict] = None):
+    print(f"\n=== {name} — {SCENARIOS[name]['description']}")
+    print(f"{'operation':<22}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/call':>10}  statuses")
+    for operation, result in results.items():
+        line = (
+            f"{operation:<22}{result['iterations']:>5}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['sql_per_call'] if result['sql_per_call'] is not None else '-':>10}"
+            f"  {result['statuses']}"
+        )
+        previous = (baseline or {}).get(operation)
+        if previous:
+            line += f"  (baseline p95 {previous['p95_ms']}ms, SQL {previous['sql_per_call']})"
+        print(line)
+
+
+def run_scenarios(
+    names: List[str],
+    iterations: int,
+    save: bool = False,
+    check: bool = False,
+    tolerance: float = 0.2,
+    keep_tenant: bool = False
+) -> int:
+    counter = StatementCounter()
+    regressions = []
+    with TestClient(build_app()) as client:
+        for name in names:
+            results = ScenarioRun(name, client, counter, iterations).run(keep_tenant=keep_tenant)
+            baseline = load_baseline(name)
+            print_results(name, results, baseline)
+            if check:
+                if baseline is None:
+                    print(f"  (no baseline for {name} — run with --save-baseline first)")
+                else:
+                    regressions.extend(f"{name}/{item}" for item in compare(results, baseline, tolerance))
+            if save:
+                save_baseline(name, results)
+                print(f"  baseline saved: {baseline_path(name)}")
+
+    if regressions:
+        print("\nREGRESSIONS:")
+        for item in regressions:
+            print(f"  - {item}")
+        return 1
+    return 0
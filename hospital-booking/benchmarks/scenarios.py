@@ -0,0 +1,96 @@
+# benchmarks/scenarios.py - Benchmark scenarios
+
+"""
+แต่ละ scenario = spec ของ tenant สังเคราะห์ (ดู synthetic.py) + รายการ operation ที่จะวัด
+
+operation:
+    availability          GET /booking/availability/{id}?date=busy_date
+    availability_range    GET /booking/availability/{id}/range (range_days วันนับจาก busy_date)
+    ensure_slot_capacity  เรียก booking.ensure_slot_capacity ตรง ๆ กับ slot ของ busy_date (rollback ทุกครั้ง)
+    create_booking        POST /booking/create วนไปตาม slot ของวันในช่วงที่ไม่มีนัดเดิม
+    event_type            GET /event-types/{id} (อ่านฐานข้อมูลอย่างเดียว)
+    slot_matrix           SlotMatrix.build ของ busy_date (รวม slot ที่จบตอน/ข้ามเที่ยงคืน) — รอบ warm-up
+                          ตรวจว่า pool / count / unassigned / unbooked เท่ากับ DayAvailability ทุก slot (ไม่เท่า = error)
+    slot_scalar           คำถามชุดเดียวกันทีละ slot ผ่าน DayAvailability / OccupancyIndex (ไว้เทียบเวลา)
+
+background_load = จำนวน thread ที่ยิง availability_range ตลอดการวัด (ดู runner.py)
+"""
+
+SCENARIOS = {
+    'baseline': {
+        'description': "tenant ขนาดเล็กตาม DEFAULT_SPEC",
+        'spec': {},
+        'operations': ['availability', 'availability_range', 'ensure_slot_capacity', 'create_booking'],
+    },
+    'busy_day': {
+        'description': "วันที่มีนัดแน่น — 10 provider, 150 นัดต่อวัน",
+        'spec': {
+            'providers': 10,
+            'appointments_per_day': 150,
+            'appointment_days': 5,
+            'rooms': 12,
+        },
+        'operations': ['availability', 'ensure_slot_capacity', 'create_booking'],
+    },
+    'many_providers': {
+        'description': "provider จำนวนมากที่มีหลายกะและวันลา",
+        'spec': {
+            'providers': 80,
+            'schedules_per_provider': 3,
+            'leaves': 60,
+            'appointments_per_day': 200,
+            'appointment_days': 5,
+            'rooms': 40,
+        },
+        'operations': ['availability', 'availability_range', 'ensure_slot_capacity'],
+    },
+    'long_horizon': {
+        'description': "max_advance_days ยาว (1 ปี) พร้อม override และนัดกระจายทั้งช่วง",
+        'spec': {
+            'providers': 8,
+            'overrides': 40,
+            'leaves': 30,
+            'appointments_per_day': 40,
+            'appointment_days': 120,
+            'max_advance_days': 365,
+        },
+        'operations': ['availability', 'availability_range'],
+        'range_days': 62,
+    },
+    'slot_inventory': {
+        'description': "busy_day บน tenant ที่เปิด slot_inventory",
+        'spec': {
+            'providers': 10,
+            'appointments_per_day': 150,
+            'appointment_days': 5,
+            'rooms': 12,
+            'slot_inventory': True,
+        },
+        'operations': ['availability', 'create_booking'],
+    },
+    'slot_matrix': {
+        'description': "SlotMatrix เทียบกับ engine ทีละ slot — provider จำนวนมาก หลายกะ และวันลา",
+        'spec': {
+            'providers': 80,
+            'schedules_per_provider': 3,
+            'leaves': 60,
+            'appointments_per_day': 200,
+            'appointment_days': 5,
+            'rooms': 40,
+        },
+        'operations': ['slot_matrix', 'slot_scalar'],
+    },
+    'concurrency': {
+        'description': "GET เบา ๆ และ availability ขณะที่ 8 request ของ availability_range ทำงานพร้อมกัน",
+        'spec': {
+            'providers': 10,
+            'appointments_per_day': 150,
+            'appointment_days': 5,
+            'rooms': 12,
+        },
+        'operations': ['event_type', 'availability'],
+        'background_load': 8,
+    },
+}
+
+DEFAULT_RANGE_DAYS = 31
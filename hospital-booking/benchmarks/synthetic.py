@@ -0,0 +1,215 @@
+# benchmarks/synthetic.py - Throwaway tenant schemas for benchmarks
+
+"""
+สร้าง tenant schema ชั่วคราว (tenant_bench_xxxxxx) พร้อมข้อมูลตามขนาดที่กำหนดใน spec
+
+spec (dict) — ค่าที่ไม่ระบุใช้ DEFAULT_SPEC:
+    providers               จำนวนเจ้าหน้าที่ใน template
+    schedules_per_provider  จำนวน ProviderSchedule ต่อคน (แถวแรก = ทำงาน จ-ศ ทั้งวัน ที่เหลือเป็นกะ custom)
+    leaves                  จำนวนวันลา (กระจายในช่วง horizon)
+    overrides               จำนวน DateOverride แบบปรับเวลา (ไม่ปิดทั้งวัน)
+    appointments_per_day    นัด confirmed ต่อวันทำการ
+    appointment_days        จำนวนวันทำการแรกที่มีนัด
+    max_advance_days        horizon ของ event type
+    duration_minutes        ความยาว slot
+    rooms                   ResourceCapacity.available_rooms
+    slot_inventory          สร้างตาราง slot_inventory (เปิดใช้ inventory) ด้วยหรือไม่
+
+วันแรกที่มีนัด (busy_date) คือวันทำการถัดจากพรุ่งนี้ — เลยช่วง min notice แน่นอน
+"""
+
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import insert, text
+
+from shared_db import models
+from shared_db.database import SessionLocal, use_tenant_schema
+
+DEFAULT_SPEC = {
+    'providers': 5,
+    'schedules_per_provider': 1,
+    'leaves': 2,
+    'overrides': 2,
+    'appointments_per_day': 20,
+    'appointment_days': 10,
+    'max_advance_days': 60,
+    'duration_minutes': 30,
+    'rooms': 10,
+    'slot_inventory': False,
+}
+
+WORK_START = time(8, 30)
+WORK_END = time(16, 30)
+WORKING_DAYS = [
+    models.DayOfWeek.MONDAY,
+    models.DayOfWeek.TUESDAY,
+    models.DayOfWeek.WEDNESDAY,
+    models.DayOfWeek.THURSDAY,
+    models.DayOfWeek.FRIDAY,
+]
+
+
+def working_dates(start: date, count: int) -> List[date]:
+    """วันจันทร์-ศุกร์ count วันนับจาก start"""
+    dates = []
+    current = start
+    while len(dates) < count:
+        if current.weekday() < 5:
+            dates.append(current)
+        current += timedelta(days=1)
+    return dates
+
+
+def slot_starts(target_date: date, duration_minutes: int) -> List[datetime]:
+    starts = []
+    current = datetime.combine(target_date, WORK_START)
+    end = datetime.combine(target_date, WORK_END)
+    while current + timedelta(minutes=duration_minutes) <= end:
+        starts.append(current)
+        current += timedelta(minutes=duration_minutes)
+    return starts
+
+
+def _tenant_tables(with_inventory: bool):
+    return [
+        table for table in models.TenantBase.metadata.sorted_tables
+        if with_inventory or table is not models.SlotInventory.__table__
+    ]
+
+
+def provision_tenant(spec: Dict = None) -> Dict:
+    """สร้าง schema และข้อมูลสังเคราะห์ — คืน dict ที่ scenario ใช้อ้างอิง (subdomain, id ต่าง ๆ, วันที่)"""
+    spec = {**DEFAULT_SPEC, **(spec or {})}
+    subdomain = f"bench_{uuid.uuid4().hex[:8]}"
+    schema_name = f"tenant_{subdomain}"
+    duration = spec['duration_minutes']
+
+    db = SessionLocal()
+    try:
+        db.execute(text(f'CREATE SCHEMA "{schema_name}"'))
+        use_tenant_schema(db, schema_name)
+        models.TenantBase.metadata.create_all(bind=db.connection(), tables=_tenant_tables(spec['slot_inventory']))
+
+        template = models.AvailabilityTemplate(
+            name="Benchmark",
+            template_type='dedicated',
+            max_concurrent_slots=spec['rooms'],
+            requires_provider_assignment=True,
+        )
+        db.add(template)
+        db.flush()
+
+        for day in WORKING_DAYS:
+            db.add(models.Availability(template_id=template.id, day_of_week=day, start_time=WORK_START, end_time=WORK_END))
+        db.add(models.ResourceCapacity(template_id=template.id, available_rooms=spec['rooms']))
+
+        event_type = models.EventType(
+            name="Benchmark visit",
+            slug=f"bench-{uuid.uuid4().hex[:6]}",
+            duration_minutes=duration,
+            template_id=template.id,
+            min_notice_hours=0,
+            max_advance_days=spec['max_advance_days'],
+        )
+        db.add(event_type)
+
+        today = date.today()
+        providers = [
+            models.Provider(name=f"Provider {index + 1}", department="Benchmark")
+            for index in range(spec['providers'])
+        ]
+        db.add_all(providers)
+        db.flush()
+        provider_ids = [provider.id for provider in providers]
+        template_id, event_type_id = template.id, event_type.id
+
+        for priority, provider_id in enumerate(provider_ids):
+            db.add(models.TemplateProvider(
+                template_id=template_id, provider_id=provider_id, can_auto_assign=True, priority=priority
+            ))
+            for index in range(spec['schedules_per_provider']):
+                custom = index > 0
+                db.add(models.ProviderSchedule(
+                    provider_id=provider_id,
+                    template_id=template_id,
+                    effective_date=today,
+                    days_of_week=[day.value for day in WORKING_DAYS],
+                    custom_start_time=time(8 + index % 4, 30) if custom else None,
+                    custom_end_time=time(12 + index % 4, 30) if custom else None,
+                    schedule_type='temporary' if custom else 'regular',
+                ))
+
+        horizon = working_dates(today + timedelta(days=2), max(1, spec['max_advance_days'] * 5 // 7 - 2))
+        for index in range(spec['leaves']):
+            leave_date = horizon[(index * 7 + 3) % len(horizon)]
+            db.add(models.ProviderLeave(
+                provider_id=provider_ids[index % len(provider_ids)],
+                start_date=leave_date,
+                end_date=leave_date,
+                leave_type='vacation',
+                is_approved=True,
+            ))
+        for index in range(spec['overrides']):
+            db.add(models.DateOverride(
+                date=horizon[(index * 5 + 2) % len(horizon)],
+                template_id=template_id,
+                custom_start_time=time(9, 0),
+                custom_end_time=time(15, 0),
+                reason="benchmark",
+            ))
+
+        appointment_dates = working_dates(today + timedelta(days=2), spec['appointment_days'])
+        rows = []
+        for target_date in appointment_dates:
+            starts = slot_starts(target_date, duration)
+            for index in range(spec['appointments_per_day']):
+                start = starts[index % len(starts)]
+                # provider ไม่ซ้ำกันใน slot เดียวกัน (exclusion constraint) — เกินจำนวน provider เป็นนัดที่ยังไม่มี provider
+                provider_round = index // len(starts)
+                rows.append({
+                    'provider_id': provider_ids[provider_round] if provider_round < len(provider_ids) else None,
+                    'event_type_id': event_type_id,
+                    'start_time': start,
+                    'end_time': start + timedelta(minutes=duration),
+                    'booking_reference': f"BN-{uuid.uuid4().hex[:10].upper()}",
+                    'status': 'confirmed',
+                    'guest_name': f"Guest {index}",
+                    'guest_phone': '0800000000',
+                })
+        if rows:
+            db.execute(insert(models.Appointment.__table__), rows)
+
+        db.commit()
+
+        if spec['slot_inventory']:
+            from fastapi_app.app.inventory_builder import regenerate_slot_inventory
+            regenerate_slot_inventory(db, subdomain)
+
+        return {
+            'subdomain': subdomain,
+            'schema_name': schema_name,
+            'template_id': template_id,
+            'event_type_id': event_type_id,
+            'provider_ids': provider_ids,
+            'duration_minutes': duration,
+            'busy_date': appointment_dates[0] if appointment_dates else horizon[0],
+            'horizon': horizon,
+            'spec': spec,
+        }
+    except Exception:
+        db.rollback()
+        drop_tenant(schema_name)
+        raise
+    finally:
+        db.close()
+
+
+def drop_tenant(schema_name: str):
+    db = SessionLocal()
+    try:
+        db.execute(text(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE'))
+        db.commit()
+    finally:
+        db.close()
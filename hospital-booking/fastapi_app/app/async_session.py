@@ -0,0 +1,113 @@
+# fastapi_app/app/async_session.py - Async tenant session for the FastAPI routers
+
+"""
+ให้ handler ของ router ทำงานบน AsyncSession (asyncpg) โดยไม่ block event loop
+
+handler ในโปรเจกต์นี้เขียน ORM แบบ sync (db.query(...)) และใช้ helper ร่วมกับ Flask/สคริปต์
+จึงไม่เขียนใหม่เป็น select() ทั้งหมด แต่รันโค้ดเดิมผ่าน AsyncSession.run_sync:
+โค้ด sync ทำงานใน greenlet และทุกครั้งที่รอฐานข้อมูลจะคืน event loop ให้ request อื่น
+จำนวน request ที่ทำงานพร้อมกันจึงขึ้นกับ connection pool ไม่ใช่จำนวน worker/thread
+
+    @router.get("/...")
+    @runs_on_async_session
+    def handler(subdomain: str, ..., db: Session = AsyncTenantDB):
+        ...  # โค้ด sync เดิม — db คือ sync Session ที่ผูกกับ AsyncSession ของ request
+
+ข้อจำกัด: run_sync คืน event loop เฉพาะตอนรอฐานข้อมูล — งาน CPU (คำนวณ slot / NumPy) และการเรียก
+Redis แบบ sync (availability_cache, tenant_calendar, template_snapshots, slot_inventory) ยังทำงานบน
+thread ของ event loop และหยุด request อื่นทั้งหมดของ worker ระหว่างนั้น handler เหล่านี้
+(ทุก endpoint ที่เขียนข้อมูล และ GET ที่คำนวณ availability) จึงใช้ runs_in_threadpool แทน:
+
+    @router.post("/...")
+    @runs_in_threadpool
+    def handler(subdomain: str, ..., db: Session = SyncTenantDB):
+        ...  # รันใน threadpool ของ FastAPI บน sync engine (psycopg2) เหมือนก่อนย้ายมา async
+
+runs_on_async_session เหลือไว้สำหรับ GET ที่อ่านฐานข้อมูลอย่างเดียว
+"""
+
+import functools
+import inspect
+from typing import AsyncIterator, Iterator
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from shared_db.async_database import AsyncSessionLocal
+from shared_db.database import SessionLocal, use_tenant_schema
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def get_async_tenant_session(
+    subdomain: str,
+    session: AsyncSession = Depends(get_async_session)
+) -> AsyncIterator[AsyncSession]:
+    """AsyncSession ที่ผูกกับ tenant schema แล้ว (schema_translate_map — ดู shared_db/database.py)"""
+    use_tenant_schema(session.sync_session, f"tenant_{subdomain}")
+    yield session
+
+
+# default ของพารามิเตอร์ db ใน handler ที่ห่อด้วย runs_on_async_session
+AsyncTenantDB = Depends(get_async_tenant_session)
+
+
+def runs_on_async_session(handler):
+    """แปลง handler แบบ sync ที่รับ ``db`` ให้เป็น endpoint async บน get_async_tenant_session
+
+    FastAPI เห็น signature เดิม (path/query/body/BackgroundTasks) แต่ ``db`` ถูกแทนด้วย
+    dependency แบบ async และ handler ถูกเรียกผ่าน run_sync พร้อม sync Session ของ request นั้น
+    """
+    signature = inspect.signature(handler)
+    parameters = [
+        param.replace(default=AsyncTenantDB, annotation=AsyncSession)
+        if name == 'db' else param
+        for name, param in signature.parameters.items()
+    ]
+
+    @functools.wraps(handler)
+    async def endpoint(*args, **kwargs):
+        async_db: AsyncSession = kwargs.pop('db')
+        return await async_db.run_sync(lambda sync_db: handler(*args, db=sync_db, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
+
+
+def get_sync_tenant_session(subdomain: str) -> Iterator[Session]:
+    """sync Session (psycopg2) ที่ผูกกับ tenant schema — FastAPI เปิด/ปิดใน threadpool"""
+    db = SessionLocal()
+    try:
+        use_tenant_schema(db, f"tenant_{subdomain}")
+        yield db
+    finally:
+        db.close()
+
+
+# default ของพารามิเตอร์ db ใน handler ที่ห่อด้วย runs_in_threadpool
+SyncTenantDB = Depends(get_sync_tenant_session)
+
+
+def runs_in_threadpool(handler):
+    """handler แบบ sync ที่ใช้ CPU หรือเรียก Redis/HTTP แบบ sync: คงเป็น ``def`` ธรรมดาบน get_sync_tenant_session
+
+    FastAPI รัน endpoint ที่เป็น ``def`` ใน threadpool จึงไม่ block event loop — ``db`` ถูกแทนด้วย
+    dependency แบบ sync (ระบุ AsyncTenantDB ไว้เดิมก็ได้) และ __wrapped__ ยังชี้ handler ให้ service_layer
+    """
+    signature = inspect.signature(handler)
+    parameters = [
+        param.replace(default=SyncTenantDB, annotation=Session)
+        if name == 'db' else param
+        for name, param in signature.parameters.items()
+    ]
+
+    @functools.wraps(handler)
+    def endpoint(*args, **kwargs):
+        return handler(*args, **kwargs)
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
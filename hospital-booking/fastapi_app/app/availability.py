@@ -1,10 +1,10 @@
 # fastapi_app/app/availability.py - Fixed version with template support
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from pydantic import BaseModel, Field, validator, model_validator
-from typing import List, Optional, Dict, Tuple, Any, Set
+from typing import List, Literal, Optional, Dict, Tuple, Any, Set
 import sys
 import datetime
 from datetime import time
@@ -12,8 +12,19 @@ import uuid
 from threading import Lock
 
 # Import database and models
-from shared_db.database import SessionLocal
 from shared_db import models
+from shared_db.database import use_tenant_schema
+from shared_db.availability_cache import availability_cache
+
+from .async_session import AsyncTenantDB, SyncTenantDB, runs_in_threadpool, runs_on_async_session
+from .tenant_calendar import tenant_calendar
+from .template_snapshot import template_snapshots
+from .inventory_builder import (
+    disable_slot_inventory,
+    enable_slot_inventory,
+    refresh_slot_inventory,
+    regenerate_slot_inventory,
+)
 
 router = APIRouter(prefix="/api/v1/tenants/{subdomain}", tags=["availability"])
 
@@ -21,21 +32,10 @@ _date_override_initialized: Set[str] = set()
 _date_override_lock = Lock()
 
 # --- Dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_tenant_db(subdomain: str, db: Session):
-    """Set database search path to tenant schema"""
-    schema_name = f"tenant_{subdomain}"
-    try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
-        return db
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Tenant not found: {subdomain}")
+    """Route tenant models of this session to the tenant schema"""
+    use_tenant_schema(db, f"tenant_{subdomain}")
+    return db
 
 
 def ensure_date_override_table(subdomain: str, db: Session):
@@ -45,10 +45,13 @@ def ensure_date_override_table(subdomain: str, db: Session):
             return
 
         try:
-            exists = db.execute(text("SELECT to_regclass('date_overrides')")).scalar()
+            exists = db.execute(
+                text("SELECT to_regclass(:table_name)"),
+                {"table_name": f'"tenant_{subdomain}".date_overrides'}
+            ).scalar()
             if not exists:
                 # db.connection() ไม่ใช่ get_bind() — ให้ CREATE TABLE ใช้ connection
-                # เดียวกับที่ SET search_path ไว้ ไม่งั้นตารางไปโผล่ public schema
+                # ที่มี schema_translate_map ของ tenant ไม่งั้นตารางไปโผล่ public schema
                 models.DateOverride.__table__.create(bind=db.connection(), checkfirst=True)
                 db.commit()
         except Exception:
@@ -296,6 +299,11 @@ class ProviderResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SlotInventoryRebuild(BaseModel):
+    template_id: Optional[int] = None
+    start_date: Optional[str] = None  # YYYY-MM-DD
+    end_date: Optional[str] = None
+
 def parse_time(time_str: str) -> time:
     try:
         hour, minute = map(int, time_str.split(':'))
@@ -373,7 +381,8 @@ def get_or_create_default_template(db: Session) -> int:
 # --- API Endpoints ---
 
 @router.get("/availability", response_model=dict)
-async def get_availability(subdomain: str, db: Session = Depends(get_db)):
+@runs_on_async_session
+def get_availability(subdomain: str, db: Session = AsyncTenantDB):
     """Get all availability records (backward compatibility)"""
     try:
         get_tenant_db(subdomain, db)
@@ -403,7 +412,8 @@ async def get_availability(subdomain: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/availability/single", response_model=dict)
-async def create_single_availability(subdomain: str, availability_data: AvailabilityCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_single_availability(subdomain: str, availability_data: AvailabilityCreate, db: Session = SyncTenantDB):
     """Create single availability slot (backward compatibility)"""
     try:
         get_tenant_db(subdomain, db)
@@ -429,6 +439,8 @@ async def create_single_availability(subdomain: str, availability_data: Availabi
         
         db.add(availability)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, availability.template_id)
         db.refresh(availability)
         
         return {
@@ -453,7 +465,8 @@ async def create_single_availability(subdomain: str, availability_data: Availabi
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/availability", response_model=dict)
-async def create_availability(subdomain: str, schedule_data: WeeklySchedule, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_availability(subdomain: str, schedule_data: WeeklySchedule, db: Session = SyncTenantDB):
     """Create availability template with weekly schedule"""
     try:
         get_tenant_db(subdomain, db)
@@ -520,6 +533,8 @@ async def create_availability(subdomain: str, schedule_data: WeeklySchedule, db:
                 created_ids.append(availability.id)
         
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template.id)
         
         # Return response with information about any name changes
         response = {
@@ -551,7 +566,8 @@ async def create_availability(subdomain: str, schedule_data: WeeklySchedule, db:
             raise HTTPException(status_code=500, detail=f"Database error: {error_msg}")
 
 @router.put("/availability/templates/{template_id}", response_model=dict)
-async def update_availability_template(subdomain: str, template_id: int, schedule_data: WeeklySchedule, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_availability_template(subdomain: str, template_id: int, schedule_data: WeeklySchedule, db: Session = SyncTenantDB):
     """Update an entire availability template"""
     try:
         get_tenant_db(subdomain, db)
@@ -597,6 +613,9 @@ async def update_availability_template(subdomain: str, template_id: int, schedul
                 db.add(availability)
         
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
+        refresh_slot_inventory(db, subdomain, template_ids=[template_id])
         return {"message": f"Template '{schedule_data.name}' updated successfully"}
         
     except Exception as e:
@@ -604,7 +623,8 @@ async def update_availability_template(subdomain: str, template_id: int, schedul
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/availability/templates/{template_id}")
-async def delete_availability_template(subdomain: str, template_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_availability_template(subdomain: str, template_id: int, db: Session = SyncTenantDB):
     """Delete an entire availability template"""
     try:
         get_tenant_db(subdomain, db)
@@ -639,6 +659,10 @@ async def delete_availability_template(subdomain: str, template_id: int, db: Ses
             # ลบ template (cascade จะลบ availabilities และ date_overrides)
             db.delete(template)
             db.commit()
+            availability_cache.invalidate_tenant(subdomain)
+            tenant_calendar.invalidate(subdomain)
+            template_snapshots.invalidate(subdomain, template_id)
+            refresh_slot_inventory(db, subdomain, template_ids=[default_template_id])
             
             return {
                 "message": f"Template '{template_name}' deleted successfully",
@@ -648,6 +672,9 @@ async def delete_availability_template(subdomain: str, template_id: int, db: Ses
             # ลบ template ได้เลย
             db.delete(template)
             db.commit()
+            availability_cache.invalidate_tenant(subdomain)
+            tenant_calendar.invalidate(subdomain)
+            template_snapshots.invalidate(subdomain, template_id)
             return {"message": f"Template '{template_name}' deleted successfully"}
         
     except Exception as e:
@@ -656,7 +683,8 @@ async def delete_availability_template(subdomain: str, template_id: int, db: Ses
 
 
 @router.get("/availability/templates", response_model=dict)
-async def get_availability_templates(subdomain: str, db: Session = Depends(get_db)):
+@runs_on_async_session
+def get_availability_templates(subdomain: str, db: Session = AsyncTenantDB):
     """Get all availability templates"""
     try:
         get_tenant_db(subdomain, db)
@@ -693,7 +721,8 @@ async def get_availability_templates(subdomain: str, db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/availability/template/{template_id}/details", response_model=dict)
-async def get_availability_template_details(subdomain: str, template_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def get_availability_template_details(subdomain: str, template_id: int, db: Session = AsyncTenantDB):
     """Get detailed schedule for a specific template"""
     try:
         get_tenant_db(subdomain, db)
@@ -791,7 +820,8 @@ async def get_availability_template_details(subdomain: str, template_id: int, db
 # --- Template Provider Assignments ---
 
 @router.get("/availability/templates/{template_id}/providers", response_model=dict)
-async def list_template_providers(subdomain: str, template_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def list_template_providers(subdomain: str, template_id: int, db: Session = AsyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -823,7 +853,8 @@ async def list_template_providers(subdomain: str, template_id: int, db: Session
 
 
 @router.post("/availability/templates/{template_id}/providers", response_model=dict)
-async def add_template_provider(subdomain: str, template_id: int, payload: TemplateProviderCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def add_template_provider(subdomain: str, template_id: int, payload: TemplateProviderCreate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -852,6 +883,8 @@ async def add_template_provider(subdomain: str, template_id: int, payload: Templ
         )
         db.add(assignment)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
         db.refresh(assignment)
 
         return {
@@ -866,7 +899,8 @@ async def add_template_provider(subdomain: str, template_id: int, payload: Templ
 
 
 @router.patch("/availability/templates/{template_id}/providers/{provider_id}", response_model=dict)
-async def update_template_provider(subdomain: str, template_id: int, provider_id: int, payload: TemplateProviderUpdate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_template_provider(subdomain: str, template_id: int, provider_id: int, payload: TemplateProviderUpdate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -886,6 +920,8 @@ async def update_template_provider(subdomain: str, template_id: int, provider_id
             assignment.priority = payload.priority
 
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
 
         return {"message": "Assignment updated"}
     except HTTPException:
@@ -896,7 +932,8 @@ async def update_template_provider(subdomain: str, template_id: int, provider_id
 
 
 @router.delete("/availability/templates/{template_id}/providers/{provider_id}", response_model=dict)
-async def remove_template_provider(subdomain: str, template_id: int, provider_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def remove_template_provider(subdomain: str, template_id: int, provider_id: int, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -910,6 +947,8 @@ async def remove_template_provider(subdomain: str, template_id: int, provider_id
 
         db.delete(assignment)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
 
         return {"message": "Provider removed from template"}
     except HTTPException:
@@ -922,7 +961,8 @@ async def remove_template_provider(subdomain: str, template_id: int, provider_id
 # --- Provider Schedules ---
 
 @router.get("/availability/templates/{template_id}/schedules", response_model=dict)
-async def list_provider_schedules(subdomain: str, template_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def list_provider_schedules(subdomain: str, template_id: int, db: Session = AsyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -953,7 +993,8 @@ async def list_provider_schedules(subdomain: str, template_id: int, db: Session
 
 
 @router.post("/availability/templates/{template_id}/schedules", response_model=dict)
-async def create_provider_schedule(subdomain: str, template_id: int, payload: ProviderScheduleCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_provider_schedule(subdomain: str, template_id: int, payload: ProviderScheduleCreate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -979,11 +1020,17 @@ async def create_provider_schedule(subdomain: str, template_id: int, payload: Pr
         )
         db.add(schedule)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
         db.refresh(schedule)
+        schedule_id = schedule.id
+        refresh_slot_inventory(
+            db, subdomain, template_ids=[template_id],
+            start_date=schedule.effective_date, end_date=schedule.end_date
+        )
 
         return {
             "message": "Provider schedule created",
-            "schedule_id": schedule.id
+            "schedule_id": schedule_id
         }
     except HTTPException:
         raise
@@ -993,7 +1040,8 @@ async def create_provider_schedule(subdomain: str, template_id: int, payload: Pr
 
 
 @router.patch("/availability/templates/{template_id}/schedules/{schedule_id}", response_model=dict)
-async def update_provider_schedule(subdomain: str, template_id: int, schedule_id: int, payload: ProviderScheduleUpdate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_provider_schedule(subdomain: str, template_id: int, schedule_id: int, payload: ProviderScheduleUpdate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1001,6 +1049,8 @@ async def update_provider_schedule(subdomain: str, template_id: int, schedule_id
         if not schedule:
             raise HTTPException(status_code=404, detail="Schedule not found")
 
+        previous_range = (schedule.effective_date, schedule.end_date)
+
         if payload.effective_date:
             schedule.effective_date = parse_date(payload.effective_date)
         if payload.end_date is not None:
@@ -1022,7 +1072,17 @@ async def update_provider_schedule(subdomain: str, template_id: int, schedule_id
         if payload.notes is not None:
             schedule.notes = payload.notes
 
+        affected_start = min(previous_range[0], schedule.effective_date)
+        affected_end = None
+        if previous_range[1] and schedule.end_date:
+            affected_end = max(previous_range[1], schedule.end_date)
+
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        refresh_slot_inventory(
+            db, subdomain, template_ids=[template_id],
+            start_date=affected_start, end_date=affected_end
+        )
 
         return {"message": "Schedule updated"}
     except HTTPException:
@@ -1033,7 +1093,8 @@ async def update_provider_schedule(subdomain: str, template_id: int, schedule_id
 
 
 @router.delete("/availability/templates/{template_id}/schedules/{schedule_id}", response_model=dict)
-async def delete_provider_schedule(subdomain: str, template_id: int, schedule_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_provider_schedule(subdomain: str, template_id: int, schedule_id: int, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1041,8 +1102,14 @@ async def delete_provider_schedule(subdomain: str, template_id: int, schedule_id
         if not schedule:
             raise HTTPException(status_code=404, detail="Schedule not found")
 
+        affected_start, affected_end = schedule.effective_date, schedule.end_date
         db.delete(schedule)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        refresh_slot_inventory(
+            db, subdomain, template_ids=[template_id],
+            start_date=affected_start, end_date=affected_end
+        )
 
         return {"message": "Schedule deleted"}
     except HTTPException:
@@ -1055,7 +1122,8 @@ async def delete_provider_schedule(subdomain: str, template_id: int, schedule_id
 # --- Resource Capacity Rules ---
 
 @router.get("/availability/templates/{template_id}/capacities", response_model=dict)
-async def list_resource_capacities(subdomain: str, template_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def list_resource_capacities(subdomain: str, template_id: int, db: Session = AsyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1083,7 +1151,8 @@ async def list_resource_capacities(subdomain: str, template_id: int, db: Session
 
 
 @router.post("/availability/templates/{template_id}/capacities", response_model=dict)
-async def create_resource_capacity(subdomain: str, template_id: int, payload: ResourceCapacityCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_resource_capacity(subdomain: str, template_id: int, payload: ResourceCapacityCreate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1104,11 +1173,18 @@ async def create_resource_capacity(subdomain: str, template_id: int, payload: Re
         )
         db.add(capacity)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
         db.refresh(capacity)
+        capacity_id = capacity.id
+        refresh_slot_inventory(
+            db, subdomain, template_ids=[template_id],
+            start_date=capacity.specific_date, end_date=capacity.specific_date
+        )
 
         return {
             "message": "Resource capacity created",
-            "capacity_id": capacity.id
+            "capacity_id": capacity_id
         }
     except HTTPException:
         raise
@@ -1118,7 +1194,8 @@ async def create_resource_capacity(subdomain: str, template_id: int, payload: Re
 
 
 @router.patch("/availability/templates/{template_id}/capacities/{capacity_id}", response_model=dict)
-async def update_resource_capacity(subdomain: str, template_id: int, capacity_id: int, payload: ResourceCapacityUpdate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_resource_capacity(subdomain: str, template_id: int, capacity_id: int, payload: ResourceCapacityUpdate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1126,6 +1203,7 @@ async def update_resource_capacity(subdomain: str, template_id: int, capacity_id
         if not capacity:
             raise HTTPException(status_code=404, detail="Capacity rule not found")
 
+        previous_date = capacity.specific_date
         updated_fields = payload.model_fields_set
 
         if 'specific_date' in updated_fields:
@@ -1152,7 +1230,18 @@ async def update_resource_capacity(subdomain: str, template_id: int, capacity_id
         if capacity.specific_date is None and capacity.day_of_week is None:
             raise HTTPException(status_code=400, detail="ต้องระบุวันที่เฉพาะเจาะจงหรือวันในสัปดาห์")
 
+        # กฎเฉพาะวันที่ (ทั้งก่อนและหลังแก้) กระทบแค่วันนั้น — กฎรายสัปดาห์กระทบทั้ง horizon
+        affected_dates = {previous_date, capacity.specific_date}
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
+        if None in affected_dates:
+            refresh_slot_inventory(db, subdomain, template_ids=[template_id])
+        else:
+            refresh_slot_inventory(
+                db, subdomain, template_ids=[template_id],
+                start_date=min(affected_dates), end_date=max(affected_dates)
+            )
 
         return {"message": "Capacity rule updated"}
     except HTTPException:
@@ -1163,7 +1252,8 @@ async def update_resource_capacity(subdomain: str, template_id: int, capacity_id
 
 
 @router.delete("/availability/templates/{template_id}/capacities/{capacity_id}", response_model=dict)
-async def delete_resource_capacity(subdomain: str, template_id: int, capacity_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_resource_capacity(subdomain: str, template_id: int, capacity_id: int, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1171,8 +1261,15 @@ async def delete_resource_capacity(subdomain: str, template_id: int, capacity_id
         if not capacity:
             raise HTTPException(status_code=404, detail="Capacity rule not found")
 
+        affected_date = capacity.specific_date
         db.delete(capacity)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, template_id)
+        refresh_slot_inventory(
+            db, subdomain, template_ids=[template_id],
+            start_date=affected_date, end_date=affected_date
+        )
 
         return {"message": "Capacity rule deleted"}
     except HTTPException:
@@ -1185,7 +1282,8 @@ async def delete_resource_capacity(subdomain: str, template_id: int, capacity_id
 # --- Provider Leaves ---
 
 @router.get("/availability/providers/{provider_id}/leaves", response_model=dict)
-async def list_provider_leaves(subdomain: str, provider_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def list_provider_leaves(subdomain: str, provider_id: int, db: Session = AsyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1211,7 +1309,8 @@ async def list_provider_leaves(subdomain: str, provider_id: int, db: Session = D
 
 
 @router.post("/availability/providers/{provider_id}/leaves", response_model=dict)
-async def create_provider_leave(subdomain: str, provider_id: int, payload: ProviderLeaveCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_provider_leave(subdomain: str, provider_id: int, payload: ProviderLeaveCreate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1233,11 +1332,17 @@ async def create_provider_leave(subdomain: str, provider_id: int, payload: Provi
         )
         db.add(leave)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
         db.refresh(leave)
+        leave_id = leave.id
+        refresh_slot_inventory(
+            db, subdomain, provider_id=provider_id,
+            start_date=leave.start_date, end_date=leave.end_date
+        )
 
         return {
             "message": "Provider leave created",
-            "leave_id": leave.id
+            "leave_id": leave_id
         }
     except HTTPException:
         raise
@@ -1247,7 +1352,8 @@ async def create_provider_leave(subdomain: str, provider_id: int, payload: Provi
 
 
 @router.patch("/availability/providers/{provider_id}/leaves/{leave_id}", response_model=dict)
-async def update_provider_leave(subdomain: str, provider_id: int, leave_id: int, payload: ProviderLeaveUpdate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_provider_leave(subdomain: str, provider_id: int, leave_id: int, payload: ProviderLeaveUpdate, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1255,6 +1361,8 @@ async def update_provider_leave(subdomain: str, provider_id: int, leave_id: int,
         if not leave:
             raise HTTPException(status_code=404, detail="Leave record not found")
 
+        previous_end = leave.end_date
+
         if payload.end_date is not None:
             new_end = parse_date(payload.end_date)
             if new_end < leave.start_date:
@@ -1269,7 +1377,13 @@ async def update_provider_leave(subdomain: str, provider_id: int, leave_id: int,
         if payload.is_approved is not None:
             leave.is_approved = payload.is_approved
 
+        affected_start, affected_end = leave.start_date, max(previous_end, leave.end_date)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        refresh_slot_inventory(
+            db, subdomain, provider_id=provider_id,
+            start_date=affected_start, end_date=affected_end
+        )
 
         return {"message": "Leave record updated"}
     except HTTPException:
@@ -1280,7 +1394,8 @@ async def update_provider_leave(subdomain: str, provider_id: int, leave_id: int,
 
 
 @router.delete("/availability/providers/{provider_id}/leaves/{leave_id}", response_model=dict)
-async def delete_provider_leave(subdomain: str, provider_id: int, leave_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_provider_leave(subdomain: str, provider_id: int, leave_id: int, db: Session = SyncTenantDB):
     try:
         get_tenant_db(subdomain, db)
 
@@ -1288,8 +1403,14 @@ async def delete_provider_leave(subdomain: str, provider_id: int, leave_id: int,
         if not leave:
             raise HTTPException(status_code=404, detail="Leave record not found")
 
+        affected_start, affected_end = leave.start_date, leave.end_date
         db.delete(leave)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        refresh_slot_inventory(
+            db, subdomain, provider_id=provider_id,
+            start_date=affected_start, end_date=affected_end
+        )
 
         return {"message": "Leave record deleted"}
     except HTTPException:
@@ -1299,7 +1420,8 @@ async def delete_provider_leave(subdomain: str, provider_id: int, leave_id: int,
         raise HTTPException(status_code=500, detail=str(exc))
 
 @router.delete("/availability/{availability_id}")
-async def delete_availability(subdomain: str, availability_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_availability(subdomain: str, availability_id: int, db: Session = SyncTenantDB):
     """Delete availability slot"""
     try:
         get_tenant_db(subdomain, db)
@@ -1311,8 +1433,13 @@ async def delete_availability(subdomain: str, availability_id: int, db: Session
         if not availability:
             raise HTTPException(status_code=404, detail="Availability not found")
         
+        affected_template_id = availability.template_id
         db.delete(availability)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain, affected_template_id)
+        if affected_template_id:
+            refresh_slot_inventory(db, subdomain, template_ids=[affected_template_id])
         
         return {"message": "Availability deleted successfully"}
         
@@ -1325,12 +1452,33 @@ async def delete_availability(subdomain: str, availability_id: int, db: Session
 # --- Date Overrides ---
 
 @router.get("/date-overrides", response_model=dict)
-async def get_date_overrides(
+@runs_on_async_session
+def get_date_overrides(
     subdomain: str, 
     template_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    include_global: bool = False,
+    scope: Optional[Literal['global', 'template']] = None,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    unavailable_only: bool = False,
+    compact: bool = False,
+    db: Session = AsyncTenantDB
 ):
-    """Get date overrides for a tenant, optionally filtered by template_id"""
+    """Get date overrides for a tenant
+
+    ตัวกรองทั้งหมดทำใน SQL (index ix_date_overrides_date_template):
+        template_id + include_global  override ของ template นั้น (และของทั้งระบบเมื่อ include_global)
+        scope                         เฉพาะ template_scope ที่ระบุ
+        start / end                   ช่วงวันที่ (รวมปลายทั้งสองด้าน)
+        unavailable_only              เฉพาะวันที่ปิดรับจอง
+    compact=true คืน {"dates": {"YYYY-MM-DD": reason}} ของ "วันที่ปิดรับจอง" แทนรายการเต็ม:
+    เลือก override ที่มีผลของแต่ละวันก่อน (ของ template ทับของทั้งระบบ, id ล่าสุดทับ — เหมือน
+    get_relevant_date_override) แล้วคืนเฉพาะวันที่ override นั้น is_unavailable
+    วันที่ template เปิดแบบปรับเวลาทับวันปิดของทั้งระบบจึงไม่อยู่ในผล (unavailable_only ไม่มีผลกับ compact)
+    """
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must be on or after start")
+
     try:
         get_tenant_db(subdomain, db)
 
@@ -1339,8 +1487,36 @@ async def get_date_overrides(
         query = db.query(models.DateOverride)
         
         if template_id is not None:
-            query = query.filter(models.DateOverride.template_id == template_id)
-        
+            template_filter = models.DateOverride.template_id == template_id
+            if include_global:
+                template_filter = template_filter | (models.DateOverride.template_scope == 'global')
+            query = query.filter(template_filter)
+        if scope is not None:
+            query = query.filter(models.DateOverride.template_scope == scope)
+        if start is not None:
+            query = query.filter(models.DateOverride.date >= start)
+        if end is not None:
+            query = query.filter(models.DateOverride.date <= end)
+
+        if compact:
+            # global ก่อน template และตาม id — แถวที่มาทีหลังเขียนทับในวันเดียวกัน
+            # ตัดวันที่เปิดออกหลังเลือก override ที่มีผลแล้ว (กรองใน SQL จะทิ้ง override เปิดของ template ก่อนเทียบ)
+            rows = query.with_entities(
+                models.DateOverride.date, models.DateOverride.reason, models.DateOverride.is_unavailable
+            ).order_by(
+                models.DateOverride.date,
+                (models.DateOverride.template_scope != 'global'),
+                models.DateOverride.id
+            ).all()
+            winners = {row.date: row for row in rows}
+            return {"dates": {
+                override_date.isoformat(): row.reason or 'วันหยุดพิเศษ'
+                for override_date, row in winners.items() if row.is_unavailable
+            }}
+
+        if unavailable_only:
+            query = query.filter(models.DateOverride.is_unavailable == True)
+
         overrides = query.order_by(models.DateOverride.date).all()
         
         result = []
@@ -1358,11 +1534,14 @@ async def get_date_overrides(
             })
         
         return {"date_overrides": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/date-overrides", response_model=dict)
-async def create_date_override(subdomain: str, override_data: DateOverrideCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_date_override(subdomain: str, override_data: DateOverrideCreate, db: Session = SyncTenantDB):
     """Create date override with template support"""
     try:
         get_tenant_db(subdomain, db)
@@ -1417,9 +1596,11 @@ async def create_date_override(subdomain: str, override_data: DateOverrideCreate
         
         db.add(override)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        tenant_calendar.invalidate(subdomain)
         db.refresh(override)
         
-        return {
+        response = {
             "message": "Date override created successfully",
             "date_override": {
                 "id": override.id,
@@ -1433,13 +1614,20 @@ async def create_date_override(subdomain: str, override_data: DateOverrideCreate
                 "created_at": override.created_at
             }
         }
+        refresh_slot_inventory(
+            db, subdomain,
+            template_ids=[override.template_id] if override.template_scope == 'template' else None,
+            start_date=override_date, end_date=override_date
+        )
+        return response
         
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/date-overrides/{override_id}")
-async def delete_date_override(subdomain: str, override_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_date_override(subdomain: str, override_id: int, db: Session = SyncTenantDB):
     """Delete date override"""
     try:
         get_tenant_db(subdomain, db)
@@ -1453,8 +1641,16 @@ async def delete_date_override(subdomain: str, override_id: int, db: Session = D
         if not override:
             raise HTTPException(status_code=404, detail="Date override not found")
         
+        affected_date = override.date
+        affected_template_ids = [override.template_id] if override.template_scope == 'template' else None
         db.delete(override)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        tenant_calendar.invalidate(subdomain)
+        refresh_slot_inventory(
+            db, subdomain, template_ids=affected_template_ids,
+            start_date=affected_date, end_date=affected_date
+        )
         
         return {"message": "Date override deleted successfully"}
         
@@ -1465,7 +1661,8 @@ async def delete_date_override(subdomain: str, override_id: int, db: Session = D
 # --- Providers (for dropdown) ---
 
 @router.get("/providers", response_model=dict)
-async def get_providers(subdomain: str, db: Session = Depends(get_db)):
+@runs_on_async_session
+def get_providers(subdomain: str, db: Session = AsyncTenantDB):
     """Get all providers (both active and inactive)"""
     try:
         get_tenant_db(subdomain, db)
@@ -1496,7 +1693,8 @@ async def get_providers(subdomain: str, db: Session = Depends(get_db)):
 # --- Provider CRUD Operations ---
 
 @router.post("/providers", response_model=ProviderResponse, status_code=status.HTTP_201_CREATED)
-async def create_provider(subdomain: str, payload: ProviderCreate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def create_provider(subdomain: str, payload: ProviderCreate, db: Session = SyncTenantDB):
     """Create a new provider"""
     try:
         get_tenant_db(subdomain, db)
@@ -1536,7 +1734,8 @@ async def create_provider(subdomain: str, payload: ProviderCreate, db: Session =
 
 
 @router.get("/providers/{provider_id}", response_model=ProviderResponse)
-async def get_provider(subdomain: str, provider_id: int, db: Session = Depends(get_db)):
+@runs_on_async_session
+def get_provider(subdomain: str, provider_id: int, db: Session = AsyncTenantDB):
     """Get provider by ID"""
     try:
         get_tenant_db(subdomain, db)
@@ -1557,7 +1756,8 @@ async def get_provider(subdomain: str, provider_id: int, db: Session = Depends(g
 
 
 @router.put("/providers/{provider_id}", response_model=ProviderResponse)
-async def update_provider(subdomain: str, provider_id: int, payload: ProviderUpdate, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def update_provider(subdomain: str, provider_id: int, payload: ProviderUpdate, db: Session = SyncTenantDB):
     """Update provider"""
     try:
         get_tenant_db(subdomain, db)
@@ -1587,9 +1787,13 @@ async def update_provider(subdomain: str, provider_id: int, payload: ProviderUpd
             setattr(provider, field, value)
 
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
         db.refresh(provider)
+        response = ProviderResponse.model_validate(provider)
+        if 'is_active' in update_data:
+            refresh_slot_inventory(db, subdomain, provider_id=provider_id)
 
-        return provider
+        return response
 
     except HTTPException:
         raise
@@ -1599,7 +1803,8 @@ async def update_provider(subdomain: str, provider_id: int, payload: ProviderUpd
 
 
 @router.delete("/providers/{provider_id}")
-async def delete_provider(subdomain: str, provider_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def delete_provider(subdomain: str, provider_id: int, db: Session = SyncTenantDB):
     """Delete provider (soft delete by setting is_active=False)"""
     try:
         get_tenant_db(subdomain, db)
@@ -1622,14 +1827,25 @@ async def delete_provider(subdomain: str, provider_id: int, db: Session = Depend
             # Soft delete instead of hard delete
             provider.is_active = False
             db.commit()
+            availability_cache.invalidate_tenant(subdomain)
+            refresh_slot_inventory(db, subdomain, provider_id=provider_id)
             raise HTTPException(
                 status_code=400,
                 detail=f"Cannot delete provider with {appointments_count} appointments. Provider has been deactivated instead."
             )
 
         # Hard delete if no appointments
+        affected_template_ids = [
+            row.template_id for row in db.query(models.ProviderSchedule.template_id).filter(
+                models.ProviderSchedule.provider_id == provider_id
+            ).distinct()
+        ]
         db.delete(provider)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        template_snapshots.invalidate(subdomain)
+        if affected_template_ids:
+            refresh_slot_inventory(db, subdomain, template_ids=affected_template_ids)
 
         return {"message": f"Provider '{provider_name}' deleted successfully", "deleted": True}
 
@@ -1641,7 +1857,8 @@ async def delete_provider(subdomain: str, provider_id: int, db: Session = Depend
 
 
 @router.patch("/providers/{provider_id}/toggle", response_model=ProviderResponse)
-async def toggle_provider_active(subdomain: str, provider_id: int, db: Session = Depends(get_db)):
+@runs_in_threadpool
+def toggle_provider_active(subdomain: str, provider_id: int, db: Session = SyncTenantDB):
     """Toggle provider active status"""
     try:
         get_tenant_db(subdomain, db)
@@ -1655,12 +1872,68 @@ async def toggle_provider_active(subdomain: str, provider_id: int, db: Session =
 
         provider.is_active = not provider.is_active
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
         db.refresh(provider)
+        response = ProviderResponse.model_validate(provider)
+        refresh_slot_inventory(db, subdomain, provider_id=provider_id)
 
-        return provider
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Slot Inventory (opt-in) ---
+
+@router.post("/slot-inventory/enable", response_model=dict)
+@runs_in_threadpool
+def enable_inventory(subdomain: str, db: Session = SyncTenantDB):
+    """เปิดใช้ slot_inventory ของ tenant และสร้างแถวทั้ง horizon ของทุก event type"""
+    try:
+        get_tenant_db(subdomain, db)
+        rows = enable_slot_inventory(db, subdomain)
+        return {"message": "Slot inventory enabled", "rows": rows}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.post("/slot-inventory/rebuild", response_model=dict)
+@runs_in_threadpool
+def rebuild_inventory(subdomain: str, payload: SlotInventoryRebuild, db: Session = SyncTenantDB):
+    """สร้างแถวใหม่ (ทั้ง horizon หรือเฉพาะ template/ช่วงวันที่) — booked นับใหม่จากนัดที่มีอยู่"""
+    try:
+        get_tenant_db(subdomain, db)
+        rows = regenerate_slot_inventory(
+            db,
+            subdomain,
+            template_ids=[payload.template_id] if payload.template_id else None,
+            start_date=parse_date(payload.start_date) if payload.start_date else None,
+            end_date=parse_date(payload.end_date) if payload.end_date else None
+        )
+        return {"message": "Slot inventory rebuilt", "rows": rows}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.delete("/slot-inventory", response_model=dict)
+@runs_in_threadpool
+def disable_inventory(subdomain: str, db: Session = SyncTenantDB):
+    """ปิดใช้ slot_inventory (ลบตาราง) — การจองกลับไปคำนวณ capacity จากนัดโดยตรง"""
+    try:
+        get_tenant_db(subdomain, db)
+        disable_slot_inventory(db, subdomain)
+        return {"message": "Slot inventory disabled"}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(exc))
@@ -1,10 +1,10 @@
 # fastapi_app/app/booking.py - Complete Booking API
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from fastapi import APIRouter, HTTPException, BackgroundTasks
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel, EmailStr, field_validator, model_validator
-from typing import Optional, List, Dict, Literal
+from typing import Optional, List, Dict, Literal, Tuple
 from datetime import datetime, timedelta, date, time
 import string
 import random
@@ -12,11 +12,20 @@ import sys
 import logging
 
 # Import database and models
-from shared_db.database import SessionLocal
 from shared_db import models
-
+from shared_db.slot_inventory import inventory_enabled, release_slot, reserve_slot
+from shared_db.availability_cache import availability_cache
+
+from .async_session import AsyncTenantDB, SyncTenantDB, runs_in_threadpool, runs_on_async_session
+from .day_availability import AvailabilityWindow, DayAvailability, convert_python_weekday, day_bounds
+from .metrics import availability_timer
+from .recurrence import expand_rrule, normalize_rrule
+from .tenant_calendar import HolidayEntry, OverrideEntry, tenant_calendar
+from .slot_locks import lock_booking_slot, lock_booking_slots, lock_patient_contacts, raise_for_provider_overlap
+from .template_snapshot import template_snapshots
 from .email_service import (
     send_appointment_confirmation,
+    send_appointment_confirmations,
     send_appointment_reschedule,
     send_appointment_cancellation,
 )
@@ -36,29 +45,18 @@ class AppointmentSearch(BaseModel):
 
 router = APIRouter(prefix="/api/v1/tenants/{subdomain}", tags=["booking"])
 
-# --- Dependencies ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_tenant_db(subdomain: str):
-    """สร้าง dependency ที่ return function สำหรับ FastAPI"""
-    def _get_db():
-        db = SessionLocal()
-        try:
-            schema_name = f"tenant_{subdomain}"
-            # Set search_path ทันที (ไม่ commit — ให้อยู่ใน transaction เดียวกับ query)
-            db.execute(text(f'SET search_path TO "{schema_name}", public'))
-            yield db
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=404, detail=f"Tenant not found: {subdomain}")
-        finally:
-            db.close()
-    return _get_db
+# ช่วงวันที่ยาวสุดที่ /booking/availability/{id}/range รับได้ (ครอบคลุมปฏิทินหนึ่งเดือนพร้อมขอบสัปดาห์)
+MAX_AVAILABILITY_RANGE_DAYS = 62
+
+# /booking/next-available: จำนวน slot สูงสุดที่ขอได้ และขนาดช่วงที่โหลดข้อมูลต่อครั้ง
+MAX_NEXT_AVAILABLE_SLOTS = 50
+NEXT_AVAILABLE_CHUNK_DAYS = 7
+
+# จำนวนนัดสูงสุดต่อการเรียก /booking/batch หนึ่งครั้ง
+MAX_BATCH_BOOKINGS = 200
+
+# จำนวนครั้งสูงสุดของนัดต่อเนื่องหนึ่งชุด (/booking/series) — สัปดาห์ละ 3 ครั้งประมาณ 8 เดือน
+MAX_SERIES_OCCURRENCES = 104
 
 # --- Pydantic Models ---
 class TimeSlot(BaseModel):
@@ -81,6 +79,37 @@ class AvailabilityResponse(BaseModel):
     message: Optional[str] = None
     is_holiday: Optional[bool] = None
 
+class DayAvailabilitySummary(BaseModel):
+    date: str
+    open_slots: int
+    total_slots: int
+    first_available: Optional[str] = None
+    is_holiday: bool = False
+    holiday_name: Optional[str] = None
+    override: Optional[Dict] = None
+    message: Optional[str] = None
+
+class AvailabilityRangeResponse(BaseModel):
+    start: str
+    end: str
+    event_type: Dict
+    template_id: Optional[int] = None
+    days: List[DayAvailabilitySummary]
+
+class NextAvailableSlot(BaseModel):
+    date: str
+    time: str
+    event_type_id: int
+    event_type_name: str
+    remaining_slots: int
+    available_provider_ids: Optional[List[int]] = None
+
+class NextAvailableResponse(BaseModel):
+    slots: List[NextAvailableSlot]
+    searched_from: str
+    searched_until: str  # วันสุดท้ายที่ตรวจ
+    exhausted: bool  # ตรวจจนสุด max_advance_days แล้วยังได้ไม่ครบ limit
+
 class BookingCreate(BaseModel):
     event_type_id: int
     provider_id: Optional[int] = None
@@ -122,6 +151,55 @@ class BookingResponse(BaseModel):
     instructions: Optional[str] = None
     message: str
 
+class BatchBookingRequest(BaseModel):
+    bookings: List[BookingCreate]
+
+    @field_validator('bookings')
+    @classmethod
+    def check_batch_size(cls, v):
+        if not v:
+            raise ValueError('ต้องมีรายการจองอย่างน้อย 1 รายการ')
+        if len(v) > MAX_BATCH_BOOKINGS:
+            raise ValueError(f'จองได้ไม่เกิน {MAX_BATCH_BOOKINGS} รายการต่อครั้ง')
+        return v
+
+class BatchBookingItemResult(BaseModel):
+    index: int  # ตำแหน่งใน bookings ของ request
+    success: bool
+    booking_reference: Optional[str] = None
+    appointment_datetime: Optional[str] = None
+    provider_id: Optional[int] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchBookingResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchBookingItemResult]
+
+class SeriesBookingCreate(BookingCreate):
+    """date / time คือนัดแรก (DTSTART) ของชุด"""
+    rrule: str  # เช่น "FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=36"
+    skip_conflicts: bool = False  # True = จองเฉพาะครั้งที่ว่าง, False = ต้องว่างทุกครั้งไม่งั้นไม่จองเลย
+
+class SeriesOccurrenceResult(BaseModel):
+    appointment_datetime: str
+    success: bool
+    booking_reference: Optional[str] = None
+    provider_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SeriesBookingResponse(BaseModel):
+    success: bool
+    series_id: int
+    rrule: str
+    booked: int
+    skipped: int
+    event_type_name: str
+    occurrences: List[SeriesOccurrenceResult]
+    message: str
+
 class RescheduleRequest(BaseModel):
     booking_reference: str
     new_date: str
@@ -178,13 +256,12 @@ def generate_time_slots(start_time: time, end_time: time, duration_minutes: int)
     return slots
 
 
-def convert_python_weekday(python_weekday: int) -> int:
-    """Convert Python weekday (0=Monday) to DayOfWeek enum value (0=Sunday)."""
-    return 0 if python_weekday == 6 else python_weekday + 1
-
-
 def resolve_resource_limits(template: models.AvailabilityTemplate, target_date: date) -> Dict[str, Optional[int]]:
     """Determine capacity limits based on template settings and resource rules."""
+    snapshot = template_snapshots.for_template(template)
+    if snapshot is not None:
+        return snapshot.resource_limits(target_date)
+
     # Default to 999 (virtually unlimited) if not set, allowing maximum flexibility
     rooms_limit = template.max_concurrent_slots if template.max_concurrent_slots else 999
     rule_limit = None
@@ -211,14 +288,22 @@ def resolve_resource_limits(template: models.AvailabilityTemplate, target_date:
     }
 
 
-def get_active_holiday(db: Session, target_date: date) -> Optional[models.Holiday]:
+def get_active_holiday(db: Session, target_date: date) -> Optional[HolidayEntry]:
+    calendar = tenant_calendar.get(db)
+    if calendar is not None:
+        return calendar.holiday(target_date)
+
     return db.query(models.Holiday).filter(
         models.Holiday.date == target_date,
         models.Holiday.is_active == True
     ).first()
 
 
-def get_relevant_date_override(db: Session, template_id: Optional[int], target_date: date) -> Optional[models.DateOverride]:
+def get_relevant_date_override(db: Session, template_id: Optional[int], target_date: date) -> Optional[OverrideEntry]:
+    calendar = tenant_calendar.get(db)
+    if calendar is not None:
+        return calendar.date_override(template_id, target_date)
+
     template_override = None
     if template_id is not None:
         template_override = db.query(models.DateOverride).filter(
@@ -256,110 +341,12 @@ def is_slot_blocked_by_override(
     return False
 
 
-def collect_available_providers(
-    db: Session,
-    template: models.AvailabilityTemplate,
-    target_date: date,
-    slot_start: datetime,
-    slot_end: datetime,
-    date_override: Optional[models.DateOverride] = None
-) -> List[int]:
-    """Return provider IDs available for the given slot."""
-    print(f"\n{'='*80}")
-    print(f"🔍 collect_available_providers DEBUG")
-    print(f"{'='*80}")
-    print(f"Template ID: {template.id}, Target Date: {target_date}")
-    print(f"Slot: {slot_start.time()} - {slot_end.time()}")
-
-    if is_slot_blocked_by_override(date_override, target_date, slot_start, slot_end):
-        print("❌ Slot blocked by date override")
-        return []
-
-    target_day = convert_python_weekday(target_date.weekday())
-    print(f"Target day (converted): {target_day} (Python weekday: {target_date.weekday()})")
-
-    schedules = db.query(models.ProviderSchedule).filter(
-        models.ProviderSchedule.template_id == template.id,
-        models.ProviderSchedule.is_active == True,
-        models.ProviderSchedule.effective_date <= target_date,
-        (models.ProviderSchedule.end_date.is_(None) | (models.ProviderSchedule.end_date >= target_date))
-    ).all()
-
-    print(f"\n📋 Found {len(schedules)} provider schedules for template {template.id}")
-
-    available_ids = []
-    for schedule in schedules:
-        provider = schedule.provider
-        print(f"\n--- Checking Schedule ID {schedule.id} ---")
-        print(f"Provider: [{schedule.provider_id}] {provider.name if provider else 'None'}")
-
-        if not provider or not provider.is_active:
-            print(f"❌ Provider inactive or missing")
-            continue
-
-        days = schedule.days_of_week or []
-        print(f"Days of week: {days} (type: {type(days)})")
-        print(f"Checking if {target_day} in {days}: {target_day in days}")
-
-        if target_day not in days:
-            print(f"❌ Target day {target_day} not in schedule days {days}")
-            continue
-
-        # Respect custom time windows if provided
-        if schedule.custom_start_time:
-            schedule_start = datetime.combine(target_date, schedule.custom_start_time)
-            print(f"Custom start time: {schedule.custom_start_time}, slot start: {slot_start.time()}")
-            if slot_start < schedule_start:
-                print(f"❌ Slot start {slot_start.time()} before custom start {schedule.custom_start_time}")
-                continue
-        if schedule.custom_end_time:
-            schedule_end = datetime.combine(target_date, schedule.custom_end_time)
-            print(f"Custom end time: {schedule.custom_end_time}, slot end: {slot_end.time()}")
-            if slot_end > schedule_end:
-                print(f"❌ Slot end {slot_end.time()} after custom end {schedule.custom_end_time}")
-                continue
-
-        # Exclude providers on leave
-        leave_exists = db.query(models.ProviderLeave).filter(
-            models.ProviderLeave.provider_id == provider.id,
-            models.ProviderLeave.start_date <= target_date,
-            models.ProviderLeave.end_date >= target_date,
-        ).first()
-        if leave_exists:
-            print(f"❌ Provider on leave: {leave_exists.start_date} to {leave_exists.end_date}")
-            continue
-
-        print(f"✅ Provider {provider.id} ({provider.name}) is available")
-        available_ids.append(provider.id)
-
-    print(f"\n{'='*80}")
-    print(f"📊 RESULT: {len(available_ids)} providers available: {available_ids}")
-    print(f"{'='*80}\n")
-    return available_ids
-
-
-def fetch_slot_bookings(
-    db: Session,
-    event_type_id: int,
-    slot_start: datetime,
-    slot_end: datetime,
-    provider_ids: Optional[List[int]] = None
-) -> List[models.Appointment]:
-    query = db.query(models.Appointment).filter(
-        models.Appointment.event_type_id == event_type_id,
-        models.Appointment.status.in_(['confirmed', 'pending']),
-        models.Appointment.start_time < slot_end,
-        models.Appointment.end_time > slot_start
-    )
-
-    if provider_ids is not None:
-        query = query.filter(models.Appointment.provider_id.in_(provider_ids))
-
-    return query.all()
-
-
 def select_auto_provider(template: models.AvailabilityTemplate, available_provider_ids: List[int]) -> Optional[int]:
     """Choose provider based on template assignments and priority."""
+    snapshot = template_snapshots.for_template(template)
+    if snapshot is not None:
+        return snapshot.auto_provider(available_provider_ids)
+
     prioritized = sorted(
         template.template_providers,
         key=lambda assignment: (
@@ -382,20 +369,33 @@ def ensure_slot_capacity(
     template: models.AvailabilityTemplate,
     slot_start: datetime,
     slot_end: datetime,
-    provider_id: Optional[int] = None
+    provider_id: Optional[int] = None,
+    day: Optional[DayAvailability] = None,
+    window: Optional[AvailabilityWindow] = None
 ) -> Optional[int]:
-    """Validate slot availability and return provider assignment (auto or requested)."""
+    """Validate slot availability and return provider assignment (auto or requested).
+
+    ``day`` คือ DayAvailability ของวันที่ของ slot (ถ้าผู้เรียกโหลดไว้แล้ว) — ถ้าไม่ส่งมาจะโหลดเอง
+    provider pool และการจองที่ทับ slot ตอบจากข้อมูลของทั้งวันนั้นแทนการ query ทีละ slot
+    ``window`` (ช่วงวันที่ที่ครอบคลุม slot) ใช้ตอบวันหยุด / date override / ข้อมูลของวันแทนการ query ทุกครั้ง
+    """
     if template is None:
         raise HTTPException(status_code=400, detail="บริการนี้ยังไม่ได้ตั้งค่าเวลาทำการ")
 
     target_date = slot_start.date()
 
-    holiday = get_active_holiday(db, target_date)
+    if window is not None:
+        holiday = window.holiday(target_date)
+    else:
+        holiday = get_active_holiday(db, target_date)
     if holiday:
         detail = holiday.description or f"ปิดทำการ: {holiday.name}"
         raise HTTPException(status_code=409, detail=detail)
 
-    date_override = get_relevant_date_override(db, template.id if template else None, target_date)
+    if window is not None:
+        date_override = window.date_override(target_date)
+    else:
+        date_override = get_relevant_date_override(db, template.id if template else None, target_date)
     if is_slot_blocked_by_override(date_override, target_date, slot_start, slot_end):
         detail = date_override.reason if date_override else None
         raise HTTPException(status_code=409, detail=detail or "ช่วงเวลานี้ไม่เปิดให้บริการ")
@@ -405,17 +405,16 @@ def ensure_slot_capacity(
     if capacity_info["max_concurrent"]:
         capacity_limit = min(capacity_limit, capacity_info["max_concurrent"])
 
+    if day is None or day.target_date != target_date:
+        if window is not None:
+            day = window.day(target_date)
+        else:
+            day = DayAvailability.load(db, template, event_type.id, target_date)
+
     available_provider_ids: Optional[List[int]] = None
 
     if template.requires_provider_assignment:
-        available_provider_ids = collect_available_providers(
-            db,
-            template,
-            target_date,
-            slot_start,
-            slot_end,
-            date_override
-        )
+        available_provider_ids = day.available_providers(slot_start, slot_end)
         if not available_provider_ids:
             raise HTTPException(status_code=409, detail="ไม่มีผู้ให้บริการว่างในช่วงเวลานี้")
 
@@ -427,14 +426,7 @@ def ensure_slot_capacity(
         capacity_limit = min(capacity_limit, len(available_provider_ids))
 
     else:
-        provider_pool_ids = collect_available_providers(
-            db,
-            template,
-            target_date,
-            slot_start,
-            slot_end,
-            date_override
-        )
+        provider_pool_ids = day.available_providers(slot_start, slot_end)
 
         if not provider_pool_ids:
             raise HTTPException(status_code=409, detail="ไม่มีผู้ให้บริการว่างในช่วงเวลานี้")
@@ -450,13 +442,13 @@ def ensure_slot_capacity(
 
         available_provider_ids = provider_pool_ids
 
-    bookings = fetch_slot_bookings(db, event_type.id, slot_start, slot_end)
+    occupancy = day.occupancy
 
     assigned_provider_id = provider_id
 
     if template.requires_provider_assignment:
-        booked_provider_ids = {appt.provider_id for appt in bookings if appt.provider_id}
-        unassigned_bookings = len([appt for appt in bookings if not appt.provider_id])
+        booked_provider_ids = occupancy.booked_provider_ids(slot_start, slot_end)
+        unassigned_bookings = occupancy.unassigned_count(slot_start, slot_end)
 
         available_provider_ids = available_provider_ids or []
         remaining_providers = [pid for pid in available_provider_ids if pid not in booked_provider_ids]
@@ -475,16 +467,16 @@ def ensure_slot_capacity(
                 raise HTTPException(status_code=409, detail="ไม่สามารถกำหนดผู้ให้บริการอัตโนมัติได้")
 
     else:
-        bookings_within_slot = bookings
-        if len(bookings_within_slot) >= capacity_limit:
+        booked_count = occupancy.count(slot_start, slot_end)
+        if booked_count >= capacity_limit:
             raise HTTPException(status_code=409, detail="ช่วงเวลานี้ถูกจองเต็มแล้ว")
 
-        if provider_id and any(appt.provider_id == provider_id for appt in bookings_within_slot):
+        if provider_id and occupancy.is_provider_booked(provider_id, slot_start, slot_end):
             raise HTTPException(status_code=409, detail="ผู้ให้บริการที่เลือกถูกจองแล้วในช่วงเวลานี้")
 
         provider_pool_ids = provider_pool_ids or []
-        booked_provider_ids = [appt.provider_id for appt in bookings_within_slot if appt.provider_id]
-        unassigned_bookings = len([appt for appt in bookings_within_slot if not appt.provider_id])
+        booked_provider_ids = occupancy.booked_provider_ids(slot_start, slot_end)
+        unassigned_bookings = occupancy.unassigned_count(slot_start, slot_end)
         remaining_pool = [pid for pid in provider_pool_ids if pid not in booked_provider_ids]
 
         if unassigned_bookings >= len(remaining_pool):
@@ -492,7 +484,7 @@ def ensure_slot_capacity(
 
         available_after_unassigned = remaining_pool[unassigned_bookings:]
 
-        remaining_capacity = max(capacity_limit - len(bookings_within_slot), 0)
+        remaining_capacity = max(capacity_limit - booked_count, 0)
         if remaining_capacity == 0 or not available_after_unassigned:
             raise HTTPException(status_code=409, detail="ช่วงเวลานี้ถูกจองเต็มแล้ว")
 
@@ -507,22 +499,31 @@ def ensure_slot_capacity(
 
     return assigned_provider_id
 
+def reserve_inventory_slot(db: Session, schema_name: str, event_type: models.EventType, slot_start: datetime):
+    """tenant ที่เปิดใช้ slot_inventory: จอง 1 ที่ด้วย UPDATE แบบมีเงื่อนไข — slot เต็มตอบ 409 ทันที
+
+    ไม่มีแถวของวันนั้น (horizon เพิ่งเลื่อนมาถึง) จะเติมแถวของวันแล้วลองอีกครั้ง
+    ถ้ายังไม่มีแถว (slot ปิด/ไม่มี provider) ปล่อยให้ ensure_slot_capacity ตอบเหตุผลตามเดิม
+    """
+    reserved = reserve_slot(db, schema_name, event_type.id, slot_start)
+    if reserved is None and inventory_enabled(db, schema_name):
+        from .inventory_builder import ensure_day_inventory
+        ensure_day_inventory(db, event_type, slot_start.date())
+        reserved = reserve_slot(db, schema_name, event_type.id, slot_start)
+
+    if reserved is False:
+        raise HTTPException(status_code=409, detail="ช่วงเวลานี้ถูกจองเต็มแล้ว")
+
 # --- Main API Endpoints ---
 
 @router.get("/event-types/{event_type_id}", response_model=EventTypeDetail)
-async def get_event_type_details(
+@runs_on_async_session
+def get_event_type_details(
     subdomain: str,
     event_type_id: int,
-    db: Session = Depends(get_db)
+    db: Session = AsyncTenantDB
 ):
     """Get details for a single event type."""
-    # Set search_path for the correct tenant
-    schema_name = f"tenant_{subdomain}"
-    try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Tenant not found: {subdomain}")
-
     # Query for the event type
     event_type = db.query(models.EventType).filter(
         models.EventType.id == event_type_id,
@@ -534,266 +535,500 @@ async def get_event_type_details(
 
     return event_type
 
-@router.get("/booking/availability/{event_type_id}")
-async def get_booking_availability(
-    subdomain: str,
-    event_type_id: int,
-    date: str,
-    provider_id: Optional[int] = None,
-    db: Session = Depends(get_db)  
-):
-    # Set search_path (ไม่ commit — ให้ SET อยู่ใน transaction เดียวกับ query
-    # เพราะ commit จะคืน connection กลับ pool และ search_path อาจหายไป)
-    schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
+def resolve_day_base_slots(
+    window: AvailabilityWindow,
+    event_type: models.EventType,
+    target_date: date
+) -> Tuple[List[str], Optional[models.DateOverride]]:
+    """slot ตั้งต้นของวันจาก availability ของ template (หรือเวลาที่ date override กำหนด) พร้อม override ที่ใช้"""
+    base_slots: List[str] = []
+    for avail in window.availabilities(target_date):
+        base_slots.extend(generate_time_slots(avail.start_time, avail.end_time, event_type.duration_minutes))
+
+    date_override = window.date_override(target_date)
+
+    if date_override:
+        if date_override.is_unavailable:
+            return [], date_override
+        elif date_override.custom_start_time and date_override.custom_end_time:
+            base_slots = generate_time_slots(
+                date_override.custom_start_time,
+                date_override.custom_end_time,
+                event_type.duration_minutes
+            )
 
-    try:
-        # 1. Get event type with template
-        event_type = db.query(models.EventType).filter_by(
-            id=event_type_id,
-            is_active=True
-        ).first()
-        
-        if not event_type:
-            raise HTTPException(404, "Event type not found or inactive")
-        
-        # 2. Parse date and prepare response metadata
-        target_date = datetime.strptime(date, "%Y-%m-%d").date()
-        today = datetime.now().date()
-        template = event_type.availability_template
+    return base_slots, date_override
 
-        event_type_info = {
-            "id": event_type.id,
-            "name": event_type.name,
-            "duration": event_type.duration_minutes,
-            "buffer_before": event_type.buffer_before_minutes,
-            "buffer_after": event_type.buffer_after_minutes
-        }
 
-        response_data = {
-            "date": date,
-            "slots": [],
-            "event_type": event_type_info,
-            "template_id": template.id if template else None,
-            "template_type": template.template_type if template else None,
-            "requires_provider_assignment": template.requires_provider_assignment if template else None,
-            "message": None,
-            "is_holiday": False
-        }
+def evaluate_day_slots(
+    window: AvailabilityWindow,
+    event_type: models.EventType,
+    template: Optional[models.AvailabilityTemplate],
+    target_date: date,
+    provider_id: Optional[int] = None
+) -> Dict:
+    """คำนวณ slot ของวันเดียวจากข้อมูลใน window
 
-        # 2.5 Check for holidays first
-        holiday = get_active_holiday(db, target_date)
+    ใช้ร่วมกันระหว่าง endpoint รายวันและแบบช่วงวันที่ — คืน dict ที่มี slots, message, is_holiday
+    """
+    result = {"slots": [], "message": None, "is_holiday": False}
+    today = datetime.now().date()
+    date_str = target_date.isoformat()
 
-        if holiday:
-            response_data["message"] = holiday.description or f"ปิดทำการ: {holiday.name}"
-            response_data["is_holiday"] = True
-            return AvailabilityResponse(**response_data)
+    # Check for holidays first
+    holiday = window.holiday(target_date)
 
-        if target_date < today:
-            response_data["message"] = "ไม่สามารถจองวันที่ผ่านมาแล้ว"
-            return AvailabilityResponse(**response_data)
+    if holiday:
+        result["message"] = holiday.description or f"ปิดทำการ: {holiday.name}"
+        result["is_holiday"] = True
+        return result
+
+    if target_date < today:
+        result["message"] = "ไม่สามารถจองวันที่ผ่านมาแล้ว"
+        return result
+
+    max_date = today + timedelta(days=event_type.max_advance_days)
+    if target_date > max_date:
+        result["message"] = "วันที่เลือกอยู่นอกช่วงที่อนุญาตให้จองล่วงหน้า"
+        return result
+
+    if not template:
+        result["message"] = "ยังไม่ได้ตั้งค่าเวลาทำการสำหรับบริการนี้"
+        return result
+
+    base_slots, date_override = resolve_day_base_slots(window, event_type, target_date)
+
+    if date_override and date_override.is_unavailable:
+        result["message"] = date_override.reason or "ไม่เปิดให้จองในวันนี้"
+        return result
+
+    if not base_slots:
+        # No slots configured for this day
+        result["message"] = "ไม่มีเวลาว่างสำหรับวันนี้"
+        return result
+
+    resource_limits = resolve_resource_limits(template, target_date)
+    base_capacity = resource_limits["rooms_limit"] or 1
+    if resource_limits["max_concurrent"]:
+        base_capacity = min(base_capacity, resource_limits["max_concurrent"])
+
+    min_booking_time = datetime.now() + timedelta(hours=event_type.min_notice_hours)
+    slot_duration = timedelta(minutes=event_type.duration_minutes)
+
+    # schedules/providers/leaves/appointments ของวันนี้ ตัดจากข้อมูลที่ window โหลดไว้ทั้งช่วง
+    day = window.day(target_date)
+
+    available_slots: List[TimeSlot] = []
+    slot_times = sorted(set(base_slots))
+    slot_bounds = []
+    for slot in slot_times:
+        slot_start = parse_datetime(date_str, slot)
+        slot_bounds.append((slot_start, slot_start + slot_duration))
+    # provider pool / การจองของทุก slot ในวันคำนวณพร้อมกัน (provider x slot) แทนการถามทีละ slot
+    matrix = day.slot_matrix(slot_bounds)
+
+    for index, slot in enumerate(slot_times):
+        slot_start, slot_end = slot_bounds[index]
+
+        reason = None
+        remaining_slots = 0
+        capacity_limit = base_capacity
+        available_provider_ids: Optional[List[int]] = None
+
+        if is_slot_blocked_by_override(date_override, target_date, slot_start, slot_end):
+            reason = "template_override"
+            if template.requires_provider_assignment:
+                available_provider_ids = []
+            capacity_limit = 0
+        elif slot_start < min_booking_time:
+            reason = "slot_too_soon"
+        else:
+            provider_pool_ids: Optional[List[int]] = None
 
-        max_date = today + timedelta(days=event_type.max_advance_days)
-        if target_date > max_date:
-            response_data["message"] = "วันที่เลือกอยู่นอกช่วงที่อนุญาตให้จองล่วงหน้า"
-            return AvailabilityResponse(**response_data)
+            if template.requires_provider_assignment:
+                available_provider_ids = matrix.pool(index)
+                if provider_id:
+                    if provider_id not in available_provider_ids:
+                        reason = "provider_unavailable"
+                        available_provider_ids = []
+                    else:
+                        available_provider_ids = [provider_id]
+                if not reason and available_provider_ids:
+                    capacity_limit = min(capacity_limit, len(available_provider_ids))
+                elif not reason:
+                    reason = "no_provider"
+                    available_provider_ids = []
+            else:
+                provider_pool_ids = matrix.pool(index)
+                if provider_pool_ids:
+                    capacity_limit = min(capacity_limit, len(provider_pool_ids))
+                elif not reason:
+                    reason = "no_provider"
 
-        if not template:
-            response_data["message"] = "ยังไม่ได้ตั้งค่าเวลาทำการสำหรับบริการนี้"
-            return AvailabilityResponse(**response_data)
+            if reason not in {"no_provider", "provider_unavailable"}:
+                if template.requires_provider_assignment:
+                    if available_provider_ids is None:
+                        available_provider_ids = []
 
-        day_enum = convert_python_weekday(target_date.weekday())
+                    remaining_providers = matrix.unbooked(index, available_provider_ids)
+                    occupied_slots = int(matrix.booked_provider_count[index] + matrix.unassigned_count[index])
+                    capacity_limit = max(capacity_limit, 0)
+                    remaining_slots = max(capacity_limit - occupied_slots, 0)
 
-        availabilities = db.query(models.Availability).filter(
-            models.Availability.template_id == template.id,
-            models.Availability.day_of_week == models.DayOfWeek(day_enum),
-            models.Availability.is_active == True
-        ).all()
+                    # Keep all available providers for user selection
+                    # Don't limit by remaining_slots - user should see all available providers
+                    available_provider_ids = remaining_providers
 
-        base_slots: List[str] = []
-        for avail in availabilities:
-            base_slots.extend(generate_time_slots(avail.start_time, avail.end_time, event_type.duration_minutes))
+                    # But check if slot is still available
+                    if remaining_slots == 0:
+                        reason = reason or "fully_booked"
+                        available_provider_ids = []
+                else:
+                    remaining_slots = max(capacity_limit - int(matrix.booked_count[index]), 0)
+                    if remaining_slots == 0:
+                        reason = "fully_booked"
+
+        if reason in {"no_provider", "provider_unavailable", "template_override"}:
+            capacity_limit = 0
+
+        if template.requires_provider_assignment and available_provider_ids is None:
+            available_provider_ids = []
+
+        available_slots.append(TimeSlot(
+            time=slot,
+            available=reason is None and remaining_slots > 0,
+            remaining_slots=remaining_slots if remaining_slots > 0 else 0,
+            total_capacity=capacity_limit,
+            available_provider_ids=available_provider_ids if template.requires_provider_assignment else None,
+            unavailable_reason=reason
+        ))
+    
+    if event_type.max_bookings_per_day:
+        daily_bookings = day.daily_booking_count()
 
-        date_override = get_relevant_date_override(db, template.id if template else None, target_date)
+        if daily_bookings >= event_type.max_bookings_per_day:
+            available_slots = []
+            result["message"] = "เต็มตามจำนวนที่อนุญาตต่อวัน"
 
-        if date_override:
-            if date_override.is_unavailable:
-                response_data["message"] = date_override.reason or "ไม่เปิดให้จองในวันนี้"
-                response_data["slots"] = []
-                return AvailabilityResponse(**response_data)
-            elif date_override.custom_start_time and date_override.custom_end_time:
-                base_slots = generate_time_slots(
-                    date_override.custom_start_time,
-                    date_override.custom_end_time,
-                    event_type.duration_minutes
-                )
+    result["slots"] = available_slots
+    return result
 
-        if not base_slots:
-            # No slots configured for this day
-            response_data["message"] = response_data["message"] or "ไม่มีเวลาว่างสำหรับวันนี้"
-            return AvailabilityResponse(**response_data)
 
-        resource_limits = resolve_resource_limits(template, target_date)
-        base_capacity = resource_limits["rooms_limit"] or 1
-        if resource_limits["max_concurrent"]:
-            base_capacity = min(base_capacity, resource_limits["max_concurrent"])
+def _event_type_info(event_type: models.EventType) -> Dict:
+    return {
+        "id": event_type.id,
+        "name": event_type.name,
+        "duration": event_type.duration_minutes,
+        "buffer_before": event_type.buffer_before_minutes,
+        "buffer_after": event_type.buffer_after_minutes
+    }
 
-        min_booking_time = datetime.now() + timedelta(hours=event_type.min_notice_hours)
-        slot_duration = timedelta(minutes=event_type.duration_minutes)
 
-        available_slots: List[TimeSlot] = []
-        seen_slots = set()
+def load_day_availability(
+    db: Session,
+    subdomain: str,
+    event_type_id: int,
+    date: str,
+    provider_id: Optional[int] = None
+) -> Dict:
+    """slot ของวันเดียว (ผ่าน availability cache) ในรูป JSON เดียวกับ /booking/availability/{event_type_id}
 
-        for slot in sorted(base_slots):
-            if slot in seen_slots:
-                continue
-            seen_slots.add(slot)
+    ใช้ร่วมกันระหว่าง endpoint รายวันและ endpoint ของหน้าจองสาธารณะ (public_pages.py)
+    """
+    # 1. Get event type with template
+    event_type = db.query(models.EventType).filter_by(
+        id=event_type_id,
+        is_active=True
+    ).first()
 
-            slot_start = parse_datetime(date, slot)
-            slot_end = slot_start + slot_duration
+    if not event_type:
+        raise HTTPException(404, "Event type not found or inactive")
+
+    # 2. Parse date and prepare response metadata
+    target_date = datetime.strptime(date, "%Y-%m-%d").date()
+
+    cached = availability_cache.get(subdomain, event_type_id, target_date, provider_id)
+    if cached is not None:
+        return cached
+
+    template = event_type.availability_template
+
+    response_data = {
+        "date": date,
+        "slots": [],
+        "event_type": _event_type_info(event_type),
+        "template_id": template.id if template else None,
+        "template_type": template.template_type if template else None,
+        "requires_provider_assignment": template.requires_provider_assignment if template else None,
+        "message": None,
+        "is_holiday": False
+    }
 
-            reason = None
-            remaining_slots = 0
-            capacity_limit = base_capacity
-            available_provider_ids: Optional[List[int]] = None
+    # 3. Compute slots (holiday / override / capacity)
+    with availability_timer(subdomain, "day"):
+        window = AvailabilityWindow(db, event_type_id, template, target_date, target_date)
+        response_data.update(evaluate_day_slots(window, event_type, template, target_date, provider_id))
+
+    if provider_id:
+        provider = db.query(models.Provider).filter_by(id=provider_id).first()
+        if provider:
+            response_data["provider"] = {
+                "id": provider.id,
+                "name": provider.name,
+                "title": provider.title
+            }
+
+    payload = AvailabilityResponse(**response_data).model_dump(mode="json")
+    availability_cache.set(
+        subdomain,
+        event_type_id,
+        target_date,
+        provider_id,
+        payload,
+        ttl=availability_cache.ttl_for(target_date, event_type.min_notice_hours)
+    )
+    return payload
 
-            if is_slot_blocked_by_override(date_override, target_date, slot_start, slot_end):
-                reason = "template_override"
-                if template.requires_provider_assignment:
-                    available_provider_ids = []
-                capacity_limit = 0
-            elif slot_start < min_booking_time:
-                reason = "slot_too_soon"
-            else:
-                provider_pool_ids: Optional[List[int]] = None
 
-                if template.requires_provider_assignment:
-                    available_provider_ids = collect_available_providers(
-                        db,
-                        template,
-                        target_date,
-                        slot_start,
-                        slot_end,
-                        date_override
-                    )
-                    if provider_id:
-                        if provider_id not in available_provider_ids:
-                            reason = "provider_unavailable"
-                            available_provider_ids = []
-                        else:
-                            available_provider_ids = [provider_id]
-                    if not reason and available_provider_ids:
-                        capacity_limit = min(capacity_limit, len(available_provider_ids))
-                    elif not reason:
-                        reason = "no_provider"
-                        available_provider_ids = []
-                else:
-                    provider_pool_ids = collect_available_providers(
-                        db,
-                        template,
-                        target_date,
-                        slot_start,
-                        slot_end,
-                        date_override
-                    )
-                    if provider_pool_ids:
-                        capacity_limit = min(capacity_limit, len(provider_pool_ids))
-                    elif not reason:
-                        reason = "no_provider"
-
-                if reason not in {"no_provider", "provider_unavailable"}:
-                    bookings = fetch_slot_bookings(
-                        db,
-                        event_type_id,
-                        slot_start,
-                        slot_end
-                    )
+@router.get("/booking/availability/{event_type_id}")
+@runs_in_threadpool
+def get_booking_availability(
+    subdomain: str,
+    event_type_id: int,
+    date: str,
+    provider_id: Optional[int] = None,
+    db: Session = SyncTenantDB  
+):
+    try:
+        return load_day_availability(db, subdomain, event_type_id, date, provider_id)
 
-                    if template.requires_provider_assignment:
-                        booked_provider_ids = {appt.provider_id for appt in bookings if appt.provider_id}
-                        unassigned_bookings = len([appt for appt in bookings if not appt.provider_id])
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error getting availability: {str(e)}")
 
-                        if available_provider_ids is None:
-                            available_provider_ids = []
 
-                        remaining_providers = [pid for pid in available_provider_ids if pid not in booked_provider_ids]
-                        occupied_slots = len(booked_provider_ids) + unassigned_bookings
-                        capacity_limit = max(capacity_limit, 0)
-                        remaining_slots = max(capacity_limit - occupied_slots, 0)
+def summarize_day(
+    window: AvailabilityWindow,
+    event_type: models.EventType,
+    template: Optional[models.AvailabilityTemplate],
+    target_date: date,
+    provider_id: Optional[int] = None
+) -> DayAvailabilitySummary:
+    """สรุปความว่างของวันเดียว (จำนวน slot ว่าง, เวลาแรกที่ว่าง, วันหยุด/override) จากข้อมูลใน window"""
+    result = evaluate_day_slots(window, event_type, template, target_date, provider_id)
+    open_slots = [slot for slot in result["slots"] if slot.available]
+    holiday = window.holiday(target_date)
+    date_override = window.date_override(target_date)
+
+    return DayAvailabilitySummary(
+        date=target_date.isoformat(),
+        open_slots=len(open_slots),
+        total_slots=len(result["slots"]),
+        first_available=open_slots[0].time if open_slots else None,
+        is_holiday=result["is_holiday"],
+        holiday_name=holiday.name if holiday else None,
+        override={
+            "is_unavailable": date_override.is_unavailable,
+            "custom_start_time": format_time(date_override.custom_start_time) if date_override.custom_start_time else None,
+            "custom_end_time": format_time(date_override.custom_end_time) if date_override.custom_end_time else None,
+            "reason": date_override.reason,
+            "template_scope": date_override.template_scope
+        } if date_override else None,
+        message=result["message"]
+    )
 
-                        # Keep all available providers for user selection
-                        # Don't limit by remaining_slots - user should see all available providers
-                        available_provider_ids = remaining_providers
 
-                        # But check if slot is still available
-                        if remaining_slots == 0:
-                            reason = reason or "fully_booked"
-                            available_provider_ids = []
-                    else:
-                        remaining_slots = max(capacity_limit - len(bookings), 0)
-                        if remaining_slots == 0:
-                            reason = "fully_booked"
+@router.get("/booking/availability/{event_type_id}/range", response_model=AvailabilityRangeResponse)
+@runs_in_threadpool
+def get_booking_availability_range(
+    subdomain: str,
+    event_type_id: int,
+    start: str,
+    end: str,
+    provider_id: Optional[int] = None,
+    db: Session = SyncTenantDB
+):
+    """สรุปความว่างรายวันของช่วงวันที่ (เช่นทั้งเดือน) ใน request เดียวสำหรับปฏิทินหน้าจอง
 
-            if reason in {"no_provider", "provider_unavailable", "template_override"}:
-                capacity_limit = 0
+    holidays, date overrides, schedules, leaves และ appointments โหลดครั้งเดียวสำหรับทั้งช่วง
+    แล้วคำนวณ slot ของแต่ละวันด้วย logic เดียวกับ get_booking_availability
+    """
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end, "%Y-%m-%d").date()
+        if end_date < start_date:
+            raise HTTPException(400, "end must be on or after start")
+        if (end_date - start_date).days + 1 > MAX_AVAILABILITY_RANGE_DAYS:
+            raise HTTPException(400, f"ช่วงวันที่ยาวได้ไม่เกิน {MAX_AVAILABILITY_RANGE_DAYS} วัน")
 
-            if template.requires_provider_assignment and available_provider_ids is None:
-                available_provider_ids = []
+        event_type = db.query(models.EventType).filter_by(
+            id=event_type_id,
+            is_active=True
+        ).first()
 
-            available_slots.append(TimeSlot(
-                time=slot,
-                available=reason is None and remaining_slots > 0,
-                remaining_slots=remaining_slots if remaining_slots > 0 else 0,
-                total_capacity=capacity_limit,
-                available_provider_ids=available_provider_ids if template.requires_provider_assignment else None,
-                unavailable_reason=reason
-            ))
-        
-        if event_type.max_bookings_per_day:
-            daily_bookings = db.query(models.Appointment).filter(
-                models.Appointment.event_type_id == event_type_id,
-                models.Appointment.status.in_(['confirmed', 'pending']),
-                models.Appointment.start_time >= datetime.combine(target_date, time.min),
-                models.Appointment.start_time < datetime.combine(target_date + timedelta(days=1), time.min)
-            ).count()
+        if not event_type:
+            raise HTTPException(404, "Event type not found or inactive")
 
-            if daily_bookings >= event_type.max_bookings_per_day:
-                available_slots = []
-                response_data["message"] = "เต็มตามจำนวนที่อนุญาตต่อวัน"
+        template = event_type.availability_template
 
-        response_data["slots"] = available_slots
+        days: List[DayAvailabilitySummary] = []
+        with availability_timer(subdomain, "range"):
+            window = AvailabilityWindow(db, event_type_id, template, start_date, end_date)
+            current = start_date
+            while current <= end_date:
+                days.append(summarize_day(window, event_type, template, current, provider_id))
+                current += timedelta(days=1)
+
+        return AvailabilityRangeResponse(
+            start=start_date.isoformat(),
+            end=end_date.isoformat(),
+            event_type=_event_type_info(event_type),
+            template_id=template.id if template else None,
+            days=days
+        )
 
-        if provider_id:
-            provider = db.query(models.Provider).filter_by(id=provider_id).first()
-            if provider:
-                response_data["provider"] = {
-                    "id": provider.id,
-                    "name": provider.name,
-                    "title": provider.title
-                }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error getting availability range: {str(e)}")
 
-        return AvailabilityResponse(**response_data)
-        
+def _day_may_have_slots(window: AvailabilityWindow, target_date: date) -> bool:
+    """ตัดวันที่ปิดแน่นอนออกก่อนคำนวณ slot: วันหยุด, override ปิดทั้งวัน, วันที่ template ไม่เปิด
+
+    ใช้เฉพาะข้อมูลระดับวันใน window (ไม่โหลด schedules / appointments ของวันนั้น)
+    """
+    if window.holiday(target_date):
+        return False
+    date_override = window.date_override(target_date)
+    if date_override:
+        if date_override.is_unavailable:
+            return False
+        if date_override.custom_start_time and date_override.custom_end_time:
+            return True
+    return bool(window.availabilities(target_date))
+
+
+@router.get("/booking/next-available", response_model=NextAvailableResponse)
+@runs_in_threadpool
+def get_next_available_slots(
+    subdomain: str,
+    event_type_ids: str,
+    limit: int = 5,
+    provider_id: Optional[int] = None,
+    start: Optional[str] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    db: Session = SyncTenantDB
+):
+    """slot ว่างที่เร็วที่สุด limit รายการของ event type หนึ่งหรือหลายตัว (event_type_ids=1,2,3)
+
+    ไล่ทีละวันตั้งแต่ start (default วันนี้) ไปจนถึง max_advance_days ของแต่ละ event type
+    และหยุดทันทีเมื่อได้ครบ — ข้อมูลโหลดเป็นช่วงละ NEXT_AVAILABLE_CHUNK_DAYS วันต่อ event type
+    วันหยุด / override ปิดทั้งวัน / วันที่ template ไม่เปิด ข้ามโดยไม่คำนวณ slot
+    time_from / time_to (HH:MM) กรองเวลาเริ่มของ slot ในช่วง [time_from, time_to)
+    """
+    try:
+        ids = [int(value) for value in event_type_ids.split(',') if value.strip()]
+        if not ids:
+            raise HTTPException(400, "ต้องระบุ event_type_ids อย่างน้อย 1 รายการ")
+        if not 1 <= limit <= MAX_NEXT_AVAILABLE_SLOTS:
+            raise HTTPException(400, f"limit ต้องอยู่ระหว่าง 1 ถึง {MAX_NEXT_AVAILABLE_SLOTS}")
+
+        earliest = datetime.strptime(time_from, "%H:%M").time() if time_from else None
+        latest = datetime.strptime(time_to, "%H:%M").time() if time_to else None
+
+        today = datetime.now().date()
+        start_date = max(datetime.strptime(start, "%Y-%m-%d").date(), today) if start else today
+
+        event_types = db.query(models.EventType).filter(
+            models.EventType.id.in_(ids),
+            models.EventType.is_active == True
+        ).order_by(models.EventType.id).all()
+        if not event_types:
+            raise HTTPException(404, "Event type not found or inactive")
+
+        # event type ที่ค้นได้: มี template และ horizon ยังไม่ผ่าน start_date
+        horizons = {}
+        for event_type in event_types:
+            horizon = today + timedelta(days=event_type.max_advance_days)
+            if event_type.availability_template and horizon >= start_date:
+                horizons[event_type.id] = horizon
+
+        found: List[NextAvailableSlot] = []
+        windows: Dict[int, AvailabilityWindow] = {}
+        last_date = max(horizons.values()) if horizons else start_date
+        current = start_date
+        searched_until = start_date
+
+        with availability_timer(subdomain, "next"):
+            while current <= last_date and len(found) < limit:
+                for event_type in event_types:
+                    horizon = horizons.get(event_type.id)
+                    if horizon is None or current > horizon:
+                        continue
+
+                    window = windows.get(event_type.id)
+                    if window is None or current > window.end_date:
+                        window_end = min(current + timedelta(days=NEXT_AVAILABLE_CHUNK_DAYS - 1), horizon)
+                        window = AvailabilityWindow(
+                            db, event_type.id, event_type.availability_template, current, window_end
+                        )
+                        windows[event_type.id] = window
+
+                    if not _day_may_have_slots(window, current):
+                        continue
+
+                    result = evaluate_day_slots(
+                        window, event_type, event_type.availability_template, current, provider_id
+                    )
+                    for slot in result["slots"]:
+                        if not slot.available:
+                            continue
+                        slot_time = datetime.strptime(slot.time, "%H:%M").time()
+                        if (earliest and slot_time < earliest) or (latest and slot_time >= latest):
+                            continue
+                        found.append(NextAvailableSlot(
+                            date=current.isoformat(),
+                            time=slot.time,
+                            event_type_id=event_type.id,
+                            event_type_name=event_type.name,
+                            remaining_slots=slot.remaining_slots,
+                            available_provider_ids=slot.available_provider_ids
+                        ))
+
+                # ตรวจครบทุก event type ของวันนี้แล้ว — ถ้าได้ครบ limit วันถัดไปมีแต่ slot ที่ช้ากว่า จึงหยุดได้
+                searched_until = current
+                current += timedelta(days=1)
+
+        found.sort(key=lambda slot: (slot.date, slot.time, slot.event_type_id))
+        return NextAvailableResponse(
+            slots=found[:limit],
+            searched_from=start_date.isoformat(),
+            searched_until=searched_until.isoformat(),
+            exhausted=len(found) < limit
+        )
+
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(400, str(e))
     except Exception as e:
-        raise HTTPException(500, f"Error getting availability: {str(e)}")
+        raise HTTPException(500, f"Error searching next available slots: {str(e)}")
 
 @router.post("/booking/create") 
-async def create_booking(
+@runs_in_threadpool
+def create_booking(
     subdomain: str,
     booking: BookingCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)  # ใช้ get_db ปกติ
+    db: Session = SyncTenantDB
 ):
     """Create a new appointment booking"""
     
-    # Set search_path ด้วยตัวเองในแต่ละ function (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
     schema_name = f"tenant_{subdomain}"
-    try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Tenant not found: {subdomain}")
     
     try:
         # 1. Validate event type
@@ -824,6 +1059,9 @@ async def create_booking(
         if not template:
             raise HTTPException(400, "บริการนี้ยังไม่ได้ตั้งค่าเวลาทำการ")
 
+        # ล็อก slot ก่อนตรวจ — request ที่แย่ง slot เดียวกันตรวจและ insert ทีละคน (ดู slot_locks.py)
+        lock_booking_slot(db, schema_name, event_type, appointment_datetime)
+
         # Enforce daily booking limit before allocating provider
         if event_type.max_bookings_per_day:
             target_date = appointment_datetime.date()
@@ -838,6 +1076,7 @@ async def create_booking(
                 raise HTTPException(409, "จำนวนการจองต่อวันเต็มแล้ว")
 
         slot_end = appointment_datetime + timedelta(minutes=event_type.duration_minutes)
+        reserve_inventory_slot(db, schema_name, event_type, appointment_datetime)
         assigned_provider_id = ensure_slot_capacity(
             db,
             event_type,
@@ -849,49 +1088,12 @@ async def create_booking(
 
         provider_to_use = assigned_provider_id
         
-        # 4. Create or find patient
-        patient = None
-        if booking.guest_email:
-            patient = db.query(models.Patient).filter_by(
-                email=booking.guest_email
-            ).first()
-        
-        if not patient and booking.guest_phone:
-            patient = db.query(models.Patient).filter_by(
-                phone_number=booking.guest_phone
-            ).first()
-        
-        if not patient:
-            patient = models.Patient(
-                name=booking.guest_name,
-                email=booking.guest_email,
-                phone_number=booking.guest_phone
-            )
-            db.add(patient)
-            db.flush()
-        
-        # 5. Get or create service type (default)
-        service_type = db.query(models.ServiceType).filter_by(
-            name="General"
-        ).first()
-        
-        if not service_type:
-            service_type = models.ServiceType(
-                name="General",
-                description="General appointment",
-                is_active=True
-            )
-            db.add(service_type)
-            db.flush()
-        
-        # 6. Create appointment
+        # 4. Create appointment — patient และ service type ใส่ด้วย _attach_patients (query เดียว)
         booking_ref = generate_booking_reference()
         
         appointment = models.Appointment(
-            patient_id=patient.id,
             provider_id=provider_to_use,  # อาจเป็น None หาก template ไม่บังคับเลือกผู้ให้บริการ
             event_type_id=booking.event_type_id,
-            service_type_id=service_type.id,
             start_time=appointment_datetime,
             end_time=slot_end,
             booking_reference=booking_ref,
@@ -901,16 +1103,17 @@ async def create_booking(
             guest_phone=booking.guest_phone,
             notes=booking.notes
         )
+        _attach_patients(db, schema_name, [(booking, appointment)])
         
-        # เก็บค่าที่ต้องใช้หลัง commit ไว้ก่อน — หลัง commit instance จะ expire
-        # และการเข้าถึง attribute อาจวิ่งไปคนละ connection ที่ search_path ไม่ใช่ tenant นี้
+        # เก็บค่าที่ต้องใช้หลัง commit ไว้ก่อน — หลัง commit instance อาจ expire
         hospital_name = _hospital_display_name(db, subdomain)
         event_type_name = event_type.name
 
         db.add(appointment)
         db.commit()
+        availability_cache.invalidate_days(subdomain, [appointment_datetime.date()])
 
-        # 7. Queue email notification (ส่งเฉพาะค่า primitive — ORM object จะ detached หลัง session ปิด)
+        # 5. Queue email notification (ส่งเฉพาะค่า primitive — ORM object จะ detached หลัง session ปิด)
         if booking.guest_email:
             background_tasks.add_task(
                 send_appointment_confirmation,
@@ -922,7 +1125,7 @@ async def create_booking(
                 booking.guest_name,
             )
 
-        # 8. Return confirmation
+        # 6. Return confirmation
         return BookingResponse(
             success=True,
             booking_reference=booking_ref,
@@ -938,39 +1141,505 @@ async def create_booking(
     except HTTPException:
         raise
     except Exception as e:
+        raise_for_provider_overlap(db, e)
         db.rollback()
         raise HTTPException(500, f"Error creating booking: {str(e)}")
 
+def _claim_slot(
+    db: Session,
+    schema_name: str,
+    event_type: models.EventType,
+    window: AvailabilityWindow,
+    slot_start: datetime,
+    slot_end: datetime,
+    provider_id: Optional[int] = None
+) -> Optional[int]:
+    """ตรวจ slot หนึ่งของการจองแบบกลุ่ม/ต่อเนื่องจากข้อมูลใน window แล้วตัด inventory — คืน provider ที่ได้
+
+    ไม่ผ่านโยน HTTPException (ข้อความเดียวกับ /booking/create) โดยยังไม่ได้เขียนอะไรลงฐานข้อมูล
+    ผู้เรียกต้องถือล็อกของ slot แล้ว (lock_booking_slots) และเพิ่มนัดที่สร้างเข้า DayAvailability เอง
+    """
+    day = window.day(slot_start.date())
+    if event_type.max_bookings_per_day and day.daily_booking_count() >= event_type.max_bookings_per_day:
+        raise HTTPException(409, "จำนวนการจองต่อวันเต็มแล้ว")
+
+    assigned_provider_id = ensure_slot_capacity(
+        db,
+        event_type,
+        event_type.availability_template,
+        slot_start,
+        slot_end,
+        provider_id,
+        day=day,
+        window=window
+    )
+    # ตรวจในหน่วยความจำผ่านแล้วค่อยตัด inventory — รายการที่ไม่ผ่านจึงไม่มีอะไรต้องคืน
+    reserve_inventory_slot(db, schema_name, event_type, slot_start)
+    return assigned_provider_id
+
+
+def _pending_appointment(
+    event_type: models.EventType,
+    booking: BookingCreate,
+    slot_start: datetime,
+    slot_end: datetime,
+    provider_id: Optional[int],
+    used_references: set
+) -> models.Appointment:
+    """Appointment ที่ยังไม่ add เข้า session (patient / service type ใส่ภายหลังด้วย _attach_patients)"""
+    booking_ref = generate_booking_reference()
+    while booking_ref in used_references:
+        booking_ref = generate_booking_reference()
+    used_references.add(booking_ref)
+
+    return models.Appointment(
+        provider_id=provider_id,
+        event_type_id=event_type.id,
+        start_time=slot_start,
+        end_time=slot_end,
+        booking_reference=booking_ref,
+        status='confirmed',
+        guest_name=booking.guest_name,
+        guest_email=booking.guest_email,
+        guest_phone=booking.guest_phone,
+        notes=booking.notes
+    )
+
+
+def _attach_patients(db: Session, schema_name: str, pairs: List[Tuple[BookingCreate, models.Appointment]]):
+    """Find or create patients ของทุกนัดด้วย query เดียว — เทียบ email ก่อน แล้วค่อยเบอร์โทร (ค่า normalize)
+
+    ล็อกผู้ติดต่อก่อนค้นหา (lock_patient_contacts) การจองพร้อมกันของคนเดียวกันจึงได้ patient คนเดียว
+    ผู้ติดต่อซ้ำกันใน batch ใช้ patient คนเดียวกัน และใส่ service type "General" ให้ทุกนัด
+    """
+    contacts = [
+        (models.normalize_email(booking.guest_email), models.normalize_phone(booking.guest_phone))
+        for booking, _ in pairs
+    ]
+    lock_patient_contacts(db, schema_name, contacts)
+
+    emails = {email for email, _ in contacts if email}
+    phones = {phone for _, phone in contacts if phone}
+    conditions = []
+    if emails:
+        conditions.append(models.Patient.email_normalized.in_(emails))
+    if phones:
+        conditions.append(models.Patient.phone_normalized.in_(phones))
+    by_email: Dict[str, models.Patient] = {}
+    by_phone: Dict[str, models.Patient] = {}
+    if conditions:
+        for patient in db.query(models.Patient).filter(or_(*conditions)).order_by(models.Patient.id).all():
+            if patient.email_normalized:
+                by_email.setdefault(patient.email_normalized, patient)
+            if patient.phone_normalized:
+                by_phone.setdefault(patient.phone_normalized, patient)
+
+    service_type = db.query(models.ServiceType).filter_by(name="General").first()
+    if not service_type:
+        service_type = models.ServiceType(
+            name="General",
+            description="General appointment",
+            is_active=True
+        )
+        db.add(service_type)
+
+    for (booking, appointment), (email, phone) in zip(pairs, contacts):
+        patient = by_email.get(email) if email else None
+        if not patient and phone:
+            patient = by_phone.get(phone)
+        if not patient:
+            patient = models.Patient(
+                name=booking.guest_name,
+                email=booking.guest_email,
+                phone_number=booking.guest_phone
+            )
+            db.add(patient)
+            if email:
+                by_email[email] = patient
+            if phone:
+                by_phone.setdefault(phone, patient)
+        appointment.patient = patient
+        appointment.service_type = service_type
+
+
+def _batch_windows(
+    db: Session,
+    event_type: models.EventType,
+    dates: List[date]
+) -> Dict[date, AvailabilityWindow]:
+    """AvailabilityWindow ของแต่ละวันที่ขอ — วันที่ใกล้กันใช้ window เดียวกัน (ยาวไม่เกิน MAX_AVAILABILITY_RANGE_DAYS)"""
+    windows: Dict[date, AvailabilityWindow] = {}
+    chunk: List[date] = []
+    for target_date in sorted(set(dates)) + [None]:
+        if chunk and (target_date is None or (target_date - chunk[0]).days >= MAX_AVAILABILITY_RANGE_DAYS):
+            window = AvailabilityWindow(db, event_type.id, event_type.availability_template, chunk[0], chunk[-1])
+            windows.update((day, window) for day in chunk)
+            chunk = []
+        if target_date is not None:
+            chunk.append(target_date)
+    return windows
+
+
+def _add_to_other_windows(
+    windows: Dict[int, Dict[date, AvailabilityWindow]],
+    event_type_id: int,
+    appointment: models.Appointment
+):
+    """นับนัดที่เพิ่งผ่านเป็นนัดของบริการอื่นในทุกวันที่ทับ ของ event type อื่นใน batch"""
+    for other_type_id, by_date in windows.items():
+        if other_type_id == event_type_id:
+            continue
+        for target_date, window in by_date.items():
+            day_start, next_day_start = day_bounds(target_date)
+            if appointment.start_time < next_day_start and appointment.end_time > day_start:
+                window.day(target_date).add_other_booking(appointment)
+
+
+@router.post("/booking/batch", response_model=BatchBookingResponse)
+@runs_in_threadpool
+def create_booking_batch(
+    subdomain: str,
+    payload: BatchBookingRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = SyncTenantDB
+):
+    """จองหลายนัดใน transaction เดียว (เช่นกลุ่มผู้ป่วยฟอกไต / รายชื่อฉีดวัคซีน)
+
+    ตรวจเงื่อนไขเดียวกับ /booking/create แต่ทำครั้งเดียวต่อกลุ่ม:
+        - event type ทั้งหมดโหลดใน query เดียว
+        - จัดกลุ่มตาม (event type, วัน) แล้วใช้ DayAvailability ของวันนั้นตรวจทุกนัดในกลุ่ม
+          นัดที่ผ่านแล้วถูกนับเข้า occupancy ทันที นัดถัดไปในวันเดียวกันจึงเห็นที่ที่ถูกใช้ไป
+          และนับเป็นนัดของบริการอื่นใน DayAvailability ของ event type อื่นใน batch
+          (provider คนเดียวกันจึงไม่ถูกจัดให้สองบริการที่ทับเวลากัน — ไม่ชน exclusion constraint ตอน commit)
+        - ล็อกทุก slot ที่ขอใน statement เดียว, ค้นหา patient ใน query เดียว
+    รายการที่ไม่ผ่านไม่ทำให้รายการอื่นล้ม — ผลแยกต่อรายการตามลำดับใน request
+    อีเมลยืนยันส่งเป็นกลุ่มใน background task เดียว
+    """
+
+    schema_name = f"tenant_{subdomain}"
+    bookings = payload.bookings
+    results: Dict[int, BatchBookingItemResult] = {}
+
+    def fail(index: int, status_code: int, detail: str):
+        results[index] = BatchBookingItemResult(index=index, success=False, status_code=status_code, error=detail)
+
+    try:
+        # 1. Validate event types (query เดียวสำหรับทั้ง batch)
+        event_types = {
+            event_type.id: event_type
+            for event_type in db.query(models.EventType).filter(
+                models.EventType.id.in_({booking.event_type_id for booking in bookings}),
+                models.EventType.is_active == True
+            ).all()
+        }
+
+        # 2. ตรวจเงื่อนไขที่ไม่ต้องใช้ข้อมูลการจอง แล้วจัดกลุ่มตาม (event type, วัน)
+        now = datetime.now()
+        groups: Dict[Tuple[int, date], List[Tuple[int, datetime]]] = {}
+        for index, booking in enumerate(bookings):
+            event_type = event_types.get(booking.event_type_id)
+            if not event_type:
+                fail(index, 404, "Event type not found or inactive")
+                continue
+            try:
+                appointment_datetime = parse_datetime(booking.date, booking.time)
+            except ValueError:
+                fail(index, 400, "รูปแบบวันที่หรือเวลาไม่ถูกต้อง")
+                continue
+            if appointment_datetime < now:
+                fail(index, 400, "Cannot book in the past")
+                continue
+            if appointment_datetime < now + timedelta(hours=event_type.min_notice_hours):
+                fail(index, 400, f"Booking requires at least {event_type.min_notice_hours} hours notice")
+                continue
+            if not event_type.availability_template:
+                fail(index, 400, "บริการนี้ยังไม่ได้ตั้งค่าเวลาทำการ")
+                continue
+            groups.setdefault((event_type.id, appointment_datetime.date()), []).append((index, appointment_datetime))
+
+        # 3. ล็อกทุก slot ที่ขอครั้งเดียว (เรียงตาม key) ก่อนตรวจ capacity
+        lock_booking_slots(db, schema_name, [
+            (event_types[event_type_id], slot_start)
+            for (event_type_id, _), entries in groups.items()
+            for _, slot_start in entries
+        ])
+
+        windows: Dict[int, Dict[date, AvailabilityWindow]] = {}
+        for event_type_id in {event_type_id for event_type_id, _ in groups}:
+            windows[event_type_id] = _batch_windows(
+                db,
+                event_types[event_type_id],
+                [target_date for et_id, target_date in groups if et_id == event_type_id]
+            )
+
+        # 4. ตรวจ capacity ต่อกลุ่ม — นัดในกลุ่มเรียงตามเวลา (เวลาเดียวกันตามลำดับใน request)
+        created: List[Tuple[int, BookingCreate, models.Appointment]] = []
+        used_references = set()
+        for (event_type_id, target_date), entries in sorted(groups.items()):
+            event_type = event_types[event_type_id]
+            window = windows[event_type_id][target_date]
+            day = window.day(target_date)
+            slot_duration = timedelta(minutes=event_type.duration_minutes)
+
+            for index, slot_start in sorted(entries, key=lambda entry: entry[1]):
+                booking = bookings[index]
+                slot_end = slot_start + slot_duration
+                try:
+                    provider_id = _claim_slot(
+                        db, schema_name, event_type, window, slot_start, slot_end, booking.provider_id
+                    )
+                except HTTPException as exc:
+                    fail(index, exc.status_code, exc.detail)
+                    continue
+
+                appointment = _pending_appointment(
+                    event_type, booking, slot_start, slot_end, provider_id, used_references
+                )
+                day.add_booking(appointment)
+                if provider_id is not None:
+                    _add_to_other_windows(windows, event_type_id, appointment)
+                created.append((index, booking, appointment))
+
+        if created:
+            # 5. Find or create patients (query เดียว, รายการซ้ำใน batch ใช้ patient คนเดียวกัน)
+            _attach_patients(db, schema_name, [(booking, appointment) for _, booking, appointment in created])
+
+            # เก็บค่าที่ต้องใช้หลัง commit ไว้ก่อน — หลัง commit instance อาจ expire
+            hospital_name = _hospital_display_name(db, subdomain)
+            confirmations = [
+                {
+                    'to': booking.guest_email,
+                    'booking_reference': appointment.booking_reference,
+                    'event_name': event_types[booking.event_type_id].name,
+                    'start_time': appointment.start_time,
+                    'guest_name': booking.guest_name,
+                }
+                for _, booking, appointment in created if booking.guest_email
+            ]
+            for index, _, appointment in created:
+                results[index] = BatchBookingItemResult(
+                    index=index,
+                    success=True,
+                    booking_reference=appointment.booking_reference,
+                    appointment_datetime=appointment.start_time.isoformat(),
+                    provider_id=appointment.provider_id
+                )
+            booked_days = {appointment.start_time.date() for _, _, appointment in created}
+
+            db.add_all([appointment for _, _, appointment in created])
+            db.commit()
+
+            availability_cache.invalidate_days(subdomain, sorted(booked_days))
+
+            # 6. Queue email notifications (ส่งทั้งกลุ่มใน SMTP connection เดียว)
+            if confirmations:
+                background_tasks.add_task(send_appointment_confirmations, hospital_name, confirmations)
+        else:
+            # ไม่มีรายการที่จองได้ — คืนล็อกและ inventory ที่เติมไว้
+            db.rollback()
+
+        succeeded = len(created)
+        return BatchBookingResponse(
+            total=len(bookings),
+            succeeded=succeeded,
+            failed=len(bookings) - succeeded,
+            results=[results[index] for index in range(len(bookings))]
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise_for_provider_overlap(db, e)
+        db.rollback()
+        raise HTTPException(500, f"Error creating batch booking: {str(e)}")
+
+@router.post("/booking/series", response_model=SeriesBookingResponse)
+@runs_in_threadpool
+def create_booking_series(
+    subdomain: str,
+    booking: SeriesBookingCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = SyncTenantDB
+):
+    """จองนัดต่อเนื่องตาม RRULE (เช่น จ/พ/ศ 12 สัปดาห์) ใน transaction เดียว
+
+    ทุกครั้งของชุดตรวจใน pass เดียวกับ AvailabilityWindow ของทั้งช่วง (วันหยุด, date override,
+    วันลา, ตารางเวลา และนัดที่มีอยู่โหลดครั้งเดียว) — จำนวน query ไม่ขึ้นกับจำนวนครั้ง
+    ถ้าไม่ระบุ provider ระบบพยายามให้ทุกครั้งได้ provider คนเดิมกับครั้งก่อนหน้า
+    skip_conflicts=False (default): ครั้งใดไม่ว่างตอบ 409 พร้อมรายการที่ชน และไม่จองเลย
+    """
+
+    schema_name = f"tenant_{subdomain}"
+
+    try:
+        event_type = db.query(models.EventType).filter_by(
+            id=booking.event_type_id,
+            is_active=True
+        ).first()
+
+        if not event_type:
+            raise HTTPException(404, "Event type not found or inactive")
+
+        template = event_type.availability_template
+        if not template:
+            raise HTTPException(400, "บริการนี้ยังไม่ได้ตั้งค่าเวลาทำการ")
+
+        rrule = normalize_rrule(booking.rrule)
+        dtstart = parse_datetime(booking.date, booking.time)
+        occurrences = expand_rrule(rrule, dtstart, MAX_SERIES_OCCURRENCES)
+
+        results: Dict[datetime, SeriesOccurrenceResult] = {}
+
+        def fail(slot_start: datetime, detail: str):
+            results[slot_start] = SeriesOccurrenceResult(
+                appointment_datetime=slot_start.isoformat(), success=False, error=detail
+            )
+
+        now = datetime.now()
+        min_booking_time = now + timedelta(hours=event_type.min_notice_hours)
+        candidates = []
+        for slot_start in occurrences:
+            if slot_start < now:
+                fail(slot_start, "Cannot book in the past")
+            elif slot_start < min_booking_time:
+                fail(slot_start, f"Booking requires at least {event_type.min_notice_hours} hours notice")
+            else:
+                candidates.append(slot_start)
+
+        created: List[models.Appointment] = []
+        if candidates:
+            lock_booking_slots(db, schema_name, [(event_type, slot_start) for slot_start in candidates])
+
+            # ข้อมูลของทั้งช่วงโหลดครั้งเดียว แต่ละครั้งตัดเฉพาะวันของตัวเองจาก window
+            window = AvailabilityWindow(db, event_type.id, template, candidates[0].date(), candidates[-1].date())
+            slot_duration = timedelta(minutes=event_type.duration_minutes)
+            used_references = set()
+            preferred_provider_id = booking.provider_id
+
+            for slot_start in candidates:
+                slot_end = slot_start + slot_duration
+                try:
+                    try:
+                        provider_id = _claim_slot(
+                            db, schema_name, event_type, window, slot_start, slot_end, preferred_provider_id
+                        )
+                    except HTTPException:
+                        if booking.provider_id or not preferred_provider_id:
+                            raise
+                        # provider คนเดิมไม่ว่างครั้งนี้ — ให้ระบบเลือกคนอื่น
+                        provider_id = _claim_slot(db, schema_name, event_type, window, slot_start, slot_end)
+                except HTTPException as exc:
+                    fail(slot_start, exc.detail)
+                    continue
+
+                if provider_id and not booking.provider_id:
+                    preferred_provider_id = provider_id
+
+                appointment = _pending_appointment(
+                    event_type, booking, slot_start, slot_end, provider_id, used_references
+                )
+                window.day(slot_start.date()).add_booking(appointment)
+                created.append(appointment)
+                results[slot_start] = SeriesOccurrenceResult(
+                    appointment_datetime=slot_start.isoformat(),
+                    success=True,
+                    booking_reference=appointment.booking_reference,
+                    provider_id=provider_id
+                )
+
+        conflicts = [result for result in results.values() if not result.success]
+        if not created or (conflicts and not booking.skip_conflicts):
+            db.rollback()
+            raise HTTPException(409, detail={
+                "message": "ไม่สามารถจองนัดต่อเนื่องได้ครบทุกครั้ง" if created else "ไม่มีวันนัดในชุดที่จองได้",
+                "conflicts": [result.model_dump() for result in conflicts],
+            })
+
+        series = models.AppointmentSeries(
+            event_type_id=event_type.id,
+            provider_id=booking.provider_id,
+            rrule=rrule,
+            dtstart=dtstart,
+            occurrence_count=len(created)
+        )
+        _attach_patients(db, schema_name, [(booking, appointment) for appointment in created])
+        series.patient = created[0].patient
+        for appointment in created:
+            appointment.series = series
+
+        # เก็บค่าที่ต้องใช้หลัง commit ไว้ก่อน — หลัง commit instance อาจ expire
+        hospital_name = _hospital_display_name(db, subdomain)
+        event_type_name = event_type.name
+        first_appointment = created[0]
+        first_reference, first_start = first_appointment.booking_reference, first_appointment.start_time
+
+        db.add(series)
+        db.add_all(created)
+        db.commit()
+        availability_cache.invalidate_days(
+            subdomain, sorted({appointment.start_time.date() for appointment in created})
+        )
+
+        # อีเมลฉบับเดียวสำหรับทั้งชุด (อ้างอิงนัดแรก) แทนหนึ่งฉบับต่อครั้ง
+        if booking.guest_email:
+            background_tasks.add_task(
+                send_appointment_confirmation,
+                booking.guest_email,
+                hospital_name,
+                first_reference,
+                f"{event_type_name} (นัดต่อเนื่อง {len(created)} ครั้ง)",
+                first_start,
+                booking.guest_name,
+            )
+
+        return SeriesBookingResponse(
+            success=True,
+            series_id=series.id,
+            rrule=rrule,
+            booked=len(created),
+            skipped=len(conflicts),
+            event_type_name=event_type_name,
+            occurrences=[results[slot_start] for slot_start in sorted(results)],
+            message=f"จองนัดต่อเนื่องสำเร็จ {len(created)} ครั้ง"
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise_for_provider_overlap(db, e)
+        db.rollback()
+        raise HTTPException(500, f"Error creating booking series: {str(e)}")
+
 @router.get("/booking/{booking_reference}")
-async def get_booking_details(
+@runs_on_async_session
+def get_booking_details(
     subdomain: str,
     booking_reference: str,
-    db: Session = Depends(get_db)   
+    db: Session = AsyncTenantDB   
 ):
     """Get booking details by reference"""
     
-    # Set search_path ทุกครั้ง (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
-    schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
-    appointment = db.query(models.Appointment).filter_by(
+    appointment = db.query(models.Appointment).options(
+        joinedload(models.Appointment.event_type),
+        joinedload(models.Appointment.provider)
+    ).filter_by(
         booking_reference=booking_reference
     ).first()
     
     if not appointment:
         raise HTTPException(404, "Booking not found")
     
-    # Get related data
-    event_type = db.query(models.EventType).filter_by(
-        id=appointment.event_type_id
-    ).first()
-    
-    provider = None
-    if appointment.provider_id:
-        provider = db.query(models.Provider).filter_by(
-            id=appointment.provider_id
-        ).first()
-    
+    return booking_details(appointment)
+
+
+def booking_details(appointment: models.Appointment) -> Dict:
+    """ข้อมูลการจองที่หน้าจัดการ/เลื่อนนัดใช้ (event_type และ provider ควรโหลดมาพร้อม appointment แล้ว)"""
+    event_type = appointment.event_type
+    provider = appointment.provider
+
     return {
         "booking_reference": appointment.booking_reference,
         "status": appointment.status,
@@ -991,21 +1660,21 @@ async def get_booking_details(
         } if provider else None,
         "can_reschedule": appointment.start_time > datetime.now() + timedelta(hours=4),
         "can_cancel": appointment.start_time > datetime.now() + timedelta(hours=4),
+        "series_id": appointment.series_id,
         "created_at": appointment.created_at.isoformat()
     }
 
 @router.post("/booking/reschedule")
-async def reschedule_booking(
+@runs_in_threadpool
+def reschedule_booking(
     subdomain: str,
     request: RescheduleRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)  
+    db: Session = SyncTenantDB  
 ):
     """Reschedule an existing booking"""
 
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
     schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
 
     try:
         # 1. Find original appointment
@@ -1040,6 +1709,8 @@ async def reschedule_booking(
         if not template:
             raise HTTPException(400, "บริการนี้ยังไม่ได้ตั้งค่าเวลาทำการ")
 
+        lock_booking_slot(db, schema_name, event_type, new_datetime)
+
         if event_type.max_bookings_per_day:
             target_date = new_datetime.date()
             daily_bookings = db.query(models.Appointment).filter(
@@ -1057,6 +1728,17 @@ async def reschedule_booking(
 
         requested_provider_id = request.provider_id or original.provider_id
 
+        # แตะแถว slot_inventory ตามลำดับเวลา (slot ที่เร็วกว่าก่อน) — การเลื่อนนัดสวนทางกัน
+        # สองรายการจะไม่ล็อกแถวไขว้กันจน deadlock
+        release_original = original.status in ('confirmed', 'pending')
+        if release_original and original.start_time <= new_datetime:
+            release_slot(db, schema_name, original.event_type_id, original.start_time)
+            reserve_inventory_slot(db, schema_name, event_type, new_datetime)
+        else:
+            reserve_inventory_slot(db, schema_name, event_type, new_datetime)
+            if release_original:
+                release_slot(db, schema_name, original.event_type_id, original.start_time)
+
         try:
             assigned_provider_id = ensure_slot_capacity(
                 db,
@@ -1079,6 +1761,7 @@ async def reschedule_booking(
             else:
                 raise
 
+        previous_date = original.start_time.date()
         original.start_time = new_datetime
         original.end_time = new_end
         original.provider_id = assigned_provider_id
@@ -1103,6 +1786,7 @@ async def reschedule_booking(
         hospital_name = _hospital_display_name(db, subdomain)
 
         db.commit()
+        availability_cache.invalidate_days(subdomain, [previous_date, new_datetime.date()])
 
         if guest_email:
             background_tasks.add_task(
@@ -1126,22 +1810,22 @@ async def reschedule_booking(
     except HTTPException:
         raise
     except Exception as e:
+        raise_for_provider_overlap(db, e)
         db.rollback()
         raise HTTPException(500, f"Error rescheduling: {str(e)}")
 
 
 @router.post("/booking/restore")
-async def restore_booking(
+@runs_in_threadpool
+def restore_booking(
     subdomain: str,
     request: RestoreRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = SyncTenantDB
 ):
     """Restore a previously cancelled booking if the original slot is still available."""
 
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
     schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
 
     try:
         appointment = db.query(models.Appointment).filter_by(
@@ -1172,6 +1856,9 @@ async def restore_booking(
         slot_start = appointment.start_time
         slot_end = appointment.end_time
 
+        lock_booking_slot(db, schema_name, event_type, slot_start)
+        reserve_inventory_slot(db, schema_name, event_type, slot_start)
+
         try:
             assigned_provider_id = ensure_slot_capacity(
                 db,
@@ -1208,6 +1895,7 @@ async def restore_booking(
         hospital_name = _hospital_display_name(db, subdomain)
 
         db.commit()
+        availability_cache.invalidate_days(subdomain, [slot_start.date()])
 
         if guest_email:
             # กู้คืนนัดเดิม = ยืนยันนัดอีกครั้ง
@@ -1230,20 +1918,20 @@ async def restore_booking(
     except HTTPException:
         raise
     except Exception as e:
+        raise_for_provider_overlap(db, e)
         db.rollback()
         raise HTTPException(500, f"Error restoring booking: {str(e)}")
 
 @router.post("/booking/cancel")
-async def cancel_booking(
+@runs_in_threadpool
+def cancel_booking(
     subdomain: str,
     request: CancelRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)  
+    db: Session = SyncTenantDB  
 ):
     """Cancel an existing booking"""
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
     schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
 
     try:
         # Find appointment
@@ -1259,6 +1947,8 @@ async def cancel_booking(
         if appointment.start_time <= datetime.now() + timedelta(hours=4):
             raise HTTPException(400, "Cannot cancel within 4 hours of appointment")
         
+        release_slot(db, schema_name, appointment.event_type_id, appointment.start_time)
+
         # Update status
         appointment.status = 'cancelled'
         appointment.cancelled_at = datetime.now()
@@ -1270,13 +1960,15 @@ async def cancel_booking(
         guest_name = appointment.guest_name
         start_time = appointment.start_time
         cancelled_at = appointment.cancelled_at
+        cancelled_event_type_id = appointment.event_type_id
         cancelled_event = db.query(models.EventType).filter_by(
-            id=appointment.event_type_id
+            id=cancelled_event_type_id
         ).first()
         event_type_name = cancelled_event.name if cancelled_event else None
         hospital_name = _hospital_display_name(db, subdomain)
 
         db.commit()
+        availability_cache.invalidate_days(subdomain, [start_time.date()])
 
         # Send notification
         if guest_email:
@@ -1304,32 +1996,36 @@ async def cancel_booking(
         raise HTTPException(500, f"Error cancelling: {str(e)}")
     
 @router.post("/booking/search")
-async def search_appointments(
+@runs_on_async_session
+def search_appointments(
     subdomain: str,
     search: AppointmentSearch,
-    db: Session = Depends(get_db)
+    db: Session = AsyncTenantDB
 ):
     """Search appointments by email, phone, or reference"""
 
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_booking_availability)
-    schema_name = f"tenant_{subdomain}"
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
     try:
-        # Build query based on search type
-        query = db.query(models.Appointment)
+        # Build query based on search type — event type / provider โหลดมาใน query เดียวกัน
+        query = db.query(models.Appointment).options(
+            joinedload(models.Appointment.event_type),
+            joinedload(models.Appointment.provider)
+        )
         
         if search.search_type == 'email':
-            # ✅ Case-insensitive email search
-            from sqlalchemy import func
+            # ✅ Case-insensitive email search (ix_appointments_guest_email_normalized)
+            clean_email = models.normalize_email(search.search_value)
+            if not clean_email:
+                raise HTTPException(400, "Invalid email")
             query = query.filter(
-                func.lower(models.Appointment.guest_email) == func.lower(search.search_value)
+                models.Appointment.guest_email_normalized == clean_email
             )
         elif search.search_type == 'phone':
-            # Clean phone number (remove spaces, dashes)
-            clean_phone = search.search_value.replace(' ', '').replace('-', '')
+            # เทียบเฉพาะตัวเลข — "081-234 5678" ตรงกับ "0812345678" (ix_appointments_guest_phone_normalized)
+            clean_phone = models.normalize_phone(search.search_value)
+            if not clean_phone:
+                raise HTTPException(400, "Invalid phone number")
             query = query.filter(
-                models.Appointment.guest_phone == clean_phone
+                models.Appointment.guest_phone_normalized == clean_phone
             )
         elif search.search_type == 'reference':
             query = query.filter(
@@ -1348,17 +2044,8 @@ async def search_appointments(
         # Format results
         results = []
         for apt in appointments:
-            # Get event type
-            event_type = db.query(models.EventType).filter_by(
-                id=apt.event_type_id
-            ).first()
-            
-            # Get provider if exists
-            provider = None
-            if apt.provider_id:
-                provider = db.query(models.Provider).filter_by(
-                    id=apt.provider_id
-                ).first()
+            event_type = apt.event_type
+            provider = apt.provider
             
             results.append({
                 "booking_reference": apt.booking_reference,
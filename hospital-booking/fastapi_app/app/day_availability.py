@@ -0,0 +1,358 @@
+# fastapi_app/app/day_availability.py - Day-level availability engine
+
+"""
+โหลดข้อมูลที่ต้องใช้คำนวณ slot ของ "ทั้งวัน" ด้วยจำนวน query คงที่
+แล้วคำนวณ provider pool และการจองของแต่ละ slot ในหน่วยความจำ
+
+เดิม get_booking_availability เรียก collect_available_providers และ fetch_slot_bookings (ลบแล้ว)
+ทีละ slot — แต่ละครั้ง query ProviderSchedule ใหม่, lazy-load schedule.provider
+และ query ProviderLeave ทีละ provider (วันละ 40 slot x 10 provider = หลายร้อย query)
+
+ที่นี่ใช้ (ต่อวัน หรือต่อช่วงวันที่ผ่าน AvailabilityWindow):
+    1. ProviderSchedule + Provider (joinedload)      -> 1 query
+    2. ProviderLeave ของ provider เหล่านั้นในช่วงนั้น  -> 1 query
+    3. Appointment ของ event type นี้ที่ทับช่วงนั้น     -> 1 query
+    4. นัดของ provider เหล่านั้นใน event type อื่น     -> 1 query (GiST index ของ exclusion constraint)
+กฎการคัดกรองเหมือนสองฟังก์ชันเดิมทุกประการ
+
+provider ที่ติดนัดของบริการอื่นในช่วง slot ถือว่าไม่ว่าง (ไม่อยู่ใน available_providers)
+ส่วนนัดของ event type เดียวกันนับใน occupancy ตามเดิม
+ฐานข้อมูลกันการจองซ้อนของ provider อีกชั้นด้วย exclusion constraint (models.APPOINTMENT_PROVIDER_OVERLAP)
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from sqlalchemy.orm import Session, joinedload
+
+from shared_db import models
+
+from .occupancy import OccupancyIndex
+from .slot_matrix import CompiledSchedules, SlotMatrix
+from .template_snapshot import WeeklyWindow, template_snapshots
+from .tenant_calendar import HolidayEntry, OverrideEntry, TenantCalendar, tenant_calendar
+
+ACTIVE_BOOKING_STATUSES = ('confirmed', 'pending')
+
+
+def convert_python_weekday(python_weekday: int) -> int:
+    """Convert Python weekday (0=Monday) to DayOfWeek enum value (0=Sunday)."""
+    return 0 if python_weekday == 6 else python_weekday + 1
+
+
+def day_bounds(target_date: date):
+    """ช่วง [00:00 ของวัน, 00:00 ของวันถัดไป) — ครอบคลุมทุก slot ของวันนั้น"""
+    day_start = datetime.combine(target_date, time.min)
+    return day_start, day_start + timedelta(days=1)
+
+
+class DayAvailability:
+    """ข้อมูลความพร้อมของ template หนึ่งในวันเดียว พร้อมตอบคำถามระดับ slot โดยไม่ต้อง query"""
+
+    def __init__(
+        self,
+        template: models.AvailabilityTemplate,
+        target_date: date,
+        schedules: List[models.ProviderSchedule],
+        leave_provider_ids: Set[int],
+        appointments: List[models.Appointment],
+        other_bookings: Iterable = (),
+        compiled: Optional[CompiledSchedules] = None
+    ):
+        self.template = template
+        self.target_date = target_date
+        self.appointments = appointments
+        self.occupancy = OccupancyIndex(appointments)
+        # นัดของ provider ใน event type อื่น (แถวที่มี provider_id, start_time, end_time)
+        self._other_rows = list(other_bookings)
+        self.other_bookings = OccupancyIndex(self._other_rows)
+        # schedule ของทั้ง window ในรูป array (slot_matrix) — ไม่มีก็ compile จาก schedule ของวันนี้ที่ไม่ลา
+        self._schedules = schedules
+        self._leave_provider_ids = leave_provider_ids
+        self._compiled = compiled
+
+        target_day = convert_python_weekday(target_date.weekday())
+
+        # ตัดเงื่อนไขที่ไม่ขึ้นกับ slot ออกตั้งแต่ตอนสร้าง (provider active, วันในสัปดาห์, ลา)
+        # เหลือเฉพาะกรอบเวลา custom ที่ต้องเทียบกับแต่ละ slot
+        self._eligible = []
+        for schedule in schedules:
+            provider = schedule.provider
+            if not provider or not provider.is_active:
+                continue
+            if target_day not in (schedule.days_of_week or []):
+                continue
+            if provider.id in leave_provider_ids:
+                continue
+
+            window_start = datetime.combine(target_date, schedule.custom_start_time) if schedule.custom_start_time else None
+            window_end = datetime.combine(target_date, schedule.custom_end_time) if schedule.custom_end_time else None
+            self._eligible.append((provider.id, window_start, window_end))
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        template: models.AvailabilityTemplate,
+        event_type_id: int,
+        target_date: date
+    ) -> "DayAvailability":
+        return AvailabilityWindow(db, event_type_id, template, target_date, target_date).day(target_date)
+
+    def available_providers(self, slot_start: datetime, slot_end: datetime) -> List[int]:
+        """provider ที่ว่างใน slot (ไม่รวมการเช็ค date override — ผู้เรียกเช็คเอง)"""
+        available_ids = []
+        for provider_id, window_start, window_end in self._eligible:
+            if window_start and slot_start < window_start:
+                continue
+            if window_end and slot_end > window_end:
+                continue
+            if self.other_bookings.is_provider_booked(provider_id, slot_start, slot_end):
+                continue
+            available_ids.append(provider_id)
+        return available_ids
+
+    def slot_matrix(
+        self,
+        slots: Sequence[Tuple[datetime, datetime]],
+        include_other_bookings: bool = True
+    ) -> SlotMatrix:
+        """available_providers และ occupancy ของทุก slot [(start, end), ...] ในวันนี้ คำนวณพร้อมกันด้วย NumPy
+
+        include_other_bookings=False นับ provider ตามกะและวันลาอย่างเดียว (ไม่ตัด provider ที่ติดนัดบริการอื่น)
+        """
+        if self._compiled is None:
+            self._compiled = CompiledSchedules([
+                schedule for schedule in self._schedules
+                if schedule.provider_id not in self._leave_provider_ids
+            ])
+        other_bookings = self._other_rows if include_other_bookings else ()
+        return SlotMatrix.build(self._compiled, self.target_date, slots, self.appointments, other_bookings)
+
+    def slot_bookings(
+        self,
+        slot_start: datetime,
+        slot_end: datetime,
+        provider_ids: Optional[List[int]] = None
+    ) -> List[models.Appointment]:
+        """นัดของ event type นี้ที่ทับ slot (เฉพาะ provider_ids ถ้าระบุ) — ตอบจาก occupancy index ของทั้งวัน"""
+        bookings = self.occupancy.overlapping(slot_start, slot_end)
+        if provider_ids is not None:
+            bookings = [appt for appt in bookings if appt.provider_id in provider_ids]
+        return bookings
+
+    def add_booking(self, appointment: models.Appointment):
+        """นับการจองที่เพิ่งเพิ่มใน transaction เดียวกัน (ยังไม่ commit) เข้าไปใน occupancy ของวันนี้"""
+        self.appointments.append(appointment)
+        self.occupancy.add(appointment)
+
+    def add_other_booking(self, appointment: models.Appointment):
+        """นับนัดของ event type อื่นที่เพิ่งเพิ่มใน transaction เดียวกัน — provider ของนัดนั้นไม่ว่างในช่วงเวลานั้น"""
+        self._other_rows.append(appointment)
+        self.other_bookings.add(appointment)
+
+    def daily_booking_count(self) -> int:
+        """จำนวนการจองที่เริ่มในวันนี้ (ใช้กับ max_bookings_per_day)"""
+        day_start, next_day_start = day_bounds(self.target_date)
+        return self.occupancy.count_starting_between(day_start, next_day_start)
+
+
+class AvailabilityWindow:
+    """ข้อมูลประกอบการคำนวณ slot ของช่วงวันที่ [start_date, end_date] สำหรับ event type เดียว
+
+    แต่ละชนิดข้อมูล (holidays, date overrides, availabilities, schedules/leaves/appointments)
+    โหลดครั้งเดียวสำหรับทั้งช่วงเมื่อถูกเรียกใช้ครั้งแรก — endpoint รายวันจึงไม่ query
+    ข้อมูลที่ไม่ได้ใช้ (เช่นวันหยุด/วันที่ผ่านมาแล้ว) และ endpoint แบบช่วงวันที่ใช้ query
+    จำนวนคงที่ไม่ว่าช่วงจะยาวกี่วัน
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        event_type_id: int,
+        template: Optional[models.AvailabilityTemplate],
+        start_date: date,
+        end_date: date
+    ):
+        self.db = db
+        self.event_type_id = event_type_id
+        self.template = template
+        self.start_date = start_date
+        self.end_date = end_date
+
+        self._calendar: Optional[TenantCalendar] = None
+        self._calendar_checked = False
+        self._holidays = None
+        self._template_overrides = None
+        self._global_overrides = None
+        self._availabilities = None
+        self._schedules = None
+        self._leaves = None
+        self._compiled = None
+        self._appointments = None
+        self._other_bookings = None
+        self._days = {}
+
+    def _tenant_calendar(self) -> Optional[TenantCalendar]:
+        """ปฏิทินวันหยุด/override ที่ compile ไว้ใน worker (ถ้ามี) — ตอบโดยไม่ต้อง query"""
+        if not self._calendar_checked:
+            self._calendar = tenant_calendar.get(self.db)
+            self._calendar_checked = True
+        return self._calendar
+
+    def holiday(self, target_date: date) -> Optional[HolidayEntry]:
+        calendar = self._tenant_calendar()
+        if calendar is not None:
+            return calendar.holiday(target_date)
+        if self._holidays is None:
+            rows = self.db.query(models.Holiday).filter(
+                models.Holiday.date >= self.start_date,
+                models.Holiday.date <= self.end_date,
+                models.Holiday.is_active == True
+            ).all()
+            self._holidays = {row.date: row for row in rows}
+        return self._holidays.get(target_date)
+
+    def date_override(self, target_date: date) -> Optional[OverrideEntry]:
+        """เทียบเท่า get_relevant_date_override: override ของ template ก่อน แล้วค่อย global (ล่าสุดตาม id)"""
+        calendar = self._tenant_calendar()
+        if calendar is not None:
+            return calendar.date_override(self.template.id if self.template is not None else None, target_date)
+        if self._template_overrides is None:
+            scope_filter = models.DateOverride.template_scope == 'global'
+            if self.template is not None:
+                scope_filter = scope_filter | (models.DateOverride.template_id == self.template.id)
+
+            rows = self.db.query(models.DateOverride).filter(
+                models.DateOverride.date >= self.start_date,
+                models.DateOverride.date <= self.end_date,
+                scope_filter
+            ).order_by(models.DateOverride.id).all()
+
+            self._template_overrides = {}
+            self._global_overrides = {}
+            for row in rows:
+                # เรียงตาม id จากน้อยไปมาก ค่าที่เขียนทับทีหลังจึงเป็นตัวล่าสุด
+                if self.template is not None and row.template_id == self.template.id:
+                    self._template_overrides[row.date] = row
+                if row.template_scope == 'global':
+                    self._global_overrides[row.date] = row
+
+        return self._template_overrides.get(target_date) or self._global_overrides.get(target_date)
+
+    def _weekly_windows(self) -> Dict[int, Sequence]:
+        """weekday -> ช่วงเวลาทำการของ template (จาก snapshot ใน worker ถ้ามี ไม่เช่นนั้น query ครั้งเดียว)"""
+        if self._availabilities is None:
+            snapshot = template_snapshots.get(self.db, self.template.id)
+            if snapshot is not None:
+                self._availabilities = snapshot.weekly_windows
+            else:
+                rows = self.db.query(models.Availability).filter(
+                    models.Availability.template_id == self.template.id,
+                    models.Availability.is_active == True
+                ).all()
+                self._availabilities = {}
+                for row in rows:
+                    self._availabilities.setdefault(row.day_of_week.value, []).append(row)
+        return self._availabilities
+
+    def availabilities(self, target_date: date) -> Sequence[Union[models.Availability, WeeklyWindow]]:
+        if self.template is None:
+            return []
+        return self._weekly_windows().get(convert_python_weekday(target_date.weekday()), [])
+
+    def weekly_schedule(self) -> Dict[str, List[Dict[str, str]]]:
+        """ช่วงเวลาทำการรายสัปดาห์ของ template — รูปแบบเดียวกับ schedule ของ /availability/template/{id}/details"""
+        if self.template is None:
+            return {}
+        return {
+            str(day_of_week): [
+                {'start': row.start_time.strftime('%H:%M'), 'end': row.end_time.strftime('%H:%M')}
+                for row in sorted(rows, key=lambda row: row.start_time)
+            ]
+            for day_of_week, rows in sorted(self._weekly_windows().items())
+        }
+
+    def _load_day_inputs(self):
+        schedules = self.db.query(models.ProviderSchedule).options(
+            joinedload(models.ProviderSchedule.provider)
+        ).filter(
+            models.ProviderSchedule.template_id == self.template.id,
+            models.ProviderSchedule.is_active == True,
+            models.ProviderSchedule.effective_date <= self.end_date,
+            (models.ProviderSchedule.end_date.is_(None) | (models.ProviderSchedule.end_date >= self.start_date))
+        ).all()
+        self._schedules = schedules
+
+        provider_ids = {schedule.provider_id for schedule in schedules}
+        self._leaves = []
+        if provider_ids:
+            self._leaves = self.db.query(
+                models.ProviderLeave.provider_id,
+                models.ProviderLeave.start_date,
+                models.ProviderLeave.end_date
+            ).filter(
+                models.ProviderLeave.provider_id.in_(provider_ids),
+                models.ProviderLeave.start_date <= self.end_date,
+                models.ProviderLeave.end_date >= self.start_date,
+            ).all()
+
+        range_start, _ = day_bounds(self.start_date)
+        _, range_end = day_bounds(self.end_date)
+        self._appointments = self.db.query(models.Appointment).filter(
+            models.Appointment.event_type_id == self.event_type_id,
+            models.Appointment.status.in_(ACTIVE_BOOKING_STATUSES),
+            models.Appointment.start_time < range_end,
+            models.Appointment.end_time > range_start
+        ).all()
+
+        self._other_bookings = []
+        if provider_ids:
+            self._other_bookings = self.db.query(
+                models.Appointment.provider_id,
+                models.Appointment.start_time,
+                models.Appointment.end_time
+            ).filter(
+                models.Appointment.provider_id.in_(provider_ids),
+                models.Appointment.event_type_id.is_distinct_from(self.event_type_id),
+                models.Appointment.status.in_(ACTIVE_BOOKING_STATUSES),
+                models.Appointment.overlapping(range_start, range_end)
+            ).all()
+
+    def _compiled_schedules(self) -> CompiledSchedules:
+        if self._compiled is None:
+            self._compiled = CompiledSchedules(self._schedules, self._leaves)
+        return self._compiled
+
+    def day(self, target_date: date) -> DayAvailability:
+        """DayAvailability ของวันหนึ่ง ตัดจากข้อมูลของทั้งช่วงที่โหลดไว้"""
+        if target_date in self._days:
+            return self._days[target_date]
+        if self._schedules is None:
+            self._load_day_inputs()
+
+        schedules = [
+            schedule for schedule in self._schedules
+            if schedule.effective_date <= target_date
+            and (schedule.end_date is None or schedule.end_date >= target_date)
+        ]
+        leave_provider_ids = {
+            leave.provider_id for leave in self._leaves
+            if leave.start_date <= target_date <= leave.end_date
+        }
+        day_start, next_day_start = day_bounds(target_date)
+        appointments = [
+            appt for appt in self._appointments
+            if appt.start_time < next_day_start and appt.end_time > day_start
+        ]
+        other_bookings = [
+            row for row in self._other_bookings
+            if row.start_time < next_day_start and row.end_time > day_start
+        ]
+
+        day = DayAvailability(
+            self.template, target_date, schedules, leave_provider_ids, appointments, other_bookings,
+            compiled=self._compiled_schedules()
+        )
+        self._days[target_date] = day
+        return day
@@ -60,6 +60,32 @@ def _smtp_config():
     }
 
 
+def _build_message(cfg, to: str, subject: str, html_body: str, text_body: str) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = formataddr(("NudDee นัดดี", cfg['sender']))
+    msg['To'] = to
+    msg.attach(MIMEText(text_body, 'plain', _charset=_utf8_base64_charset()))
+    msg.attach(MIMEText(html_body, 'html', _charset=_utf8_base64_charset()))
+    return msg
+
+
+# send_emails เปิด connection ใหม่หลัง SMTP หลุดได้ไม่เกินจำนวนนี้ต่อหนึ่งชุด
+_MAX_RECONNECTS = 3
+
+
+def _smtp_connect(cfg):
+    """เปิด connection ที่ login แล้ว (ผู้เรียกต้องปิดเอง — ใช้กับ with)"""
+    if cfg['port'] == 465:
+        server = smtplib.SMTP_SSL(cfg['server'], cfg['port'], timeout=20)
+    else:
+        server = smtplib.SMTP(cfg['server'], cfg['port'], timeout=20)
+    if cfg['use_tls'] and cfg['port'] != 465:
+        server.starttls()
+    server.login(cfg['username'], cfg['password'])
+    return server
+
+
 def send_email(to: str, subject: str, html_body: str, text_body: str) -> bool:
     """ส่งอีเมลหนึ่งฉบับ คืน True/False — ไม่ throw"""
     cfg = _smtp_config()
@@ -67,22 +93,10 @@ def send_email(to: str, subject: str, html_body: str, text_body: str) -> bool:
         logger.warning("MAIL_USERNAME/MAIL_PASSWORD ไม่ได้ตั้งค่า — ข้ามการส่งอีเมลถึง %s (%s)", to, subject)
         return False
 
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = formataddr(("NudDee นัดดี", cfg['sender']))
-    msg['To'] = to
-    msg.attach(MIMEText(text_body, 'plain', _charset=_utf8_base64_charset()))
-    msg.attach(MIMEText(html_body, 'html', _charset=_utf8_base64_charset()))
+    msg = _build_message(cfg, to, subject, html_body, text_body)
 
     try:
-        if cfg['port'] == 465:
-            server = smtplib.SMTP_SSL(cfg['server'], cfg['port'], timeout=20)
-        else:
-            server = smtplib.SMTP(cfg['server'], cfg['port'], timeout=20)
-        with server:
-            if cfg['use_tls'] and cfg['port'] != 465:
-                server.starttls()
-            server.login(cfg['username'], cfg['password'])
+        with _smtp_connect(cfg) as server:
             server.sendmail(cfg['sender'], [to], msg.as_string())
         print(f"📧 ส่งอีเมล '{subject}' ถึง {to} สำเร็จ", flush=True)
         logger.info("ส่งอีเมล '%s' ถึง %s สำเร็จ", subject, to)
@@ -93,16 +107,67 @@ def send_email(to: str, subject: str, html_body: str, text_body: str) -> bool:
         return False
 
 
-def _appointment_email(
+def send_emails(messages) -> int:
+    """ส่งหลายฉบับผ่าน SMTP connection เดียว (login ครั้งเดียว) คืนจำนวนที่ส่งสำเร็จ — ไม่ throw
+
+    messages: รายการ (to, subject, html_body, text_body)
+    ฉบับที่ล้มเหลวข้ามไป ถ้า connection หลุดระหว่างทางจะเปิดใหม่แล้วส่งฉบับถัดไปต่อ (ไม่เกิน _MAX_RECONNECTS ครั้ง)
+    ถ้าเปิด connection / login ไม่สำเร็จจะเลิกส่งฉบับที่เหลือทั้งหมด — ไม่รอ timeout 20s ซ้ำทีละฉบับ
+    """
+    messages = list(messages)
+    if not messages:
+        return 0
+
+    cfg = _smtp_config()
+    if not (cfg['username'] and cfg['password']):
+        logger.warning("MAIL_USERNAME/MAIL_PASSWORD ไม่ได้ตั้งค่า — ข้ามการส่งอีเมล %d ฉบับ", len(messages))
+        return 0
+
+    sent = 0
+    connects = 0
+    server = None
+    try:
+        for index, (to, subject, html_body, text_body) in enumerate(messages):
+            if server is None:
+                if connects > _MAX_RECONNECTS:
+                    logger.error("SMTP หลุดเกิน %d ครั้ง — ยกเลิกอีเมลที่เหลือ %d ฉบับ", _MAX_RECONNECTS, len(messages) - index)
+                    break
+                connects += 1
+                try:
+                    server = _smtp_connect(cfg)
+                except Exception:
+                    logger.exception("เปิด SMTP connection ไม่สำเร็จ — ยกเลิกอีเมลที่เหลือ %d ฉบับ", len(messages) - index)
+                    break
+            msg = _build_message(cfg, to, subject, html_body, text_body)
+            try:
+                server.sendmail(cfg['sender'], [to], msg.as_string())
+                sent += 1
+            except smtplib.SMTPServerDisconnected:
+                logger.exception("SMTP หลุดระหว่างส่งอีเมล '%s' ถึง %s", subject, to)
+                server = None
+            except Exception:
+                logger.exception("ส่งอีเมล '%s' ถึง %s ล้มเหลว", subject, to)
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    print(f"📧 ส่งอีเมลแบบกลุ่มสำเร็จ {sent}/{len(messages)} ฉบับ", flush=True)
+    logger.info("ส่งอีเมลแบบกลุ่มสำเร็จ %d/%d ฉบับ", sent, len(messages))
+    return sent
+
+
+def _render_appointment_email(
     kind: str,
-    to: str,
     hospital_name: str,
     booking_reference: str,
     event_name: str = None,
     start_time: datetime = None,
     guest_name: str = None,
 ):
-    """สร้างและส่งอีเมลนัดหมายตามชนิด: confirmed / rescheduled / cancelled"""
+    """สร้าง (subject, html_body, text_body) ของอีเมลนัดหมายตามชนิด: confirmed / rescheduled / cancelled"""
     kinds = {
         'confirmed': {
             'subject': f"ยืนยันการนัดหมาย {booking_reference} - {hospital_name}",
@@ -170,13 +235,40 @@ def _appointment_email(
     text_lines += ["", f"หากต้องการเลื่อนหรือยกเลิกนัด กรุณาติดต่อ {hospital_name} พร้อมแจ้งรหัสนัดหมาย"]
     text_body = "\n".join(text_lines)
 
-    send_email(to, meta['subject'], html_body, text_body)
+    return meta['subject'], html_body, text_body
+
+
+def _appointment_email(kind: str, to: str, hospital_name: str, booking_reference: str,
+                       event_name: str = None, start_time: datetime = None, guest_name: str = None):
+    """สร้างและส่งอีเมลนัดหมายหนึ่งฉบับ"""
+    subject, html_body, text_body = _render_appointment_email(
+        kind, hospital_name, booking_reference, event_name, start_time, guest_name
+    )
+    send_email(to, subject, html_body, text_body)
 
 
 def send_appointment_confirmation(to, hospital_name, booking_reference, event_name, start_time, guest_name=None):
     _appointment_email('confirmed', to, hospital_name, booking_reference, event_name, start_time, guest_name)
 
 
+def send_appointment_confirmations(hospital_name, confirmations):
+    """อีเมลยืนยันของการจองแบบกลุ่ม — ส่งทั้งหมดใน SMTP connection เดียว
+
+    confirmations: รายการ dict ที่มี to, booking_reference, event_name, start_time, guest_name
+    """
+    send_emails(
+        (item['to'],) + _render_appointment_email(
+            'confirmed',
+            hospital_name,
+            item['booking_reference'],
+            item['event_name'],
+            item['start_time'],
+            item.get('guest_name'),
+        )
+        for item in confirmations
+    )
+
+
 def send_appointment_reschedule(to, hospital_name, booking_reference, event_name, start_time, guest_name=None):
     _appointment_email('rescheduled', to, hospital_name, booking_reference, event_name, start_time, guest_name)
 
@@ -1,8 +1,7 @@
 # fastapi_app/app/event_types.py - (FINAL CORRECTED VERSION)
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import text
 from pydantic import BaseModel
 from typing import List, Optional
 import sys
@@ -10,32 +9,16 @@ import re
 import datetime
 
 # Import database and models
-from shared_db.database import SessionLocal
 from shared_db import models
+from shared_db.availability_cache import availability_cache
 
 # Import the new default template creator from availability.py
 from .availability import get_or_create_default_template
+from .async_session import AsyncTenantDB, SyncTenantDB, runs_in_threadpool, runs_on_async_session
+from .inventory_builder import refresh_slot_inventory
 
 router = APIRouter(prefix="/api/v1/tenants/{subdomain}", tags=["event-types"])
 
-# --- Dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_tenant_session(subdomain: str, db: Session = Depends(get_db)):
-    """
-    A dependency that provides a DB session with the correct search_path.
-    """
-    schema_name = f"tenant_{subdomain}"
-    try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
-        yield db
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Tenant '{subdomain}' not found or database error.")
 
 
 # --- Pydantic Models ---
@@ -88,7 +71,8 @@ def create_slug(name: str) -> str:
 # --- API Endpoints ---
 
 @router.get("/event-types", response_model=dict)
-async def get_event_types(subdomain: str, db: Session = Depends(get_tenant_session)):
+@runs_on_async_session
+def get_event_types(subdomain: str, db: Session = AsyncTenantDB):
     """Get all event types for a tenant"""
     try:
         event_types = db.query(models.EventType).options(
@@ -106,7 +90,8 @@ async def get_event_types(subdomain: str, db: Session = Depends(get_tenant_sessi
         raise HTTPException(status_code=500, detail=f"Error fetching event types: {str(e)}")
 
 @router.get("/event-types/{event_type_id}", response_model=EventTypeResponse)
-async def get_event_type(subdomain: str, event_type_id: int, db: Session = Depends(get_tenant_session)):
+@runs_on_async_session
+def get_event_type(subdomain: str, event_type_id: int, db: Session = AsyncTenantDB):
     """Get a single event type by ID"""
     try:
         event_type = db.query(models.EventType).options(
@@ -126,7 +111,8 @@ async def get_event_type(subdomain: str, event_type_id: int, db: Session = Depen
         raise HTTPException(status_code=500, detail=f"Error fetching event type: {str(e)}")
 
 @router.post("/event-types", response_model=EventTypeResponse)
-async def create_event_type(subdomain: str, event_type_data: EventTypeCreate, db: Session = Depends(get_tenant_session)):
+@runs_in_threadpool
+def create_event_type(subdomain: str, event_type_data: EventTypeCreate, db: Session = SyncTenantDB):
     """Create a new event type"""
     try:
         slug = create_slug(event_type_data.name)
@@ -154,6 +140,7 @@ async def create_event_type(subdomain: str, event_type_data: EventTypeCreate, db
         
         # 4. "ยืนยัน" Transaction เพื่อบันทึกข้อมูลอย่างถาวร
         db.commit()
+        refresh_slot_inventory(db, subdomain, event_type_ids=[response_data.id])
         
         # 5. ส่ง Response กลับไป
         return response_data
@@ -162,7 +149,8 @@ async def create_event_type(subdomain: str, event_type_data: EventTypeCreate, db
         raise HTTPException(status_code=500, detail=f"Error creating event type: {str(e)}")
 
 @router.put("/event-types/{event_type_id}", response_model=EventTypeResponse)
-async def update_event_type(subdomain: str, event_type_id: int, event_type_data: EventTypeUpdate, db: Session = Depends(get_tenant_session)):
+@runs_in_threadpool
+def update_event_type(subdomain: str, event_type_id: int, event_type_data: EventTypeUpdate, db: Session = SyncTenantDB):
     """Update an event type"""
     try:
         event_type = db.query(models.EventType).filter(models.EventType.id == event_type_id).first()
@@ -199,6 +187,8 @@ async def update_event_type(subdomain: str, event_type_id: int, event_type_data:
         
         # 4. "ยืนยัน" Transaction ทั้งหมดให้สมบูรณ์
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        refresh_slot_inventory(db, subdomain, event_type_ids=[event_type_id])
         
         # 5. ส่ง Response กลับไป
         return response_data
@@ -214,7 +204,8 @@ async def update_event_type(subdomain: str, event_type_id: int, event_type_data:
         raise HTTPException(status_code=500, detail=f"Error updating event type: {str(e)}")
 
 @router.delete("/event-types/{event_type_id}")
-async def delete_event_type(subdomain: str, event_type_id: int, db: Session = Depends(get_tenant_session)):
+@runs_in_threadpool
+def delete_event_type(subdomain: str, event_type_id: int, db: Session = SyncTenantDB):
     """Delete an event type"""
     try:
         event_type = db.query(models.EventType).filter(models.EventType.id == event_type_id).first()
@@ -225,10 +216,13 @@ async def delete_event_type(subdomain: str, event_type_id: int, db: Session = De
         if db.query(models.Appointment).filter(models.Appointment.event_type_id == event_type_id).first():
             event_type.is_active = False
             db.commit()
+            availability_cache.invalidate_tenant(subdomain)
+            refresh_slot_inventory(db, subdomain, event_type_ids=[event_type_id])
             return {"message": "Event type deactivated because it has existing appointments."}
         else:
             db.delete(event_type)
             db.commit()
+            availability_cache.invalidate_tenant(subdomain)
             return {"message": "Event type deleted successfully."}
     except Exception as e:
         db.rollback()
@@ -1,30 +1,26 @@
 # fastapi_app/app/holidays.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import text, exc, extract
+from sqlalchemy import text, exc
 from pydantic import BaseModel, Field
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Union
 from datetime import date
 import logging
 from threading import Lock
 
-from shared_db.database import SessionLocal
 from shared_db import models
+from shared_db.database import use_tenant_schema
+from shared_db.availability_cache import availability_cache
 from .holiday_service import HolidayService
+from .async_session import AsyncTenantDB, SyncTenantDB, runs_in_threadpool, runs_on_async_session
+from .tenant_calendar import tenant_calendar
+from .inventory_builder import refresh_slot_inventory
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1/tenants/{subdomain}", tags=["holidays"])
 
-# --- Dependencies ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # --- Pydantic Models ---
 class HolidayBase(BaseModel):
     date: date
@@ -48,6 +44,9 @@ class HolidayResponse(HolidayBase):
     class Config:
         from_attributes = True
 
+class HolidayDatesResponse(BaseModel):
+    dates: Dict[str, str]  # "YYYY-MM-DD" -> ชื่อวันหยุด
+
 class SyncRequest(BaseModel):
     year: int = Field(default_factory=lambda: date.today().year)
     holidays: List[HolidayBase]
@@ -64,11 +63,14 @@ def ensure_holiday_table(subdomain: str, db: Session):
             return
 
         try:
-            exists = db.execute(text("SELECT to_regclass('holidays')")).scalar()
+            exists = db.execute(
+                text("SELECT to_regclass(:table_name)"),
+                {"table_name": f'"tenant_{subdomain}".holidays'}
+            ).scalar()
             if not exists:
                 logger.info("Creating holidays table for tenant '%s'", subdomain)
                 # db.connection() ไม่ใช่ get_bind() — ให้ CREATE TABLE ใช้ connection
-                # เดียวกับที่ SET search_path ไว้ ไม่งั้นตารางไปโผล่ public schema
+                # ที่มี schema_translate_map ของ tenant ไม่งั้นตารางไปโผล่ public schema
                 models.Holiday.__table__.create(bind=db.connection(), checkfirst=True)
                 db.commit()
         except Exception:
@@ -84,7 +86,7 @@ def sync_tenant_holidays(db: Session, schema_name: str, year: int = None, holida
     holidays=None จะดึงจาก BOT API ของปีที่ระบุ (ต้องตั้ง BOT_TOKEN ใน .env)
     เป็น logic กลางที่ใช้ร่วมกันโดย: endpoint /holidays/sync (รวมถึง Celery job ประจำปี)
     และการสร้าง tenant ใหม่ทั้งจาก /api/register และ Super Admin panel
-    จัดการ search_path เองและ reset กลับ public เสมอ
+    ผูก session กับ tenant เอง (use_tenant_schema) และปลดออกเสมอเมื่อจบ
     """
     if year is None:
         year = date.today().year
@@ -95,7 +97,7 @@ def sync_tenant_holidays(db: Session, schema_name: str, year: int = None, holida
     added = 0
     skipped = 0
     try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
+        use_tenant_schema(db, schema_name)
         ensure_holiday_table(subdomain, db)
 
         for item in holidays or []:
@@ -117,28 +119,36 @@ def sync_tenant_holidays(db: Session, schema_name: str, year: int = None, holida
             added += 1
 
         db.commit()
+        if added:
+            availability_cache.invalidate_tenant(subdomain)
+            tenant_calendar.invalidate(subdomain)
+            refresh_slot_inventory(db, subdomain)
         return {'added': added, 'skipped': skipped}
     except Exception:
         db.rollback()
         raise
     finally:
-        db.execute(text('SET search_path TO public'))
-        db.commit()
+        use_tenant_schema(db, None)
 
 # --- API Endpoints ---
-@router.get("/holidays", response_model=List[HolidayResponse])
-async def get_holidays(
+@router.get("/holidays", response_model=Union[List[HolidayResponse], HolidayDatesResponse])
+@runs_on_async_session
+def get_holidays(
     subdomain: str,
     year: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    compact: bool = False,
+    db: Session = AsyncTenantDB
 ):
-    """Get holidays with optional filters."""
-    schema_name = f"tenant_{subdomain}"
+    """Get holidays with optional filters.
 
-    # Set search_path (ไม่ commit — ให้ SET อยู่ใน transaction เดียวกับ query
-    # มิฉะนั้น connection อาจถูกสลับใน pool แล้ว query หลุดไป public schema)
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
+    year / start / end กรองเป็นช่วงวันที่ใน SQL (ใช้ index ix_holidays_date_active ได้ ต่างจาก
+    extract('year', ...)) — compact=true คืน {"dates": {"YYYY-MM-DD": name}}
+    """
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must be on or after start")
 
     try:
         ensure_holiday_table(subdomain, db)
@@ -146,12 +156,20 @@ async def get_holidays(
         query = db.query(models.Holiday)
         
         if year:
-            query = query.filter(extract('year', models.Holiday.date) == year)
+            query = query.filter(models.Holiday.date >= date(year, 1, 1), models.Holiday.date < date(year + 1, 1, 1))
+        if start is not None:
+            query = query.filter(models.Holiday.date >= start)
+        if end is not None:
+            query = query.filter(models.Holiday.date <= end)
         
         if is_active is not None:
             query = query.filter_by(is_active=is_active)
         else:
             query = query.filter_by(is_active=True)
+
+        if compact:
+            rows = query.with_entities(models.Holiday.date, models.Holiday.name).order_by(models.Holiday.date).all()
+            return HolidayDatesResponse(dates={row.date.isoformat(): row.name for row in rows})
         
         holidays = query.order_by(models.Holiday.date).all()
         return holidays if holidays else []
@@ -161,10 +179,11 @@ async def get_holidays(
         return []
 
 @router.post("/holidays/sync", response_model=dict)
-async def sync_holidays(
+@runs_in_threadpool
+def sync_holidays(
     subdomain: str,
     payload: SyncRequest,
-    db: Session = Depends(get_db)
+    db: Session = SyncTenantDB
 ):
     """Syncs holidays from an external source."""
     schema_name = f"tenant_{subdomain}"
@@ -172,9 +191,12 @@ async def sync_holidays(
     logger.info(f"Syncing holidays for {subdomain}, year: {payload.year}")
     logger.info(f"Received {len(payload.holidays)} holidays")
 
-    holidays = [h.dict() for h in payload.holidays] if payload.holidays else None
-
     try:
+        # BOT API (HTTP), การ invalidate ใน Redis และ refresh inventory เป็นแบบ sync ทั้งหมด — รันใน threadpool
+        if payload.holidays:
+            holidays = [h.dict() for h in payload.holidays]
+        else:
+            holidays = HolidayService.fetch_from_bot_api(payload.year)
         result = sync_tenant_holidays(db, schema_name, year=payload.year, holidays=holidays)
         logger.info(f"Committed: Added {result['added']}, Skipped {result['skipped']}")
         return {"message": f"Sync completed. Added: {result['added']}, Skipped: {result['skipped']}."}
@@ -183,17 +205,13 @@ async def sync_holidays(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.post("/holidays", response_model=HolidayResponse)
-async def create_custom_holiday(
+@runs_in_threadpool
+def create_custom_holiday(
     subdomain: str,
     holiday: HolidayCreate,
-    db: Session = Depends(get_db)
+    db: Session = SyncTenantDB
 ):
     """Creates a single custom holiday."""
-    schema_name = f"tenant_{subdomain}"
-
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_holidays)
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
     try:
         ensure_holiday_table(subdomain, db)
 
@@ -211,11 +229,13 @@ async def create_custom_holiday(
         )
         db.add(db_holiday)
         db.commit()
-        # commit จบ transaction แล้ว — ต้อง SET ใหม่ก่อน refresh ไม่งั้นอาจอ่านผิด schema
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
+        availability_cache.invalidate_tenant(subdomain)
+        tenant_calendar.invalidate(subdomain)
         db.refresh(db_holiday)
+        response = HolidayResponse.model_validate(db_holiday)
+        refresh_slot_inventory(db, subdomain, start_date=holiday.date, end_date=holiday.date)
 
-        return db_holiday
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -223,17 +243,13 @@ async def create_custom_holiday(
         raise HTTPException(status_code=500, detail=f"Error creating holiday: {str(e)}")
 
 @router.get("/holidays/{holiday_id}", response_model=HolidayResponse)
-async def get_holiday(
+@runs_on_async_session
+def get_holiday(
     subdomain: str,
     holiday_id: int,
-    db: Session = Depends(get_db)
+    db: Session = AsyncTenantDB
 ):
     """Get a single holiday by ID."""
-    schema_name = f"tenant_{subdomain}"
-
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_holidays)
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
     ensure_holiday_table(subdomain, db)
 
     holiday = db.query(models.Holiday).filter_by(id=holiday_id).first()
@@ -242,18 +258,14 @@ async def get_holiday(
     return holiday
 
 @router.patch("/holidays/{holiday_id}", response_model=HolidayResponse)
-async def update_holiday(
+@runs_in_threadpool
+def update_holiday(
     subdomain: str,
     holiday_id: int,
     update_data: HolidayUpdate,
-    db: Session = Depends(get_db)
+    db: Session = SyncTenantDB
 ):
     """Update holiday (partial update)."""
-    schema_name = f"tenant_{subdomain}"
-
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_holidays)
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
     try:
         ensure_holiday_table(subdomain, db)
 
@@ -267,26 +279,24 @@ async def update_holiday(
                 setattr(holiday, field, value)
 
         db.commit()
-        # commit จบ transaction แล้ว — ต้อง SET ใหม่ก่อน refresh ไม่งั้นอาจอ่านผิด schema
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
+        availability_cache.invalidate_tenant(subdomain)
+        tenant_calendar.invalidate(subdomain)
         db.refresh(holiday)
-        return holiday
+        response = HolidayResponse.model_validate(holiday)
+        refresh_slot_inventory(db, subdomain, start_date=response.date, end_date=response.date)
+        return response
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating: {str(e)}")
 
 @router.delete("/holidays/{holiday_id}", status_code=204)
-async def delete_holiday(
+@runs_in_threadpool
+def delete_holiday(
     subdomain: str,
     holiday_id: int,
-    db: Session = Depends(get_db)
+    db: Session = SyncTenantDB
 ):
     """Deletes a holiday."""
-    schema_name = f"tenant_{subdomain}"
-
-    # Set search_path (ไม่ commit — ดูเหตุผลที่ get_holidays)
-    db.execute(text(f'SET search_path TO "{schema_name}", public'))
-
     try:
         ensure_holiday_table(subdomain, db)
 
@@ -294,18 +304,21 @@ async def delete_holiday(
         if not holiday:
             raise HTTPException(status_code=404, detail="Holiday not found.")
         
+        affected_date = holiday.date
         db.delete(holiday)
         db.commit()
+        availability_cache.invalidate_tenant(subdomain)
+        tenant_calendar.invalidate(subdomain)
+        refresh_slot_inventory(db, subdomain, start_date=affected_date, end_date=affected_date)
         return None
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting: {str(e)}")
     
 @router.get("/holidays/fetch/{year}")
-async def fetch_holidays_for_year(
+def fetch_holidays_for_year(
     subdomain: str,
-    year: int,
-    db: Session = Depends(get_db)
+    year: int
 ):
     """Fetch holidays from external API"""
     holidays = HolidayService.fetch_from_bot_api(year)
@@ -0,0 +1,241 @@
+# fastapi_app/app/inventory_builder.py - Generate slot_inventory rows from availability settings
+
+"""
+สร้าง/สร้างใหม่แถวของ slot_inventory (ดู shared_db/slot_inventory.py) สำหรับ tenant ที่เปิดใช้
+
+capacity ของแต่ละ slot ใช้กฎเดียวกับ get_booking_availability ในส่วนที่ไม่ขึ้นกับเวลาปัจจุบัน:
+    วันหยุด / override ที่ปิดทั้งวันหรือปิดช่วง slot -> ไม่มีแถว
+    capacity = min(ห้อง/max concurrent ของ template, จำนวน provider ที่เข้ากะและไม่ลาใน slot)
+    booked   = จำนวนนัด confirmed/pending ของ event type นี้ที่ทับ slot
+capacity ไม่หัก provider ที่ติดนัดของบริการอื่น — นัดเหล่านั้นเปลี่ยนโดยไม่สร้างแถวของ event type นี้ใหม่
+ถ้าหักไว้ การยกเลิกนัดของบริการอื่นจะไม่คืนที่ให้ แถวจึงเป็นขอบบนจากกะเท่านั้น และ ensure_slot_capacity
+(ซึ่งเรียกทุกครั้งหลัง reserve_slot) ตัด provider ที่ติดบริการอื่นจากข้อมูลปัจจุบัน
+ส่วน min_notice_hours และ max_bookings_per_day ยังตรวจตอนจองตามเดิม
+
+การแก้ template/schedule/leave/capacity/override/holiday เรียก refresh_slot_inventory
+พร้อมช่วงวันที่ที่ได้รับผลกระทบ — สร้างใหม่เฉพาะ event type และวันที่ในช่วงนั้น
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from shared_db import models
+from shared_db.database import use_tenant_schema
+from shared_db.slot_inventory import inventory_enabled, set_inventory_enabled
+
+from .booking import (
+    is_slot_blocked_by_override,
+    parse_datetime,
+    resolve_day_base_slots,
+    resolve_resource_limits,
+)
+from .day_availability import AvailabilityWindow, day_bounds
+
+logger = logging.getLogger(__name__)
+
+
+def _set_tenant_path(db: Session, subdomain: str) -> str:
+    schema_name = f"tenant_{subdomain}"
+    use_tenant_schema(db, schema_name)
+    return schema_name
+
+
+def build_day_rows(
+    window: AvailabilityWindow,
+    event_type: models.EventType,
+    template: models.AvailabilityTemplate,
+    target_date: date
+) -> List[Dict]:
+    """แถว slot_inventory ของวันเดียว (ยังไม่เขียนลงฐานข้อมูล)"""
+    if window.holiday(target_date):
+        return []
+
+    base_slots, date_override = resolve_day_base_slots(window, event_type, target_date)
+    if not base_slots:
+        return []
+
+    resource_limits = resolve_resource_limits(template, target_date)
+    base_capacity = resource_limits["rooms_limit"] or 1
+    if resource_limits["max_concurrent"]:
+        base_capacity = min(base_capacity, resource_limits["max_concurrent"])
+
+    day = window.day(target_date)
+    slot_duration = timedelta(minutes=event_type.duration_minutes)
+    date_str = target_date.isoformat()
+
+    slot_bounds = []
+    for slot in sorted(set(base_slots)):
+        slot_start = parse_datetime(date_str, slot)
+        slot_end = slot_start + slot_duration
+        if not is_slot_blocked_by_override(date_override, target_date, slot_start, slot_end):
+            slot_bounds.append((slot_start, slot_end))
+    if not slot_bounds:
+        return []
+
+    # capacity จากกะเท่านั้น (ดู docstring ของ module)
+    matrix = day.slot_matrix(slot_bounds, include_other_bookings=False)
+    capacities = matrix.capacity(base_capacity)
+
+    rows = []
+    for index, (slot_start, slot_end) in enumerate(slot_bounds):
+        if not matrix.pool_size[index]:
+            continue
+        rows.append({
+            "event_type_id": event_type.id,
+            "slot_start": slot_start,
+            "slot_end": slot_end,
+            "capacity": int(capacities[index]),
+            "booked": int(matrix.booked_count[index]),
+        })
+    return rows
+
+
+def _horizon(event_type: models.EventType, start_date: Optional[date], end_date: Optional[date]):
+    today = date.today()
+    horizon_start = max(start_date or today, today)
+    horizon_end = today + timedelta(days=event_type.max_advance_days or 0)
+    if end_date:
+        horizon_end = min(horizon_end, end_date)
+    return horizon_start, horizon_end
+
+
+def regenerate_event_type(
+    db: Session,
+    event_type: models.EventType,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """ลบและสร้างแถวของ event type ในช่วงวันที่ใหม่ (ภายใน horizon) — คืนจำนวนแถวที่สร้าง"""
+    horizon_start, horizon_end = _horizon(event_type, start_date, end_date)
+    range_start, _ = day_bounds(horizon_start)
+    _, range_end = day_bounds(max(horizon_start, horizon_end))
+
+    # ลบก่อนโหลดนัด: DELETE รอ row lock ของการจองที่กำลังทำอยู่ให้ commit ก่อน
+    # นัดที่โหลดต่อจากนี้จึงรวมการจองเหล่านั้นแล้ว
+    db.query(models.SlotInventory).filter(
+        models.SlotInventory.event_type_id == event_type.id,
+        models.SlotInventory.slot_start >= range_start,
+        models.SlotInventory.slot_start < range_end
+    ).delete(synchronize_session=False)
+
+    template = event_type.availability_template
+    if not event_type.is_active or template is None or horizon_start > horizon_end:
+        return 0
+
+    window = AvailabilityWindow(db, event_type.id, template, horizon_start, horizon_end)
+    rows = []
+    current = horizon_start
+    while current <= horizon_end:
+        rows.extend(build_day_rows(window, event_type, template, current))
+        current += timedelta(days=1)
+
+    if rows:
+        stmt = pg_insert(models.SlotInventory.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_slot_inventory_event_slot',
+            set_={
+                "slot_end": stmt.excluded.slot_end,
+                "capacity": stmt.excluded.capacity,
+                "booked": stmt.excluded.booked,
+            }
+        )
+        db.execute(stmt)
+    return len(rows)
+
+
+def regenerate_slot_inventory(
+    db: Session,
+    subdomain: str,
+    template_ids: Optional[Iterable[int]] = None,
+    event_type_ids: Optional[Iterable[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """สร้างแถวใหม่ของ event type ที่เลือก (ทั้งหมดถ้าไม่ระบุ) แล้ว commit — ไม่ทำอะไรถ้า tenant ไม่ได้เปิดใช้"""
+    schema_name = _set_tenant_path(db, subdomain)
+    if not inventory_enabled(db, schema_name):
+        return 0
+
+    query = db.query(models.EventType)
+    if template_ids is not None:
+        query = query.filter(models.EventType.template_id.in_(list(template_ids)))
+    if event_type_ids is not None:
+        query = query.filter(models.EventType.id.in_(list(event_type_ids)))
+
+    total = 0
+    for event_type in query.all():
+        total += regenerate_event_type(db, event_type, start_date, end_date)
+    db.commit()
+    return total
+
+
+def refresh_slot_inventory(
+    db: Session,
+    subdomain: str,
+    template_ids: Optional[Iterable[int]] = None,
+    provider_id: Optional[int] = None,
+    event_type_ids: Optional[Iterable[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """เรียกหลัง commit การแก้ไขที่กระทบ capacity — provider_id จะขยายเป็น template ที่ provider มี schedule อยู่
+
+    ถ้าสร้างใหม่ไม่สำเร็จจะ log ไว้และไม่ทำให้ request เดิมล้ม (สั่ง /slot-inventory/rebuild ภายหลังได้)
+    """
+    try:
+        schema_name = _set_tenant_path(db, subdomain)
+        if not inventory_enabled(db, schema_name):
+            return
+
+        if provider_id is not None:
+            provider_templates = {
+                row.template_id for row in db.query(models.ProviderSchedule.template_id).filter(
+                    models.ProviderSchedule.provider_id == provider_id
+                ).distinct()
+            }
+            template_ids = provider_templates | set(template_ids or [])
+            if not template_ids:
+                return
+
+        regenerate_slot_inventory(db, subdomain, template_ids, event_type_ids, start_date, end_date)
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to refresh slot inventory for %s", subdomain)
+
+
+def ensure_day_inventory(db: Session, event_type: models.EventType, target_date: date):
+    """เติมแถวของวันที่ยังไม่เคยสร้าง (เช่น horizon เลื่อนไปข้างหน้าตามวัน) โดยไม่แตะแถวที่มีอยู่"""
+    template = event_type.availability_template
+    horizon_start, horizon_end = _horizon(event_type, target_date, target_date)
+    if template is None or horizon_start > horizon_end:
+        return
+
+    window = AvailabilityWindow(db, event_type.id, template, target_date, target_date)
+    rows = build_day_rows(window, event_type, template, target_date)
+    if rows:
+        db.execute(
+            pg_insert(models.SlotInventory.__table__).values(rows).on_conflict_do_nothing(
+                constraint='uq_slot_inventory_event_slot'
+            )
+        )
+
+
+def enable_slot_inventory(db: Session, subdomain: str) -> int:
+    """สร้างตาราง slot_inventory ใน tenant schema (เปิดใช้) แล้วสร้างแถวทั้ง horizon"""
+    schema_name = _set_tenant_path(db, subdomain)
+    # db.connection() เพื่อให้ CREATE TABLE ใช้ connection ที่มี schema_translate_map ของ tenant
+    models.SlotInventory.__table__.create(bind=db.connection(), checkfirst=True)
+    db.commit()
+    set_inventory_enabled(schema_name, True)
+    return regenerate_slot_inventory(db, subdomain)
+
+
+def disable_slot_inventory(db: Session, subdomain: str):
+    schema_name = _set_tenant_path(db, subdomain)
+    models.SlotInventory.__table__.drop(bind=db.connection(), checkfirst=True)
+    db.commit()
+    set_inventory_enabled(schema_name, False)
@@ -3,7 +3,7 @@
 import os
 import stripe
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Depends, Header, HTTPException, Body, Request
+from fastapi import FastAPI, Depends, Header, HTTPException, Body, Request, Response
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr, constr
@@ -19,14 +19,17 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'flask_app', 'app'))
 from shared_db import models
-from shared_db.database import SessionLocal, engine
+from shared_db.database import SessionLocal, engine, use_tenant_schema
 from shared_db.seed import seed_tenant_defaults
+from shared_db.availability_cache import availability_cache
 
 # Import routers
 from .event_types import router as event_types_router
 from .availability import router as availability_router
 from .booking import router as booking_router
 from .holidays import router as holidays_router
+from .public_pages import router as public_pages_router
+from .metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render_metrics
 
 # สร้างเฉพาะ public tables
 models.PublicBase.metadata.create_all(bind=engine)
@@ -66,20 +69,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# latency/SQL ต่อ route และ tenant — ดูที่ GET /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(event_types_router)
 app.include_router(availability_router)
 app.include_router(booking_router)
 app.include_router(holidays_router)
+app.include_router(public_pages_router)
 
 # --- Dependency ---
 def get_db():
     db = SessionLocal()
     try:
-        db.execute(text("SET search_path TO public"))
         yield db
     finally:
-        db.execute(text("SET search_path TO DEFAULT"))
         db.close()
 
 # --- Pydantic Models ---
@@ -144,22 +149,27 @@ def create_tenant_setup(schema_name: str, db: Session):
     try:
         # 1. สร้าง Schema และตารางทั้งหมดจาก models.py
         # ต้องใช้ db.connection() ไม่ใช่ db.get_bind() — get_bind() คืน engine
-        # ซึ่งจะหยิบ connection ใหม่จาก pool ที่ search_path เป็น public
-        # แล้วสร้างตาราง tenant ลง public schema (ต้นเหตุตารางหลงในอดีต)
+        # ซึ่งไม่มี schema_translate_map ของ tenant แล้วสร้างตาราง tenant ลง public schema
+        # (ต้นเหตุตารางหลงในอดีต) — slot_inventory เป็น opt-in จึงไม่สร้างตรงนี้
         db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
-        models.TenantBase.metadata.create_all(bind=db.connection())
-        db.execute(text('SET search_path TO public'))
+        use_tenant_schema(db, schema_name)
+        models.TenantBase.metadata.create_all(
+            bind=db.connection(),
+            tables=[
+                table for table in models.TenantBase.metadata.sorted_tables
+                if table is not models.SlotInventory.__table__
+            ]
+        )
         db.commit()
     except Exception as e:
         db.rollback()
-        db.execute(text('SET search_path TO public'))
-        db.commit()
         import traceback
         traceback.print_exc()
         raise Exception(f"Failed to create tenant schema: {str(e)}")
+    finally:
+        use_tenant_schema(db, None)
 
-    # 2. ข้อมูลเริ่มต้น (จัดการ search_path และ commit/rollback ภายในตัวเอง)
+    # 2. ข้อมูลเริ่มต้น (ผูก tenant schema และ commit/rollback ภายในตัวเอง)
     try:
         seed_tenant_defaults(db, schema_name)
     except Exception as e:
@@ -284,6 +294,16 @@ def health_check():
         "use_https": USE_HTTPS
     }
 
+@app.get("/api/v1/health/availability-cache")
+def availability_cache_stats():
+    """Hit/miss counters ของ availability cache (ใช้ประกอบการตั้ง TTL / ขนาด)"""
+    return availability_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text format"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/api/webhook")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     """Stripe webhook handler"""
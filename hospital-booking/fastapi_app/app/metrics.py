@@ -0,0 +1,196 @@
+# fastapi_app/app/metrics.py - Prometheus metrics for the FastAPI app
+
+"""
+วัดเวลาและภาระฐานข้อมูลต่อ route / tenant แล้วเปิดให้ Prometheus ดึงที่ GET /metrics
+
+    http_request_duration_seconds{method, route, tenant}      latency ของทั้ง request
+    http_requests_total{method, route, tenant, status}
+    db_statements_total{route, tenant}                        จำนวน SQL statement
+    db_statement_seconds_total{route, tenant}                 เวลารวมที่รอฐานข้อมูล
+    db_statements_per_request{route}                          การกระจายจำนวน statement ต่อ request (หา N+1)
+    availability_compute_seconds{kind, tenant}                เวลาคำนวณ slot ใน get_booking_availability(_range)
+
+จำกัดจำนวน label (cardinality) เพื่อไม่ให้ memory โตตามจำนวน tenant:
+    route  = path template ของ router (เช่น /api/v1/tenants/{subdomain}/booking/create) ไม่ใช่ path จริง
+    tenant = METRICS_MAX_TENANTS tenant แรกที่เห็น (default 20) ที่เหลือรวมเป็น "other"
+             ตั้ง METRICS_TENANTS=a,b,c เพื่อระบุ tenant ที่ต้องการแยกเองแทน
+
+SQL นับผ่าน engine events ของ shared_db.database.engine และ async engine ของ router
+request ปัจจุบันส่งผ่าน ContextVar (ตามไปถึง threadpool และ greenlet ของ run_sync)
+
+หลาย worker: ตั้ง PROMETHEUS_MULTIPROC_DIR ให้ทุก worker เขียนลงไดเรกทอรีเดียวกัน แล้ว /metrics จะรวมให้
+"""
+
+import os
+import time as time_module
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional, Set
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+from shared_db.async_database import async_engine
+from shared_db.database import engine
+
+OTHER_TENANT = "other"
+NO_TENANT = "none"
+UNMATCHED_ROUTE = "unmatched"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency",
+    ["method", "route", "tenant"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    "http_requests_total", "Requests by status",
+    ["method", "route", "tenant", "status"]
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total", "SQL statements executed",
+    ["route", "tenant"]
+)
+DB_SECONDS = Counter(
+    "db_statement_seconds_total", "Time spent executing SQL",
+    ["route", "tenant"]
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements per request",
+    ["route"], buckets=STATEMENT_BUCKETS
+)
+AVAILABILITY_COMPUTE = Histogram(
+    "availability_compute_seconds", "Slot computation time in the availability endpoints",
+    ["kind", "tenant"], buckets=LATENCY_BUCKETS
+)
+
+
+class TenantLabels:
+    """แปลง subdomain เป็น label ที่มีจำนวนจำกัด"""
+
+    def __init__(self):
+        configured = [t.strip() for t in os.environ.get("METRICS_TENANTS", "").split(",") if t.strip()]
+        self.fixed = bool(configured)
+        self.max_tenants = int(os.environ.get("METRICS_MAX_TENANTS", 20))
+        self._tenants: Set[str] = set(configured)
+        self._lock = Lock()
+
+    def label(self, subdomain: Optional[str]) -> str:
+        if not subdomain:
+            return NO_TENANT
+        if subdomain in self._tenants:
+            return subdomain
+        if self.fixed:
+            return OTHER_TENANT
+        with self._lock:
+            if len(self._tenants) < self.max_tenants:
+                self._tenants.add(subdomain)
+                return subdomain
+        return OTHER_TENANT
+
+
+tenant_labels = TenantLabels()
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+# --- SQL instrumentation ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_request.get() is not None:
+        context._metrics_started = time_module.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.sql_seconds += time_module.perf_counter() - started
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- request instrumentation ---
+
+class MetricsMiddleware:
+    """ASGI middleware — วัด latency และ SQL ของทุก HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+        started = time_module.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_request.reset(token)
+            # router ใส่ route และ path_params ลงใน scope เดียวกันหลัง match แล้ว
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or UNMATCHED_ROUTE
+            tenant = tenant_labels.label(scope.get("path_params", {}).get("subdomain"))
+            method = scope["method"]
+
+            REQUEST_LATENCY.labels(method, route_label, tenant).observe(time_module.perf_counter() - started)
+            REQUESTS.labels(method, route_label, tenant, str(status_code)).inc()
+            if stats.statements:
+                DB_STATEMENTS.labels(route_label, tenant).inc(stats.statements)
+                DB_SECONDS.labels(route_label, tenant).inc(stats.sql_seconds)
+            DB_STATEMENTS_PER_REQUEST.labels(route_label).observe(stats.statements)
+
+
+@contextmanager
+def availability_timer(subdomain: str, kind: str):
+    """จับเวลาส่วนคำนวณ slot (ไม่รวม cache hit และการ serialize response)"""
+    started = time_module.perf_counter()
+    try:
+        yield
+    finally:
+        AVAILABILITY_COMPUTE.labels(kind, tenant_labels.label(subdomain)).observe(
+            time_module.perf_counter() - started
+        )
+
+
+def render_metrics() -> bytes:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
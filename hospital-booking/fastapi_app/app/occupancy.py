@@ -0,0 +1,112 @@
+# fastapi_app/app/occupancy.py - In-memory occupancy index for slot overlap queries
+
+"""
+ดัชนีการจอง (confirmed/pending) ของช่วงเวลาหนึ่ง สำหรับตอบคำถามระดับ slot โดยไม่ต้อง query ซ้ำ
+
+การจองทับ slot [s, e) เมื่อ start < e และ end > s
+    จำนวนที่ทับ = #(start < e) - #(end <= s)
+เพราะการจองที่จบก่อน s ย่อมเริ่มก่อน e เสมอ — จึงนับได้ด้วย bisect สองครั้ง (O(log n))
+ต่อ provider ใช้ดัชนีแยกของตัวเอง ส่วนรายการการจองที่ทับ slot ใช้ช่วง start ที่เป็นไปได้
+(s - ระยะการจองที่ยาวที่สุด, e) จึงไม่ต้องไล่ทุกรายการของวัน
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class _IntervalCounter:
+    """นับจำนวนช่วงเวลาที่ทับ [s, e) ด้วยรายการ start/end ที่เรียงไว้"""
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals: Iterable):
+        intervals = list(intervals)
+        self.starts = sorted(start for start, _ in intervals)
+        self.ends = sorted(end for _, end in intervals)
+
+    def count(self, slot_start: datetime, slot_end: datetime) -> int:
+        return bisect_left(self.starts, slot_end) - bisect_right(self.ends, slot_start)
+
+    def add(self, start: datetime, end: datetime):
+        insort(self.starts, start)
+        insort(self.ends, end)
+
+
+class OccupancyIndex:
+    """Sorted-interval index over a set of appointments (usually one day of one event type)."""
+
+    def __init__(self, appointments: Iterable):
+        self._appointments = sorted(appointments, key=lambda appt: appt.start_time)
+        self._starts = [appt.start_time for appt in self._appointments]
+        self._max_duration = max(
+            (appt.end_time - appt.start_time for appt in self._appointments),
+            default=None
+        )
+
+        self._all = _IntervalCounter((appt.start_time, appt.end_time) for appt in self._appointments)
+        self._unassigned = _IntervalCounter(
+            (appt.start_time, appt.end_time) for appt in self._appointments if not appt.provider_id
+        )
+
+        by_provider: Dict[int, list] = {}
+        for appt in self._appointments:
+            if appt.provider_id:
+                by_provider.setdefault(appt.provider_id, []).append((appt.start_time, appt.end_time))
+        self._by_provider = {pid: _IntervalCounter(rows) for pid, rows in by_provider.items()}
+
+    def add(self, appointment):
+        """เพิ่มการจองที่เพิ่งสร้าง (ยังไม่ commit) — ให้การตรวจ slot ถัดไปในวันเดียวกันเห็นด้วย (ใช้กับการจองแบบกลุ่ม)"""
+        index = bisect_right(self._starts, appointment.start_time)
+        self._appointments.insert(index, appointment)
+        self._starts.insert(index, appointment.start_time)
+        duration = appointment.end_time - appointment.start_time
+        if self._max_duration is None or duration > self._max_duration:
+            self._max_duration = duration
+
+        self._all.add(appointment.start_time, appointment.end_time)
+        if appointment.provider_id:
+            counter = self._by_provider.get(appointment.provider_id)
+            if counter is None:
+                counter = self._by_provider[appointment.provider_id] = _IntervalCounter(())
+            counter.add(appointment.start_time, appointment.end_time)
+        else:
+            self._unassigned.add(appointment.start_time, appointment.end_time)
+
+    def __len__(self) -> int:
+        return len(self._appointments)
+
+    def count(self, slot_start: datetime, slot_end: datetime) -> int:
+        """จำนวนการจองทั้งหมดที่ทับ slot"""
+        return self._all.count(slot_start, slot_end)
+
+    def unassigned_count(self, slot_start: datetime, slot_end: datetime) -> int:
+        """จำนวนการจองที่ยังไม่มี provider และทับ slot"""
+        return self._unassigned.count(slot_start, slot_end)
+
+    def is_provider_booked(self, provider_id: int, slot_start: datetime, slot_end: datetime) -> bool:
+        counter = self._by_provider.get(provider_id)
+        return counter is not None and counter.count(slot_start, slot_end) > 0
+
+    def overlapping(self, slot_start: datetime, slot_end: datetime) -> List:
+        """การจองที่ทับ slot (เรียงตามเวลาเริ่ม)"""
+        if self._max_duration is None:
+            return []
+        lo = bisect_right(self._starts, slot_start - self._max_duration)
+        hi = bisect_left(self._starts, slot_end)
+        return [appt for appt in self._appointments[lo:hi] if appt.end_time > slot_start]
+
+    def booked_provider_ids(
+        self,
+        slot_start: datetime,
+        slot_end: datetime,
+        provider_ids: Optional[Iterable[int]] = None
+    ) -> Set[int]:
+        """provider ที่มีการจองทับ slot — ระบุ provider_ids เพื่อตรวจเฉพาะกลุ่มนั้น (O(k log n))"""
+        if provider_ids is not None:
+            return {pid for pid in provider_ids if self.is_provider_booked(pid, slot_start, slot_end)}
+        return {appt.provider_id for appt in self.overlapping(slot_start, slot_end) if appt.provider_id}
+
+    def count_starting_between(self, range_start: datetime, range_end: datetime) -> int:
+        """จำนวนการจองที่เริ่มใน [range_start, range_end)"""
+        return bisect_left(self._starts, range_end) - bisect_left(self._starts, range_start)
@@ -0,0 +1,228 @@
+# fastapi_app/app/public_pages.py - Composite endpoints for the public booking pages
+
+"""
+endpoint แบบรวม (backend-for-frontend) ของหน้าจองสาธารณะใน Flask (public_booking.py)
+
+แต่ละหน้าเคยเรียก API หลายครั้งต่อเนื่องกัน (event type -> template -> date overrides -> holidays
+-> availability range) ที่นี่ตอบทุกอย่างที่หน้านั้นใช้ใน request เดียว โดยใช้ AvailabilityWindow
+ของทั้งเดือน (holidays / overrides / availabilities / schedules / appointments โหลดครั้งเดียว):
+
+    GET /public/services/{event_type_id}                  หน้าเลือกวัน + ปฏิทินรายเดือน (AJAX)
+    GET /public/bookings/{booking_reference}/reschedule   หน้าเลื่อนนัด: ข้อมูลการจอง + ปฏิทินของบริการ
+    GET /public/slots/{event_type_id}?date=               slot ของวันพร้อมข้อมูลผู้ให้บริการที่ว่างในแต่ละ slot
+"""
+
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from sqlalchemy.orm import Session, joinedload
+
+from shared_db import models
+
+from .async_session import SyncTenantDB, runs_in_threadpool
+from .booking import booking_details, load_day_availability, summarize_day
+from .day_availability import AvailabilityWindow
+from .event_types import EventTypeResponse
+from .metrics import availability_timer
+
+router = APIRouter(prefix="/api/v1/tenants/{subdomain}", tags=["public-pages"])
+
+
+def _month_bounds(year: Optional[int], month: Optional[int], today: date):
+    year = year or today.year
+    month = month or today.month
+    if not 1 <= month <= 12:
+        raise HTTPException(400, "month must be between 1 and 12")
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _event_type_payload(event_type: models.EventType) -> Dict:
+    """เหมือน item ของ GET /event-types (หน้า template ใช้ field ชุดเดียวกัน)"""
+    payload = EventTypeResponse.model_validate(event_type).model_dump(mode="json")
+    payload['availability_name'] = event_type.availability_template.name if event_type.availability_template else "ไม่ได้กำหนด"
+    return payload
+
+
+def service_calendar(
+    db: Session,
+    subdomain: str,
+    event_type: models.EventType,
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> Dict:
+    """ข้อมูลปฏิทินหนึ่งเดือนของบริการ: ตารางรายสัปดาห์, วันปิด/วันหยุด และสรุปความว่างรายวัน"""
+    today = date.today()
+    month_start, month_end = _month_bounds(year, month, today)
+    template = event_type.availability_template
+
+    unavailable_dates: Dict[str, str] = {}
+    holiday_dates: Dict[str, str] = {}
+    days = []
+
+    with availability_timer(subdomain, "calendar"):
+        window = AvailabilityWindow(db, event_type.id, template, month_start, month_end)
+
+        current = month_start
+        while current <= month_end:
+            date_override = window.date_override(current)
+            if date_override and date_override.is_unavailable:
+                unavailable_dates[current.isoformat()] = date_override.reason or 'วันหยุดพิเศษ'
+            holiday = window.holiday(current)
+            if holiday:
+                holiday_dates[current.isoformat()] = holiday.name
+            current += timedelta(days=1)
+
+        # สรุปจำนวน slot ว่างเฉพาะวันที่ยังจองได้ (วันนี้ถึง max_advance_days)
+        current = max(month_start, today)
+        last_day = month_end
+        if event_type.max_advance_days is not None:
+            last_day = min(last_day, today + timedelta(days=event_type.max_advance_days))
+        while current <= last_day:
+            days.append(summarize_day(window, event_type, template, current).model_dump(mode="json"))
+            current += timedelta(days=1)
+
+    return {
+        "year": month_start.year,
+        "month": month_start.month,
+        "event_type": _event_type_payload(event_type),
+        "template_id": template.id if template else None,
+        "schedule": window.weekly_schedule(),
+        "unavailable_dates": unavailable_dates,
+        "holiday_dates": holiday_dates,
+        "days": days
+    }
+
+
+def _active_event_type(db: Session, event_type_id: int) -> models.EventType:
+    event_type = db.query(models.EventType).options(
+        joinedload(models.EventType.availability_template)
+    ).filter_by(id=event_type_id, is_active=True).first()
+    if not event_type:
+        raise HTTPException(404, "Event type not found or inactive")
+    return event_type
+
+
+@router.get("/public/services/{event_type_id}", response_model=dict)
+@runs_in_threadpool
+def get_service_page(
+    subdomain: str,
+    event_type_id: int,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    db: Session = SyncTenantDB
+):
+    """หน้าเลือกวันเวลาของบริการ (และปฏิทินเดือนอื่นผ่าน year/month) ใน request เดียว"""
+    try:
+        event_type = _active_event_type(db, event_type_id)
+        return service_calendar(db, subdomain, event_type, year, month)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error loading service page: {str(e)}")
+
+
+@router.get("/public/bookings/{booking_reference}/reschedule", response_model=dict)
+@runs_in_threadpool
+def get_reschedule_page(
+    subdomain: str,
+    booking_reference: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    db: Session = SyncTenantDB
+):
+    """ข้อมูลการจองพร้อมปฏิทินของบริการเดิม (service เป็น null ถ้าบริการถูกปิดหรือลบไปแล้ว)"""
+    appointment = db.query(models.Appointment).options(
+        joinedload(models.Appointment.event_type).joinedload(models.EventType.availability_template),
+        joinedload(models.Appointment.provider)
+    ).filter_by(
+        booking_reference=booking_reference
+    ).first()
+
+    if not appointment:
+        raise HTTPException(404, "Booking not found")
+
+    try:
+        event_type = appointment.event_type
+        service = None
+        if event_type and event_type.is_active:
+            service = service_calendar(db, subdomain, event_type, year, month)
+
+        return {
+            "booking": booking_details(appointment),
+            "service": service
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error loading reschedule page: {str(e)}")
+
+
+def _provider_display(assignments: List[models.TemplateProvider]) -> Dict[int, Dict]:
+    """provider ที่ active ของ template -> ข้อมูลที่หน้ายืนยันแสดง (เรียง primary, priority, ชื่อ)"""
+    providers = [
+        {
+            "id": assignment.provider.id,
+            "name": assignment.provider.name,
+            "title": assignment.provider.title,
+            "department": assignment.provider.department,
+            "is_primary": assignment.is_primary,
+            "priority": assignment.priority,
+            "can_auto_assign": assignment.can_auto_assign
+        }
+        for assignment in assignments
+        if assignment.provider is not None and assignment.provider.is_active
+    ]
+    providers.sort(key=lambda item: (
+        0 if item["is_primary"] else 1,
+        item["priority"] if item["priority"] is not None else 999,
+        (item["name"] or '').lower()
+    ))
+    return {provider["id"]: provider for provider in providers}
+
+
+@router.get("/public/slots/{event_type_id}", response_model=dict)
+@runs_in_threadpool
+def get_slots_with_providers(
+    subdomain: str,
+    event_type_id: int,
+    date: str,
+    provider_id: Optional[int] = None,
+    db: Session = SyncTenantDB
+):
+    """slot ของวันเหมือน /booking/availability/{event_type_id} และเพิ่ม providers ในแต่ละ slot
+
+    provider ของ template โหลดใน query เดียว แทนการเรียก /availability/templates/{id}/providers แยก
+    """
+    try:
+        availability = dict(load_day_availability(db, subdomain, event_type_id, date, provider_id))
+
+        template_id = availability.get("template_id")
+        if not (template_id and availability.get("requires_provider_assignment")):
+            return availability
+
+        assignments = db.query(models.TemplateProvider).options(
+            joinedload(models.TemplateProvider.provider)
+        ).filter(models.TemplateProvider.template_id == template_id).all()
+        providers = _provider_display(assignments)
+
+        slots = []
+        for slot in availability.get("slots", []):
+            slot_provider_ids = set(slot.get("available_provider_ids") or [])
+            slots.append({
+                **slot,
+                "providers": [provider for pid, provider in providers.items() if pid in slot_provider_ids]
+            })
+        availability["slots"] = slots
+        return availability
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error getting availability: {str(e)}")
@@ -0,0 +1,54 @@
+# fastapi_app/app/recurrence.py - RRULE expansion for appointment series
+
+"""
+แปลง RRULE (RFC 5545) เป็นรายการเวลานัด เช่น
+
+    FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=36          จ/พ/ศ 36 ครั้ง
+    FREQ=WEEKLY;INTERVAL=2;UNTIL=20261231T235959 ทุก 2 สัปดาห์จนสิ้นปี
+
+DTSTART มาจากวันและเวลาของนัดแรกที่ผู้จองเลือก (ไม่อ่านจากข้อความ rule)
+rule ต้องระบุ COUNT หรือ UNTIL และสร้างได้ไม่เกิน max_occurrences ครั้ง
+"""
+
+from datetime import datetime
+from itertools import islice
+from typing import List
+
+from dateutil.rrule import rrulestr
+
+
+def normalize_rrule(rule: str) -> str:
+    """ตัดช่องว่างและ prefix "RRULE:" ออก — ค่าที่เก็บใน AppointmentSeries.rrule"""
+    rule = (rule or '').strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    return rule.upper()
+
+
+def expand_rrule(rule: str, dtstart: datetime, max_occurrences: int) -> List[datetime]:
+    """เวลาของทุกครั้งตาม rule (เรียงตามเวลา, ครั้งแรก = dtstart ถ้าตรงกับ rule) — rule ไม่ถูกต้องโยน ValueError"""
+    rule = normalize_rrule(rule)
+    if not rule:
+        raise ValueError("ต้องระบุ RRULE")
+
+    parts = {}
+    for part in rule.split(';'):
+        key, _, value = part.partition('=')
+        parts[key.strip()] = value.strip()
+
+    if 'DTSTART' in parts:
+        raise ValueError("ไม่ต้องระบุ DTSTART ใน RRULE — ใช้วันและเวลาของนัดแรกแทน")
+    if 'COUNT' not in parts and 'UNTIL' not in parts:
+        raise ValueError("RRULE ต้องระบุ COUNT หรือ UNTIL")
+
+    try:
+        recurrence = rrulestr(rule, dtstart=dtstart)
+        occurrences = list(islice(recurrence, max_occurrences + 1))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"RRULE ไม่ถูกต้อง: {exc}")
+
+    if len(occurrences) > max_occurrences:
+        raise ValueError(f"นัดต่อเนื่องได้ไม่เกิน {max_occurrences} ครั้ง")
+    if not occurrences:
+        raise ValueError("RRULE ไม่มีวันนัดที่ตรงเงื่อนไข")
+    return occurrences
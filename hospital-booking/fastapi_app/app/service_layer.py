@@ -0,0 +1,200 @@
+# fastapi_app/app/service_layer.py - Call tenant API handlers in-process (no HTTP hop)
+
+"""
+service layer ของ tenant API ที่ไม่ผูกกับ transport
+
+handler ของ router (event_types / availability / booking / holidays / public_pages) เป็นฟังก์ชัน sync บน Session
+ที่ห่อด้วย runs_on_async_session หรือ runs_in_threadpool — ตัว logic จริงคือ handler.__wrapped__ ซึ่งไม่ต้องใช้ HTTP
+module นี้จับคู่ (method, path) กับ route เดียวกับที่ FastAPI ใช้ แล้วเรียก handler ตรง ๆ ด้วย
+sync Session ที่ผูกกับ tenant:
+
+    path / query / body  -> argument ของ handler (validate ด้วย annotation เดิม — Pydantic)
+    ผลลัพธ์               -> แปลงด้วย response_model ของ route เหมือน FastAPI (ได้ dict/list แบบ JSON)
+    HTTPException        -> ServiceResponse(status_code, {"detail": ...})
+    BackgroundTasks      -> รันหลังได้ผลบน thread pool เล็ก ๆ (เช่นอีเมลยืนยันนัด)
+
+Flask (services/internal_api.py) ใช้ dispatch() เมื่อรันร่วมเครื่อง/venv เดียวกับ FastAPI
+ตัดค่า HTTP + JSON encode/decode + request ที่สองของ FastAPI ออก ถ้าไม่มี route ที่เรียกแบบนี้ได้
+(เช่น handler ที่เป็น async อยู่แล้ว) dispatch() คืน None และผู้เรียกส่งผ่าน HTTP ตามปกติ
+
+แต่ละ call ใช้ Session ใหม่ของตัวเอง (connection จาก pool เดียวกับ Flask) — handler commit/rollback เอง
+จึงไม่แตะ transaction ของ g.db ใน request ของ Flask
+"""
+
+import inspect
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import BackgroundTasks, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from starlette.responses import Response
+
+from shared_db.database import SessionLocal, use_tenant_schema
+
+logger = logging.getLogger(__name__)
+
+_routes: Optional[List[Tuple[APIRoute, Any, inspect.Signature]]] = None
+_routes_lock = threading.Lock()
+_background = None
+_background_pid = None
+
+
+class ServiceResponse:
+    """ผลของ call แบบ in-process — หน้าตาเหมือน requests.Response เท่าที่ฝั่ง Flask ใช้"""
+
+    headers = {'content-type': 'application/json'}
+
+    def __init__(self, status_code: int, data: Any = None):
+        self.status_code = status_code
+        self._data = data
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        if self._data is None:
+            raise ValueError("response has no body")
+        return self._data
+
+    @property
+    def text(self) -> str:
+        return '' if self._data is None else json.dumps(self._data, ensure_ascii=False)
+
+    def raise_for_status(self):
+        if not self.ok:
+            import requests
+
+            raise requests.HTTPError(f"{self.status_code} in-process call failed", response=self)
+
+
+def _tenant_routes() -> List[Tuple[APIRoute, Any, inspect.Signature]]:
+    """(route, sync handler, signature) ของทุก route ที่เรียกแบบ in-process ได้ ตามลำดับเดียวกับ FastAPI"""
+    global _routes
+    if _routes is None:
+        with _routes_lock:
+            if _routes is None:
+                from .availability import router as availability_router
+                from .booking import router as booking_router
+                from .event_types import router as event_types_router
+                from .holidays import router as holidays_router
+                from .public_pages import router as public_pages_router
+
+                routes = []
+                # ลำดับเดียวกับ app.include_router ใน main.py
+                for router in (
+                    event_types_router, availability_router, booking_router, holidays_router, public_pages_router
+                ):
+                    for route in router.routes:
+                        handler = getattr(route.endpoint, '__wrapped__', None)
+                        if isinstance(route, APIRoute) and handler is not None:
+                            routes.append((route, handler, inspect.signature(handler)))
+                _routes = routes
+    return _routes
+
+
+def _match(method: str, path: str):
+    for route, handler, signature in _tenant_routes():
+        if method not in route.methods:
+            continue
+        match = route.path_regex.match(path)
+        if match:
+            path_params = {
+                name: route.param_convertors[name].convert(value)
+                for name, value in match.groupdict().items()
+            }
+            return route, handler, signature, path_params
+    return None
+
+
+def _build_arguments(signature: inspect.Signature, path_params: Dict, params: Dict, body: Any, db, background):
+    kwargs = {}
+    for name, parameter in signature.parameters.items():
+        annotation = parameter.annotation
+        if name == 'db':
+            kwargs[name] = db
+        elif inspect.isclass(annotation) and issubclass(annotation, BackgroundTasks):
+            kwargs[name] = background
+        elif name in path_params:
+            kwargs[name] = path_params[name]
+        elif inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+            kwargs[name] = annotation.model_validate(body if body is not None else {})
+        elif name in params:
+            value = params[name]
+            kwargs[name] = value if annotation is inspect.Parameter.empty else TypeAdapter(annotation).validate_python(value)
+        elif parameter.default is inspect.Parameter.empty:
+            raise ValueError(f"missing query parameter: {name}")
+    return kwargs
+
+
+def _serialize(route: APIRoute, result: Any) -> ServiceResponse:
+    if isinstance(result, Response):
+        body = json.loads(result.body) if result.body else None
+        return ServiceResponse(result.status_code, body)
+    status_code = route.status_code or 200
+    if status_code == 204 or result is None and route.response_model is None:
+        return ServiceResponse(status_code, None)
+    if route.response_model is not None:
+        adapter = TypeAdapter(route.response_model)
+        validated = adapter.validate_python(result, from_attributes=True)
+        return ServiceResponse(status_code, adapter.dump_python(validated, mode='json'))
+    return ServiceResponse(status_code, jsonable_encoder(result))
+
+
+def _run_background(background: BackgroundTasks):
+    global _background, _background_pid
+    if not background.tasks:
+        return
+    if _background_pid != os.getpid():
+        _background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='service-background')
+        _background_pid = os.getpid()
+    for task in background.tasks:
+        if task.is_async:
+            logger.warning("Skipping async background task %s in in-process call", task.func)
+            continue
+        _background.submit(task.func, *task.args, **task.kwargs)
+
+
+def dispatch(
+    method: str,
+    path: str,
+    subdomain: Optional[str] = None,
+    params: Optional[Dict] = None,
+    json_body: Any = None
+) -> Optional[ServiceResponse]:
+    """เรียก handler ของ path (relative กับ /api/v1/tenants/{subdomain} เมื่อระบุ subdomain)
+
+    คืน None เมื่อไม่มี route ที่เรียกแบบ in-process ได้ — ผู้เรียกควรส่งผ่าน HTTP แทน
+    """
+    full_path = f"/api/v1/tenants/{subdomain}{path}" if subdomain else path
+    matched = _match(method.upper(), full_path.split('?', 1)[0])
+    if matched is None:
+        return None
+    route, handler, signature, path_params = matched
+    background = BackgroundTasks()
+
+    db = SessionLocal()
+    try:
+        use_tenant_schema(db, f"tenant_{path_params['subdomain']}")
+        try:
+            kwargs = _build_arguments(signature, path_params, params or {}, json_body, db, background)
+        except (ValidationError, ValueError) as exc:
+            errors = exc.errors(include_url=False) if isinstance(exc, ValidationError) else str(exc)
+            return ServiceResponse(422, {'detail': jsonable_encoder(errors)})
+        try:
+            result = handler(**kwargs)
+        except HTTPException as exc:
+            db.rollback()
+            return ServiceResponse(exc.status_code, {'detail': jsonable_encoder(exc.detail)})
+        response = _serialize(route, result)
+    finally:
+        db.close()
+
+    _run_background(background)
+    return response
@@ -0,0 +1,108 @@
+# fastapi_app/app/slot_locks.py - Advisory locks around booking check-and-insert
+
+"""
+ล็อกการจองด้วย Postgres advisory lock ระดับ transaction (pg_advisory_xact_lock)
+
+ensure_slot_capacity อ่านนัดที่มีอยู่แล้วจึง insert — ถ้าสอง request จองที่สุดท้ายพร้อมกัน
+จะผ่านการตรวจทั้งคู่ ล็อกนี้ทำให้ request ที่แย่ง "slot เดียวกัน" ตรวจและ insert ทีละคน
+ส่วน slot อื่น (คนละ key) ยังทำงานขนานกันได้
+
+key:
+    {schema}:event_type:{id}:slot:{slot_start}   ปกติ
+    {schema}:event_type:{id}:day:{date}          เมื่อ event type จำกัด max_bookings_per_day
+                                                 (การตรวจจำนวนต่อวันครอบคลุมทุก slot ของวัน)
+provider ที่ template ต้องกำหนดถูกเลือกภายใน ensure_slot_capacity (หลังได้ล็อก) และ capacity
+นับต่อ event type จึงใช้ key ของ slot เดียวกัน — request ที่ขอ provider เจาะจงกับแบบ auto
+แย่ง provider ชุดเดียวกันจึงต้องรอกันเสมอ
+
+การจองแบบกลุ่ม (/booking/batch) ล็อกทุก key ที่ต้องใช้ใน statement เดียวโดยเรียงตาม key
+batch สองชุดที่ขอ slot ทับกันจึงได้ล็อกตามลำดับเดียวกันเสมอ ไม่เกิด deadlock
+
+find-or-create patient ล็อก email / เบอร์โทร (ค่า normalize) หลังล็อก slot เสมอ:
+    {schema}:patient:email:{email}  /  {schema}:patient:phone:{digits}
+การจองสองรายการของผู้ติดต่อคนเดียวกันจึงไม่สร้าง patient ซ้ำ
+
+ล็อกคืนเองเมื่อ commit/rollback และรอไม่เกิน BOOKING_LOCK_TIMEOUT (default 5s)
+"""
+
+import os
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from shared_db import models
+from shared_db.database import pg_error_code
+
+LOCK_TIMEOUT = os.environ.get('BOOKING_LOCK_TIMEOUT', '5s')
+
+# 55P03 = lock_not_available (หมด lock_timeout)
+_LOCK_NOT_AVAILABLE = '55P03'
+# 23P01 = exclusion_violation — provider มีนัดอื่นทับเวลาอยู่แล้ว (models.APPOINTMENT_PROVIDER_OVERLAP)
+_EXCLUSION_VIOLATION = '23P01'
+
+
+def slot_lock_key(schema_name: str, event_type: models.EventType, slot_start: datetime) -> str:
+    if event_type.max_bookings_per_day:
+        return f"{schema_name}:event_type:{event_type.id}:day:{slot_start.date().isoformat()}"
+    return f"{schema_name}:event_type:{event_type.id}:slot:{slot_start.isoformat()}"
+
+
+def _acquire(db: Session, statement: str, params: dict):
+    try:
+        db.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": LOCK_TIMEOUT})
+        db.execute(text(statement), params)
+    except DBAPIError as exc:
+        # psycopg2 ห่อ 55P03 เป็น OperationalError แต่ asyncpg เป็น DBAPIError ทั่วไป — ดูจาก SQLSTATE
+        if pg_error_code(exc) == _LOCK_NOT_AVAILABLE:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="มีผู้กำลังจองช่วงเวลานี้อยู่ กรุณาลองใหม่อีกครั้ง")
+        raise
+
+
+def lock_booking_slot(db: Session, schema_name: str, event_type: models.EventType, slot_start: datetime):
+    """ถือล็อกของ slot จนจบ transaction ปัจจุบัน — เรียกก่อนตรวจ capacity"""
+    key = slot_lock_key(schema_name, event_type, slot_start)
+    _acquire(db, "SELECT pg_advisory_xact_lock(hashtextextended(:key, 0))", {"key": key})
+
+
+def _acquire_keys(db: Session, keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    _acquire(
+        db,
+        "SELECT count(pg_advisory_xact_lock(hashtextextended(key, 0))) "
+        "FROM (SELECT unnest(CAST(:keys AS text[])) AS key ORDER BY 1) AS ordered_keys",
+        {"keys": keys}
+    )
+
+
+def lock_booking_slots(db: Session, schema_name: str, slots: Iterable[Tuple[models.EventType, datetime]]):
+    """ล็อกหลาย slot พร้อมกัน (ไม่ซ้ำ key, เรียงตาม key) จนจบ transaction ปัจจุบัน"""
+    _acquire_keys(db, (slot_lock_key(schema_name, event_type, slot_start) for event_type, slot_start in slots))
+
+
+def lock_patient_contacts(db: Session, schema_name: str, contacts: Iterable[Tuple[Optional[str], Optional[str]]]):
+    """ล็อก (email, phone) ที่ normalize แล้วของผู้ติดต่อจนจบ transaction — เรียกก่อนค้นหา / สร้าง patient"""
+    keys = []
+    for email, phone in contacts:
+        if email:
+            keys.append(f"{schema_name}:patient:email:{email}")
+        if phone:
+            keys.append(f"{schema_name}:patient:phone:{phone}")
+    _acquire_keys(db, keys)
+
+
+def raise_for_provider_overlap(db: Session, exc: Exception):
+    """exc มาจาก exclusion constraint ของ provider: rollback แล้วตอบ 409 — error อื่นไม่ทำอะไร
+
+    ล็อกของ slot แยกตาม event type — สองบริการที่จอง provider คนเดียวกันพร้อมกันผ่านการตรวจได้ทั้งคู่
+    ฐานข้อมูลจึงเป็นตัวตัดสินสุดท้าย
+    """
+    if pg_error_code(exc) == _EXCLUSION_VIOLATION:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="ผู้ให้บริการมีนัดอื่นในช่วงเวลานี้แล้ว กรุณาเลือกเวลาอื่น")
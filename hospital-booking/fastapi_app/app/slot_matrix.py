@@ -0,0 +1,220 @@
+# fastapi_app/app/slot_matrix.py - Vectorized provider x slot availability for one day
+
+"""
+ตาราง boolean (schedule x slot) ของวันหนึ่งด้วย NumPy แทนการวนทีละ slot ทีละ provider
+
+DayAvailability.available_providers / OccupancyIndex ตอบทีละ slot (O(P) ต่อ slot) ซึ่งพอสำหรับการจองครั้งเดียว
+แต่ get_booking_availability และ inventory_builder ถามทุก slot ของวัน — template ที่มี 50 provider x 100 slot
+ใช้เวลาหลาย ms ใน Python ที่นี่คำนวณทั้งวันด้วย array operation:
+
+    CompiledSchedules   ProviderSchedule ของทั้งช่วงวันที่ -> array หนึ่งแถวต่อ schedule
+                        (bitmask วันในสัปดาห์, effective/end date เป็น ordinal, กรอบเวลา custom)
+                        + ช่วงลาของ provider — compile ครั้งเดียวต่อ AvailabilityWindow
+    SlotMatrix.build    แถวที่ใช้ได้ในวันนั้น (วันในสัปดาห์ & ช่วงวันที่ & ไม่ลา)
+                        x slot ที่อยู่ในกรอบเวลา custom & provider ไม่ติดนัดบริการอื่น  -> available (R, S)
+                        นัดของ event type นี้                                         -> booked, count, unassigned (S,)
+
+กฎเหมือน DayAvailability.available_providers และ OccupancyIndex ทุกประการ (รวมลำดับของ provider ตาม schedule)
+เวลาทุกค่าเป็น µs นับจาก 00:00 ของ target_date — กรอบเวลา custom คำนวณจาก datetime.combine(target_date, เวลา)
+แบบเดียวกับ DayAvailability slot ที่จบตอน/ข้ามเที่ยงคืนจึงถูกเทียบกับกรอบของวันนั้นเหมือนกัน
+ความเท่ากันกับ engine เดิมและเวลาที่ใช้ตรวจได้ด้วย ``python -m benchmarks run slot_matrix``
+ตารางเป็นภาพ ณ ตอนสร้าง — การจองที่เพิ่มด้วย DayAvailability.add_booking หลังจากนั้นไม่ถูกนับ
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_NO_WINDOW_START = np.iinfo(np.int64).min
+_NO_WINDOW_END = np.iinfo(np.int64).max
+_NO_END_DATE = date.max.toordinal()
+_ONE_US = timedelta(microseconds=1)
+
+
+def _day_weekday_bit(target_date: date) -> int:
+    # DayOfWeek value (0=อาทิตย์) เหมือน convert_python_weekday
+    return 1 << ((target_date.weekday() + 1) % 7)
+
+
+def _weekday_bits(days_of_week) -> int:
+    bits = 0
+    for day in days_of_week or []:
+        if isinstance(day, int) and 0 <= day < 7:
+            bits |= 1 << day
+    return bits
+
+
+def _offsets_us(values: Iterable[datetime], day_start: datetime) -> np.ndarray:
+    return np.fromiter(((value - day_start) // _ONE_US for value in values), dtype=np.int64)
+
+
+def _window_offsets_us(times: Sequence, rows: np.ndarray, target_date: date, day_start: datetime, missing: int) -> np.ndarray:
+    """กรอบเวลา custom ของแถวที่เลือก เป็น µs จาก day_start (ไม่มีกรอบ = missing)"""
+    return np.fromiter(
+        (
+            missing if times[row] is None else (datetime.combine(target_date, times[row]) - day_start) // _ONE_US
+            for row in rows
+        ),
+        dtype=np.int64,
+        count=len(rows)
+    )
+
+
+def _overlaps(starts: np.ndarray, ends: np.ndarray, slot_starts: np.ndarray, slot_ends: np.ndarray) -> np.ndarray:
+    """(N, S) — ช่วง [start, end) ทับ slot เมื่อ start < slot_end และ end > slot_start"""
+    return (starts[:, None] < slot_ends[None, :]) & (ends[:, None] > slot_starts[None, :])
+
+
+def _any_by_key(keys: np.ndarray, rows: np.ndarray, unique_keys: np.ndarray) -> np.ndarray:
+    """รวม rows (N, S) ตาม key -> (len(unique_keys), S) ด้วย OR"""
+    combined = np.zeros((len(unique_keys), rows.shape[1]), dtype=bool)
+    if len(keys):
+        np.logical_or.at(combined, np.searchsorted(unique_keys, keys), rows)
+    return combined
+
+
+class CompiledSchedules:
+    """ProviderSchedule (พร้อม provider ที่ joinedload แล้ว) และวันลา ในรูป array"""
+
+    def __init__(self, schedules: Sequence, leaves: Iterable = ()):
+        usable = [
+            schedule for schedule in schedules
+            if schedule.provider is not None and schedule.provider.is_active
+        ]
+        self.provider_ids = np.array([schedule.provider.id for schedule in usable], dtype=np.int64)
+        self.weekday_bits = np.array([_weekday_bits(schedule.days_of_week) for schedule in usable], dtype=np.int64)
+        self.effective = np.array([schedule.effective_date.toordinal() for schedule in usable], dtype=np.int64)
+        self.until = np.array(
+            [schedule.end_date.toordinal() if schedule.end_date else _NO_END_DATE for schedule in usable],
+            dtype=np.int64
+        )
+        # เก็บเป็น time — แปลงเป็น µs ต่อวันใน SlotMatrix.build (เฉพาะแถวที่ใช้ในวันนั้น)
+        self.window_start = [schedule.custom_start_time or None for schedule in usable]
+        self.window_end = [schedule.custom_end_time or None for schedule in usable]
+
+        leaves = list(leaves)
+        self.leave_provider_ids = np.array([leave.provider_id for leave in leaves], dtype=np.int64)
+        self.leave_start = np.array([leave.start_date.toordinal() for leave in leaves], dtype=np.int64)
+        self.leave_end = np.array([leave.end_date.toordinal() for leave in leaves], dtype=np.int64)
+
+    def day_rows(self, target_date: date) -> np.ndarray:
+        """index ของ schedule ที่ใช้ได้ในวันนั้น: วันในสัปดาห์ตรง, อยู่ในช่วง effective/end และ provider ไม่ลา"""
+        ordinal = target_date.toordinal()
+        mask = (
+            ((self.weekday_bits & _day_weekday_bit(target_date)) != 0)
+            & (self.effective <= ordinal)
+            & (self.until >= ordinal)
+        )
+        if len(self.leave_provider_ids):
+            on_leave = self.leave_provider_ids[(self.leave_start <= ordinal) & (self.leave_end >= ordinal)]
+            if len(on_leave):
+                mask &= ~np.isin(self.provider_ids, on_leave)
+        return np.flatnonzero(mask)
+
+
+class SlotMatrix:
+    """ความว่างของทุก slot ในวันหนึ่ง — index ของ slot ตามลำดับที่ส่งให้ build()"""
+
+    def __init__(
+        self,
+        provider_ids: np.ndarray,
+        available: np.ndarray,
+        remaining: np.ndarray,
+        booked_count: np.ndarray,
+        unassigned_count: np.ndarray,
+        booked_provider_count: np.ndarray
+    ):
+        self.provider_ids = provider_ids                    # (R,) provider ของแต่ละแถว schedule
+        self.available = available                          # (R, S) อยู่ในกะและไม่ติดนัดบริการอื่น
+        self.remaining = remaining                          # (R, S) available และยังไม่มีนัดของบริการนี้
+        self.pool_size = available.sum(axis=0)              # (S,) len(available_providers)
+        self.booked_count = booked_count                    # (S,) occupancy.count
+        self.unassigned_count = unassigned_count            # (S,) occupancy.unassigned_count
+        self.booked_provider_count = booked_provider_count  # (S,) len(occupancy.booked_provider_ids)
+
+    @classmethod
+    def build(
+        cls,
+        compiled: CompiledSchedules,
+        target_date: date,
+        slots: Sequence[Tuple[datetime, datetime]],
+        appointments: Sequence = (),
+        other_bookings: Sequence = ()
+    ) -> "SlotMatrix":
+        day_start = datetime.combine(target_date, datetime.min.time())
+        slot_starts = _offsets_us((start for start, _ in slots), day_start)
+        slot_ends = _offsets_us((end for _, end in slots), day_start)
+
+        rows = compiled.day_rows(target_date)
+        provider_ids = compiled.provider_ids[rows]
+        # slot อยู่ในกรอบเวลา custom ของ schedule (ไม่มีกรอบ = ทั้งวัน)
+        window_start = _window_offsets_us(compiled.window_start, rows, target_date, day_start, _NO_WINDOW_START)
+        window_end = _window_offsets_us(compiled.window_end, rows, target_date, day_start, _NO_WINDOW_END)
+        available = (
+            (window_start[:, None] <= slot_starts[None, :])
+            & (window_end[:, None] >= slot_ends[None, :])
+        )
+
+        unique_providers = np.unique(provider_ids)
+        if len(other_bookings) and len(unique_providers):
+            other_pids = np.array([row.provider_id for row in other_bookings], dtype=np.int64)
+            relevant = np.isin(other_pids, unique_providers)
+            if relevant.any():
+                other = [row for row, keep in zip(other_bookings, relevant) if keep]
+                busy = _any_by_key(
+                    other_pids[relevant],
+                    _overlaps(
+                        _offsets_us((row.start_time for row in other), day_start),
+                        _offsets_us((row.end_time for row in other), day_start),
+                        slot_starts, slot_ends
+                    ),
+                    unique_providers
+                )
+                available &= ~busy[np.searchsorted(unique_providers, provider_ids)]
+
+        slot_count = len(slots)
+        booked_count = np.zeros(slot_count, dtype=np.int64)
+        unassigned_count = np.zeros(slot_count, dtype=np.int64)
+        booked_provider_count = np.zeros(slot_count, dtype=np.int64)
+        remaining = available
+        if len(appointments):
+            appointment_pids = np.array([appt.provider_id or 0 for appt in appointments], dtype=np.int64)
+            overlap = _overlaps(
+                _offsets_us((appt.start_time for appt in appointments), day_start),
+                _offsets_us((appt.end_time for appt in appointments), day_start),
+                slot_starts, slot_ends
+            )
+            booked_count = overlap.sum(axis=0)
+            assigned = appointment_pids != 0
+            unassigned_count = overlap[~assigned].sum(axis=0)
+
+            booked_providers = np.unique(appointment_pids[assigned])
+            if len(booked_providers):
+                booked_by = _any_by_key(appointment_pids[assigned], overlap[assigned], booked_providers)
+                booked_provider_count = booked_by.sum(axis=0)
+
+                positions = np.searchsorted(booked_providers, provider_ids)
+                hit = positions < len(booked_providers)
+                hit[hit] = booked_providers[positions[hit]] == provider_ids[hit]
+                booked_rows = np.zeros_like(available)
+                booked_rows[hit] = booked_by[positions[hit]]
+                remaining = available & ~booked_rows
+
+        return cls(provider_ids, available, remaining, booked_count, unassigned_count, booked_provider_count)
+
+    def pool(self, slot_index: int) -> List[int]:
+        """เทียบเท่า DayAvailability.available_providers ของ slot"""
+        return self.provider_ids[self.available[:, slot_index]].tolist()
+
+    def unbooked(self, slot_index: int, provider_ids: Optional[Sequence[int]] = None) -> List[int]:
+        """provider ใน pool (หรือใน provider_ids) ที่ยังไม่มีนัดของบริการนี้ทับ slot"""
+        unbooked = self.provider_ids[self.remaining[:, slot_index]].tolist()
+        if provider_ids is None:
+            return unbooked
+        unbooked_set = set(unbooked)
+        return [pid for pid in provider_ids if pid in unbooked_set]
+
+    def capacity(self, base_capacity: int) -> np.ndarray:
+        """(S,) ความจุของแต่ละ slot: base_capacity จำกัดด้วยจำนวน provider ที่ว่าง (0 เมื่อไม่มี provider)"""
+        return np.minimum(base_capacity, self.pool_size)
@@ -0,0 +1,215 @@
+# fastapi_app/app/template_snapshot.py - Compiled, per-worker snapshots of availability templates
+
+"""
+AvailabilityTemplate พร้อมลูก (Availability, ResourceCapacity, TemplateProvider) ที่ compile เป็นค่าอ่านอย่างเดียว
+
+resolve_resource_limits / select_auto_provider / AvailabilityWindow เคยเดิน relationship ของ ORM
+(template.resource_capacities, template.template_providers, แถว Availability) ซึ่ง lazy load ทุก request
+snapshot เก็บผลที่ compile แล้ว:
+
+    weekly_windows        weekday (0=อาทิตย์) -> ((start_time, end_time), ...) เฉพาะที่ active
+    capacity_by_date      specific_date -> CapacityRule ที่ available_rooms น้อยที่สุด
+    capacity_by_weekday   weekday -> CapacityRule ที่ available_rooms น้อยที่สุด
+    provider_priority     provider_id เรียงตาม primary, priority, id ของ assignment
+
+cache ต่อ worker ด้วย key (schema, template_id) และ version ใน Redis สองตัว:
+    template_snapshot:{schema}:{template_id}:ver   -> INCR เมื่อ template / schedule / capacity / provider ของ template เปลี่ยน
+    template_snapshot:{schema}:ver                 -> INCR เมื่อการเขียนกระทบหลาย template (เช่นลบ provider)
+ค่า TEMPLATE_SNAPSHOT_* ดู worker_cache.py
+"""
+
+from datetime import date, time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session, object_session
+
+from shared_db import models
+from shared_db.database import TENANT_SCHEMA_KEY
+
+from .worker_cache import VersionedWorkerCache, env_float
+
+KEY_PREFIX = "template_snapshot"
+
+
+class WeeklyWindow(NamedTuple):
+    """field ชุดเดียวกับ models.Availability ที่ผู้เรียกใช้"""
+    start_time: time
+    end_time: time
+
+
+class CapacityRule(NamedTuple):
+    available_rooms: int
+    max_concurrent_appointments: Optional[int]
+
+
+def _weekday_of(python_weekday: int) -> int:
+    # เหมือน convert_python_weekday (0=จันทร์ -> 0=อาทิตย์) — ไม่ import จาก day_availability เพื่อเลี่ยง import วน
+    return (python_weekday + 1) % 7
+
+
+def _keep_smallest(rules: Dict, key, rule: CapacityRule):
+    # min() ของเดิมคืนตัวแรกที่น้อยที่สุด — แทนที่เฉพาะเมื่อน้อยกว่าจริง
+    current = rules.get(key)
+    if current is None or rule.available_rooms < current.available_rooms:
+        rules[key] = rule
+
+
+class TemplateSnapshot:
+    """ข้อมูลของ template หนึ่งที่ใช้ตอนคำนวณ slot / จอง (อ่านอย่างเดียว ใช้ร่วมกันได้ทุก request)"""
+
+    __slots__ = (
+        'template_id', 'max_concurrent_slots', 'requires_provider_assignment',
+        'weekly_windows', 'capacity_by_date', 'capacity_by_weekday', 'provider_priority'
+    )
+
+    def __init__(
+        self,
+        template_id: int,
+        max_concurrent_slots: Optional[int],
+        requires_provider_assignment: bool,
+        weekly_windows: Dict[int, Tuple[WeeklyWindow, ...]],
+        capacity_by_date: Dict[date, CapacityRule],
+        capacity_by_weekday: Dict[int, CapacityRule],
+        provider_priority: Tuple[int, ...]
+    ):
+        self.template_id = template_id
+        self.max_concurrent_slots = max_concurrent_slots
+        self.requires_provider_assignment = requires_provider_assignment
+        self.weekly_windows = weekly_windows
+        self.capacity_by_date = capacity_by_date
+        self.capacity_by_weekday = capacity_by_weekday
+        self.provider_priority = provider_priority
+
+    @classmethod
+    def load(cls, db: Session, template_id: int) -> Optional["TemplateSnapshot"]:
+        template = db.query(
+            models.AvailabilityTemplate.max_concurrent_slots,
+            models.AvailabilityTemplate.requires_provider_assignment
+        ).filter(models.AvailabilityTemplate.id == template_id).first()
+        if template is None:
+            return None
+
+        weekly: Dict[int, List[WeeklyWindow]] = {}
+        for row in db.query(
+            models.Availability.day_of_week, models.Availability.start_time, models.Availability.end_time
+        ).filter(
+            models.Availability.template_id == template_id,
+            models.Availability.is_active == True
+        ).order_by(models.Availability.id):
+            weekly.setdefault(row.day_of_week.value, []).append(WeeklyWindow(row.start_time, row.end_time))
+
+        capacity_by_date: Dict[date, CapacityRule] = {}
+        capacity_by_weekday: Dict[int, CapacityRule] = {}
+        for row in db.query(
+            models.ResourceCapacity.specific_date,
+            models.ResourceCapacity.day_of_week,
+            models.ResourceCapacity.available_rooms,
+            models.ResourceCapacity.max_concurrent_appointments
+        ).filter(
+            models.ResourceCapacity.template_id == template_id,
+            models.ResourceCapacity.is_active == True
+        ).order_by(models.ResourceCapacity.id):
+            rule = CapacityRule(row.available_rooms, row.max_concurrent_appointments)
+            if row.specific_date is not None:
+                _keep_smallest(capacity_by_date, row.specific_date, rule)
+            if row.day_of_week is not None:
+                _keep_smallest(capacity_by_weekday, row.day_of_week.value, rule)
+
+        assignments = db.query(
+            models.TemplateProvider.id,
+            models.TemplateProvider.provider_id,
+            models.TemplateProvider.is_primary,
+            models.TemplateProvider.priority
+        ).filter(models.TemplateProvider.template_id == template_id).all()
+        assignments.sort(key=lambda row: (0 if row.is_primary else 1, row.priority or 0, row.id))
+
+        return cls(
+            template_id,
+            template.max_concurrent_slots,
+            bool(template.requires_provider_assignment),
+            {weekday: tuple(windows) for weekday, windows in weekly.items()},
+            capacity_by_date,
+            capacity_by_weekday,
+            tuple(row.provider_id for row in assignments)
+        )
+
+    def windows(self, target_date: date) -> Tuple[WeeklyWindow, ...]:
+        return self.weekly_windows.get(_weekday_of(target_date.weekday()), ())
+
+    def resource_limits(self, target_date: date) -> Dict[str, Optional[int]]:
+        """เทียบเท่า resolve_resource_limits: กฎของวันที่เฉพาะก่อน แล้วค่อยกฎรายวันในสัปดาห์"""
+        rooms_limit = self.max_concurrent_slots if self.max_concurrent_slots else 999
+        rule_limit = None
+
+        rule = self.capacity_by_date.get(target_date)
+        if rule is None:
+            rule = self.capacity_by_weekday.get(_weekday_of(target_date.weekday()))
+        if rule is not None:
+            rooms_limit = min(rooms_limit, rule.available_rooms)
+            if rule.max_concurrent_appointments:
+                rule_limit = rule.max_concurrent_appointments
+
+        return {
+            "rooms_limit": rooms_limit,
+            "max_concurrent": rule_limit
+        }
+
+    def auto_provider(self, available_provider_ids: Sequence[int]) -> Optional[int]:
+        """เทียบเท่า select_auto_provider"""
+        available = set(available_provider_ids)
+        for provider_id in self.provider_priority:
+            if provider_id in available:
+                return provider_id
+        return available_provider_ids[0] if available_provider_ids else None
+
+
+class TemplateSnapshotCache:
+    def __init__(self):
+        self._cache = VersionedWorkerCache(
+            'TEMPLATE_SNAPSHOT', int(env_float('TEMPLATE_SNAPSHOT_MAX_ENTRIES', 1024))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    @staticmethod
+    def _tenant_version_key(schema_name: str) -> str:
+        return f"{KEY_PREFIX}:{schema_name}:ver"
+
+    @staticmethod
+    def _template_version_key(schema_name: str, template_id: int) -> str:
+        return f"{KEY_PREFIX}:{schema_name}:{template_id}:ver"
+
+    def get(self, db: Session, template_id: Optional[int]) -> Optional[TemplateSnapshot]:
+        """snapshot ของ template ใน tenant ที่ session ผูกอยู่ (None = ปิด cache, ไม่ผูก tenant หรือไม่พบ template)"""
+        schema_name = db.info.get(TENANT_SCHEMA_KEY)
+        if not self.enabled or not schema_name or template_id is None:
+            return None
+        return self._cache.get(
+            (schema_name, template_id),
+            (self._tenant_version_key(schema_name), self._template_version_key(schema_name, template_id)),
+            lambda: TemplateSnapshot.load(db, template_id)
+        )
+
+    def for_template(self, template: models.AvailabilityTemplate) -> Optional[TemplateSnapshot]:
+        """snapshot ของ template ORM object (ใช้ session ที่ object ผูกอยู่)"""
+        db = object_session(template)
+        if db is None:
+            return None
+        return self.get(db, template.id)
+
+    def invalidate(self, subdomain: str, template_id: Optional[int] = None):
+        """เรียกหลัง commit — ระบุ template_id เมื่อการเขียนกระทบ template เดียว ไม่เช่นนั้นทิ้งทั้ง tenant"""
+        schema_name = f"tenant_{subdomain}"
+        if template_id is None:
+            self._cache.invalidate(
+                self._tenant_version_key(schema_name), lambda key: key[0] == schema_name
+            )
+        else:
+            self._cache.invalidate(
+                self._template_version_key(schema_name, template_id), lambda key: key == (schema_name, template_id)
+            )
+
+
+template_snapshots = TemplateSnapshotCache()
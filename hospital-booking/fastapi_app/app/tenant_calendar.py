@@ -0,0 +1,140 @@
+# fastapi_app/app/tenant_calendar.py - Per-worker cache of tenant holidays and date overrides
+
+"""
+ปฏิทินวันหยุด / date override ของ tenant ที่ compile ไว้ในหน่วยความจำของแต่ละ worker
+
+วันหยุดและ override เปลี่ยนไม่กี่ครั้งต่อปี แต่ถูกอ่านทุกครั้งที่คำนวณ availability และทุกการจอง
+(get_active_holiday / get_relevant_date_override / AvailabilityWindow) — ที่นี่โหลดทั้ง tenant
+ครั้งเดียวเป็น dict แล้วตอบด้วย lookup O(1):
+
+    holidays              date -> HolidayEntry (เฉพาะที่ active)
+    template_overrides    (template_id, date) -> OverrideEntry ล่าสุดตาม id
+    global_overrides      date -> OverrideEntry ล่าสุดตาม id (template_scope == 'global')
+
+การ invalidate ข้าม worker ใช้ version ใน Redis:
+    tenant_calendar:{schema}:ver   -> INCR หลัง commit ทุกครั้งที่เขียน holiday / date override
+worker อ่าน version ไม่เกินทุก TENANT_CALENDAR_CHECK_SECONDS ต่อ tenant และโหลดใหม่เมื่อ version เปลี่ยน
+(worker ที่เขียนเองทิ้งของตัวเองทันที) ถ้า Redis ใช้งานไม่ได้ ปฏิทินมีอายุ TENANT_CALENDAR_FALLBACK_TTL วินาที
+
+ขนาดจำกัดด้วย LRU (TENANT_CALENDAR_MAX_TENANTS tenant ต่อ worker)
+"""
+
+from datetime import date, time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from shared_db import models
+from shared_db.database import TENANT_SCHEMA_KEY
+
+from .worker_cache import VersionedWorkerCache, env_float
+
+KEY_PREFIX = "tenant_calendar"
+
+
+class HolidayEntry(NamedTuple):
+    """field ชุดเดียวกับ models.Holiday ที่ผู้เรียกใช้"""
+    id: int
+    date: date
+    name: str
+    description: Optional[str]
+
+
+class OverrideEntry(NamedTuple):
+    """field ชุดเดียวกับ models.DateOverride ที่ผู้เรียกใช้"""
+    id: int
+    date: date
+    template_id: Optional[int]
+    template_scope: Optional[str]
+    is_unavailable: bool
+    custom_start_time: Optional[time]
+    custom_end_time: Optional[time]
+    reason: Optional[str]
+
+
+class TenantCalendar:
+    """วันหยุดและ date override ทั้งหมดของ tenant หนึ่ง (อ่านอย่างเดียว ใช้ร่วมกันได้ทุก request)"""
+
+    def __init__(
+        self,
+        holidays: Dict[date, HolidayEntry],
+        template_overrides: Dict[Tuple[int, date], OverrideEntry],
+        global_overrides: Dict[date, OverrideEntry]
+    ):
+        self.holidays = holidays
+        self.template_overrides = template_overrides
+        self.global_overrides = global_overrides
+
+    @classmethod
+    def load(cls, db: Session) -> "TenantCalendar":
+        holidays = {
+            row.date: HolidayEntry(*row)
+            for row in db.query(
+                models.Holiday.id, models.Holiday.date, models.Holiday.name, models.Holiday.description
+            ).filter(models.Holiday.is_active == True)
+        }
+
+        template_overrides: Dict[Tuple[int, date], OverrideEntry] = {}
+        global_overrides: Dict[date, OverrideEntry] = {}
+        rows = db.query(
+            models.DateOverride.id,
+            models.DateOverride.date,
+            models.DateOverride.template_id,
+            models.DateOverride.template_scope,
+            models.DateOverride.is_unavailable,
+            models.DateOverride.custom_start_time,
+            models.DateOverride.custom_end_time,
+            models.DateOverride.reason
+        ).order_by(models.DateOverride.id)
+        for row in rows:
+            entry = OverrideEntry(*row)
+            # เรียงตาม id จากน้อยไปมาก ค่าที่เขียนทับทีหลังจึงเป็นตัวล่าสุด (เหมือน AvailabilityWindow)
+            if entry.template_id is not None:
+                template_overrides[(entry.template_id, entry.date)] = entry
+            if entry.template_scope == 'global':
+                global_overrides[entry.date] = entry
+
+        return cls(holidays, template_overrides, global_overrides)
+
+    def holiday(self, target_date: date) -> Optional[HolidayEntry]:
+        return self.holidays.get(target_date)
+
+    def date_override(self, template_id: Optional[int], target_date: date) -> Optional[OverrideEntry]:
+        """เทียบเท่า get_relevant_date_override: override ของ template ก่อน แล้วค่อย global"""
+        if template_id is not None:
+            override = self.template_overrides.get((template_id, target_date))
+            if override is not None:
+                return override
+        return self.global_overrides.get(target_date)
+
+
+class TenantCalendarCache:
+    def __init__(self):
+        self._cache = VersionedWorkerCache(
+            'TENANT_CALENDAR', int(env_float('TENANT_CALENDAR_MAX_TENANTS', 256))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    @staticmethod
+    def _version_key(schema_name: str) -> str:
+        return f"{KEY_PREFIX}:{schema_name}:ver"
+
+    def get(self, db: Session) -> Optional[TenantCalendar]:
+        """ปฏิทินของ tenant ที่ session ผูกอยู่ (None = ปิด cache หรือ session ไม่ได้ผูก tenant)"""
+        schema_name = db.info.get(TENANT_SCHEMA_KEY)
+        if not self.enabled or not schema_name:
+            return None
+        return self._cache.get(
+            schema_name, (self._version_key(schema_name),), lambda: TenantCalendar.load(db)
+        )
+
+    def invalidate(self, subdomain: str):
+        """เรียกหลัง commit การเพิ่ม/แก้/ลบ holiday หรือ date override ของ tenant"""
+        schema_name = f"tenant_{subdomain}"
+        self._cache.invalidate(self._version_key(schema_name), lambda key: key == schema_name)
+
+
+tenant_calendar = TenantCalendarCache()
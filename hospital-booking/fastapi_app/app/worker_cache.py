@@ -0,0 +1,131 @@
+# fastapi_app/app/worker_cache.py - In-process LRU invalidated through Redis version counters
+
+"""
+LRU ในหน่วยความจำของแต่ละ worker สำหรับข้อมูลที่อ่านบ่อยแต่เปลี่ยนนาน ๆ ครั้ง
+(ปฏิทินวันหยุดของ tenant, snapshot ของ availability template)
+
+แต่ละ entry ผูกกับ version key หนึ่งตัวหรือมากกว่าใน Redis:
+    ผู้เขียน   -> commit แล้ว invalidate(): ทิ้ง entry ของตัวเองทันที + INCR version key
+    ผู้อ่าน    -> get(): อ่าน version (ไม่บ่อยกว่าทุก {PREFIX}_CHECK_SECONDS ต่อ entry)
+                 ถ้าไม่ตรงกับตอนโหลดจึงเรียก loader ใหม่
+version ถูกอ่านก่อนเรียก loader — การเขียนที่ commit ระหว่างโหลดจะทำให้ version ถัดไปต่างและโหลดใหม่
+ถ้า Redis ใช้งานไม่ได้ entry มีอายุ {PREFIX}_FALLBACK_TTL วินาที
+
+ตัวแปร environment (PREFIX เช่น TENANT_CALENDAR):
+    {PREFIX}_CACHE_ENABLED   default true
+    {PREFIX}_CHECK_SECONDS   default 1
+    {PREFIX}_FALLBACK_TTL    default 30
+    {PREFIX}_RETRY_SECONDS   default 30 (พักการอ่าน version หลัง Redis error)
+"""
+
+import os
+import time as time_module
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Hashable, Optional, Sequence, Tuple, TypeVar
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from shared_db.redis_client import LazyRedis
+
+T = TypeVar('T')
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _Entry:
+    __slots__ = ('value', 'version', 'loaded_at', 'checked_at')
+
+    def __init__(self, value, version: Optional[Tuple[int, ...]], now: float):
+        self.value = value
+        self.version = version
+        self.loaded_at = now
+        self.checked_at = now
+
+
+class VersionedWorkerCache:
+    def __init__(self, env_prefix: str, max_entries: int):
+        self.name = env_prefix.lower()
+        self.enabled = os.environ.get(f'{env_prefix}_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_entries = max_entries
+        self.check_seconds = env_float(f'{env_prefix}_CHECK_SECONDS', 1)
+        self.fallback_ttl = env_float(f'{env_prefix}_FALLBACK_TTL', 30)
+        self.retry_seconds = env_float(f'{env_prefix}_RETRY_SECONDS', 30)
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._redis = LazyRedis(f"{self.name} version check", self.retry_seconds)
+        self._lock = Lock()
+
+    # --- versions in Redis ---
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        return self._redis.client
+
+    def _backoff(self, exc: Exception):
+        self._redis.backoff(exc)
+
+    def _remote_version(self, version_keys: Sequence[str]) -> Optional[Tuple[int, ...]]:
+        """version ปัจจุบันใน Redis (None = ตรวจไม่ได้)"""
+        client = self.redis
+        if client is None:
+            return None
+        try:
+            return tuple(int(value or 0) for value in client.mget(list(version_keys)))
+        except RedisError as exc:
+            self._backoff(exc)
+            return None
+
+    # --- lookup ---
+
+    def get(self, key: Hashable, version_keys: Sequence[str], loader: Callable[[], T]) -> T:
+        """ค่าใน cache ของ key ถ้า version ยังตรง ไม่เช่นนั้นเรียก loader() แล้วเก็บไว้"""
+        if not self.enabled:
+            return loader()
+
+        now = time_module.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and now - entry.checked_at < self.check_seconds:
+            return entry.value
+
+        version = self._remote_version(version_keys)
+        if entry is not None:
+            fresh = (
+                entry.version == version if version is not None
+                else now - entry.loaded_at < self.fallback_ttl
+            )
+            if fresh:
+                entry.checked_at = now
+                return entry.value
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = _Entry(value, version, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    # --- invalidation ---
+
+    def invalidate(self, version_key: str, matches: Callable[[Hashable], bool]):
+        """เรียกหลัง commit — ทิ้ง entry ที่ matches(key) ใน worker นี้ และ INCR version_key ให้ worker อื่น"""
+        with self._lock:
+            for key in [key for key in self._entries if matches(key)]:
+                del self._entries[key]
+        client = self.redis
+        if client is None:
+            return
+        try:
+            client.incr(version_key)
+        except RedisError as exc:
+            self._backoff(exc)
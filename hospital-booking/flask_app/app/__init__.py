@@ -14,7 +14,7 @@ from datetime import datetime, timedelta
 from celery.schedules import crontab
 
 from .utils.url_helper import build_url_with_context
-from shared_db.database import engine, PublicBase, TenantBase, get_db_session
+from shared_db.database import engine, PublicBase, TenantBase, get_db_session, use_tenant_schema
 # Import models (จะใช้ PublicBase แทน Base)
 from shared_db import models 
 
@@ -153,8 +153,8 @@ def create_app() -> Flask:
         from flask import render_template
         from shared_db.models import Hospital, HospitalStatus
 
-        # ไม่ตรวจสอบ subdomain สำหรับ static files หรือ favicon
-        if request.path.startswith('/static') or request.path == '/favicon.ico':
+        # ไม่ตรวจสอบ subdomain สำหรับ static files, favicon หรือ metrics
+        if request.path.startswith('/static') or request.path in ('/favicon.ico', '/metrics'):
             return
 
         db = get_db_session()
@@ -198,11 +198,8 @@ def create_app() -> Flask:
         g.subdomain = subdomain
         g.hospital = hospital
 
-        if hospital_schema:
-            # FIX: ใช้ text() กับคำสั่ง SET search_path ด้วยเพื่อความปลอดภัย
-            db.execute(text(f'SET search_path TO "{hospital_schema}", public'))
-        else:
-            db.execute(text('SET search_path TO public'))
+        # ผูก g.db กับ tenant ผ่าน schema_translate_map — connection ไม่ถือ state ของ tenant
+        use_tenant_schema(db, hospital_schema)
 
         g.db = db
 
@@ -213,8 +210,6 @@ def create_app() -> Flask:
             try:
                 if exception:
                     db.rollback()  # Rollback ถ้ามี error
-                # Reset search path ก่อนคืน connection กลับไปที่ pool
-                db.execute(text('SET search_path TO public'))
             except Exception as e:
                 # ใช้ app.logger จะดีกว่า print()
                 app.logger.error(f"Error during session teardown: {e}")
@@ -249,6 +244,17 @@ def create_app() -> Flask:
         return build_url_with_context(endpoint, **kwargs)
 
 
+    # --- Metrics ---
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text format — latency ของ call ไป FastAPI (services/internal_api.py)"""
+        from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+        registry = REGISTRY
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
     # --- Context Processors ---
     @app.context_processor
     def inject_template_vars():
@@ -1,6 +1,5 @@
 # flask_app/app/availability_routes.py
 
-import os
 import requests
 from datetime import datetime
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort, g, make_response
@@ -13,37 +12,36 @@ from .forms import (
 from .auth import get_current_user 
 from .core.tenant_manager import TenantManager
 from .utils.url_helper import build_url_with_context
+from .services.internal_api import internal_api, result_or
 
 
 # สร้าง Blueprint สำหรับ availability
 availability_bp = Blueprint('availability', __name__, url_prefix='/settings')
 
 # API helper functions
-def get_fastapi_url():
-    return os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")
+def make_api_request(method, endpoint, data=None, params=None, subdomain=None):
+    """Helper function สำหรับ API calls ไป FastAPI
 
-def make_api_request(method, endpoint, data=None, params=None):
-    """Helper function สำหรับ API calls ไป FastAPI"""
-    tenant_schema, subdomain = TenantManager.get_tenant_context()
+    ส่ง subdomain มาเองเมื่อเรียกนอก request context (เช่นใน internal_api.gather)
+    """
+    if subdomain is None:
+        tenant_schema, subdomain = TenantManager.get_tenant_context()
     if not subdomain:
         return None, "ไม่พบข้อมูล tenant"
     
-    url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}{endpoint}"
-    
+    method = method.upper()
+    if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+        return None, f"Unsupported method: {method}"
+
     try:
-        if method.upper() == 'GET':
-            response = requests.get(url, params=params, timeout=10)
-        elif method.upper() == 'POST':
-            response = requests.post(url, json=data, timeout=10)
-        elif method.upper() == 'PUT':
-            response = requests.put(url, json=data, timeout=10)
-        elif method.upper() == 'PATCH':
-            response = requests.patch(url, json=data, timeout=10)
-        elif method.upper() == 'DELETE':
-            response = requests.delete(url, timeout=10)
-        else:
-            return None, f"Unsupported method: {method}"
-        
+        response = internal_api.request(
+            method,
+            endpoint,
+            subdomain,
+            params=params if method == 'GET' else None,
+            json=data if method in ('POST', 'PUT', 'PATCH') else None
+        )
+
         if response.ok:
             return response.json(), None
         else:
@@ -86,19 +84,6 @@ def availability_settings():
         templates = []
     else:
         templates = templates_data.get('templates', [])
-        
-        # ดึง schedule details สำหรับแต่ละ template
-        for template in templates:
-            detail_data, _ = make_api_request('GET', f'/availability/template/{template["id"]}/details')
-            if detail_data:
-                template['schedule'] = detail_data.get('schedule', {})
-                template['providers_detail'] = detail_data.get('providers', [])
-                template['provider_schedules_detail'] = detail_data.get('provider_schedules', [])
-                template['resource_capacities_detail'] = detail_data.get('resource_capacities', [])
-                template['template_type'] = detail_data.get('template_type', template.get('template_type'))
-                template['max_concurrent_slots'] = detail_data.get('max_concurrent_slots', template.get('max_concurrent_slots'))
-                template['requires_provider_assignment'] = detail_data.get('requires_provider_assignment', template.get('requires_provider_assignment', True))
-                template['timezone'] = detail_data.get('timezone', template.get('timezone'))
     
     # เลือก template
     selected_template_id = request.args.get('selected_template', type=int)
@@ -108,16 +93,44 @@ def availability_settings():
         selected_template = next((t for t in templates if t['id'] == selected_template_id), None)
     elif templates:
         selected_template = templates[0]
+
+    # details ของทุก template, date overrides ของ template ที่เลือก และรายชื่อผู้ให้บริการ
+    # ไม่ขึ้นต่อกัน — เรียกพร้อมกันภายใต้ deadline เดียว ส่วนที่ล้มเหลว/ช้าเกินแสดงเป็นค่าว่าง
+    unavailable = (None, 'หมดเวลารอ API')
+    calls = [
+        (lambda template_id=template['id']: make_api_request(
+            'GET', f'/availability/template/{template_id}/details', subdomain=subdomain
+        ))
+        for template in templates
+    ]
+    calls.append(lambda: make_api_request('GET', '/providers', subdomain=subdomain))
+    if selected_template:
+        calls.append(lambda: make_api_request(
+            'GET', '/date-overrides', params={'template_id': selected_template['id']}, subdomain=subdomain
+        ))
+    results = [result_or(result, unavailable) for result in internal_api.gather(*calls, return_exceptions=True)]
+    details_results = results[:len(templates)]
+    providers_data, providers_error = results[len(templates)]
+    overrides_data = results[len(templates) + 1][0] if selected_template else None
+
+    # schedule details สำหรับแต่ละ template
+    for template, (detail_data, _) in zip(templates, details_results):
+        if detail_data:
+            template['schedule'] = detail_data.get('schedule', {})
+            template['providers_detail'] = detail_data.get('providers', [])
+            template['provider_schedules_detail'] = detail_data.get('provider_schedules', [])
+            template['resource_capacities_detail'] = detail_data.get('resource_capacities', [])
+            template['template_type'] = detail_data.get('template_type', template.get('template_type'))
+            template['max_concurrent_slots'] = detail_data.get('max_concurrent_slots', template.get('max_concurrent_slots'))
+            template['requires_provider_assignment'] = detail_data.get('requires_provider_assignment', template.get('requires_provider_assignment', True))
+            template['timezone'] = detail_data.get('timezone', template.get('timezone'))
     
-    # ดึง date overrides
+    # date overrides
     template_overrides = []
-    if selected_template:
-        overrides_data, _ = make_api_request('GET', '/date-overrides', params={'template_id': selected_template['id']})
-        if overrides_data:
-            template_overrides = overrides_data.get('date_overrides', [])
+    if overrides_data:
+        template_overrides = overrides_data.get('date_overrides', [])
 
-    # ดึงรายการผู้ให้บริการทั้งหมดสำหรับการจัดการ assignment
-    providers_data, providers_error = make_api_request('GET', '/providers')
+    # รายการผู้ให้บริการทั้งหมดสำหรับการจัดการ assignment
     provider_options = []
     if providers_error:
         flash(f'เกิดข้อผิดพลาดในการโหลดรายชื่อผู้ให้บริการ: {providers_error}', 'warning')
@@ -214,8 +227,15 @@ def edit_template(template_id):
         flash('ไม่สามารถเข้าถึงได้', 'error')
         return redirect(build_url_with_context('main.index'))
 
-    # 1. ดึงข้อมูลต้นฉบับของ Template จาก API
-    template_details, error = make_api_request('GET', f'/availability/template/{template_id}/details')
+    # 1. ดึงข้อมูลต้นฉบับของ Template และ Date Overrides จาก API พร้อมกัน
+    unavailable = (None, 'หมดเวลารอ API')
+    (template_details, error), (overrides_data, _) = [
+        result_or(result, unavailable) for result in internal_api.gather(
+            lambda: make_api_request('GET', f'/availability/template/{template_id}/details', subdomain=subdomain),
+            lambda: make_api_request('GET', '/date-overrides', params={'template_id': template_id}, subdomain=subdomain),
+            return_exceptions=True
+        )
+    ]
     if error or not template_details:
         flash(f'ไม่สามารถโหลดข้อมูลเทมเพลตได้: {error}', 'error')
         return redirect(build_url_with_context('availability.availability_settings'))
@@ -273,8 +293,7 @@ def edit_template(template_id):
         if not day_field.slots.entries:
             day_field.slots.append_entry()
 
-    # 5. ดึงข้อมูล Date Overrides
-    overrides_data, _ = make_api_request('GET', '/date-overrides', params={'template_id': template_id})
+    # 5. Date Overrides (โหลดพร้อม template ในขั้นที่ 1)
     template_overrides = overrides_data.get('date_overrides', []) if overrides_data else []
 
     # 6. Render หน้าเว็บ
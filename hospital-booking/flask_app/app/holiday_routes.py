@@ -1,6 +1,5 @@
 # flask_app/app/holiday_routes.py
 
-import os
 import requests
 from flask import Blueprint, render_template, request, flash, redirect, g, jsonify, url_for
 from datetime import datetime
@@ -8,24 +7,23 @@ from datetime import datetime
 from .auth import login_required
 from .core.tenant_manager import with_tenant
 from .utils.url_helper import build_url_with_context
+from .services.internal_api import internal_api
 
 holiday_bp = Blueprint('holidays', __name__, url_prefix='/settings')
 
 # --- Helper Functions ---
 
-def get_fastapi_url():
-    """Get FastAPI base URL from environment."""
-    return os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")
-
 def make_api_request(method, endpoint, json_data=None, params=None):
     """Helper to make API requests to FastAPI, relying on g.subdomain."""
     subdomain = getattr(g, 'subdomain', None)
     if not subdomain:
         return None, "ไม่พบข้อมูล tenant"
     
-    url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}{endpoint}"
     try:
-        response = requests.request(method, url, json=json_data, params=params, timeout=15)
+        response = internal_api.request(
+            method, endpoint, subdomain, json=json_data, params=params,
+            timeout=(internal_api.timeout[0], 15)
+        )
         
         # สำหรับ DELETE ที่อาจจะไม่มี content ตอบกลับมา
         if response.status_code == 204:
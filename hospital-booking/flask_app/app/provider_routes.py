@@ -1,6 +1,5 @@
 # flask_app/app/provider_routes.py
 
-import os
 import requests
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort, g, make_response
 from .auth import login_required, check_tenant_access
@@ -9,35 +8,30 @@ from .forms import ProviderForm
 from .auth import get_current_user
 from .core.tenant_manager import TenantManager
 from .utils.url_helper import build_url_with_context
+from .services.internal_api import internal_api
 
 # สร้าง Blueprint สำหรับ provider management
 provider_bp = Blueprint('providers', __name__, url_prefix='/settings')
 
 # API helper functions
-def get_fastapi_url():
-    return os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")
-
 def make_api_request(method, endpoint, data=None, params=None):
     """Helper function สำหรับ API calls ไป FastAPI"""
     tenant_schema, subdomain = TenantManager.get_tenant_context()
     if not subdomain:
         return None, "ไม่พบข้อมูล tenant"
 
-    url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}{endpoint}"
+    method = method.upper()
+    if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+        return None, f"Unsupported method: {method}"
 
     try:
-        if method.upper() == 'GET':
-            response = requests.get(url, params=params, timeout=10)
-        elif method.upper() == 'POST':
-            response = requests.post(url, json=data, timeout=10)
-        elif method.upper() == 'PUT':
-            response = requests.put(url, json=data, timeout=10)
-        elif method.upper() == 'PATCH':
-            response = requests.patch(url, json=data, timeout=10)
-        elif method.upper() == 'DELETE':
-            response = requests.delete(url, timeout=10)
-        else:
-            return None, f"Unsupported method: {method}"
+        response = internal_api.request(
+            method,
+            endpoint,
+            subdomain,
+            params=params if method == 'GET' else None,
+            json=data if method in ('POST', 'PUT', 'PATCH') else None
+        )
 
         if response.ok:
             return response.json(), None
@@ -10,13 +10,14 @@ import calendar
 import json
 from redis import Redis
 from rq import Queue
-from typing import Optional, Dict, Set
+from typing import Optional, Dict
 
 from .utils.url_helper import build_url_with_context
 from .core.tenant_manager import TenantManager
 from .services.otp_service import otp_service
 from .services.email_service import queue_otp_email
 from .services.sms_service import queue_otp_sms
+from .services.internal_api import internal_api
 
 
 # สร้าง Blueprint
@@ -52,73 +53,30 @@ def get_subdomain():
     return subdomain
 
 
-def fetch_unavailable_override_dates(subdomain: str, template_id: Optional[int]) -> Dict[str, str]:
-    if not subdomain:
-        return {}
-
-    try:
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/date-overrides"
-        )
-    except Exception:
-        return {}
+def fetch_service_page(subdomain: str, event_type_id: int, year: Optional[int] = None, month: Optional[int] = None):
+    """ข้อมูลหน้าเลือกวันของบริการ (event type, ตารางเวลา, วันปิด/วันหยุด, สรุปความว่างรายวัน) ใน request เดียว
 
+    คืน (data, status_code) — data เป็น None เมื่อโหลดไม่ได้
+    """
+    params = {key: value for key, value in (('year', year), ('month', month)) if value}
+    response = internal_api.get(f"/public/services/{event_type_id}", subdomain, params=params, timeout=10)
     if not response.ok:
-        return {}
-
-    overrides = response.json().get('date_overrides', [])
-    blocked: Dict[str, str] = {}
-
-    for override in overrides:
-        override_template_id = override.get('template_id')
-        scope = override.get('template_scope')
-        if not override.get('is_unavailable'):
-            continue
-
-        is_global = scope == 'global'
-        is_matching_template = template_id is not None and override_template_id == template_id
-
-        if not (is_global or is_matching_template):
-            continue
-
-        override_date = override.get('date')
-        if not override_date:
-            continue
-
-        label = override.get('reason') or 'วันหยุดพิเศษ'
-        blocked[override_date] = label
-
-    return blocked
-
-
-def fetch_holiday_dates(subdomain: str, years: Set[int]) -> Dict[str, str]:
-    if not subdomain or not years:
-        return {}
-
-    holidays_map: Dict[str, str] = {}
-    base_url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/holidays"
-
-    for target_year in sorted(years):
-        try:
-            response = requests.get(base_url, params={'year': target_year, 'is_active': True})
-        except Exception:
-            continue
-
-        if not response.ok:
-            continue
-
-        try:
-            holidays = response.json()
-        except ValueError:
-            holidays = []
-
-        for holiday in holidays or []:
-            holiday_date = holiday.get('date') if isinstance(holiday, dict) else None
-            if not holiday_date:
-                continue
-            holidays_map[holiday_date] = holiday.get('name', 'วันหยุด') if isinstance(holiday, dict) else 'วันหยุด'
-
-    return holidays_map
+        return None, response.status_code
+    return response.json(), response.status_code
+
+
+def render_service_calendar(service: dict, today: date) -> Dict[str, object]:
+    """calendar_data ของเดือนใน service จากผลของ /public/services/{id}"""
+    return generate_calendar_for_booking(
+        service['year'],
+        service['month'],
+        service.get('schedule') or {},
+        unavailable_dates=service.get('unavailable_dates'),
+        holiday_dates=service.get('holiday_dates'),
+        max_advance_days=service['event_type'].get('max_advance_days'),
+        today=today,
+        day_availability={day['date']: day for day in service.get('days', []) if day.get('date')}
+    )
 
 # --- Public Booking Pages (No Login Required) ---
 
@@ -153,12 +111,11 @@ def booking_home():
     # Get event types from API
     try:
         fastapi_url = get_fastapi_url()
-        api_url = f"{fastapi_url}/api/v1/tenants/{subdomain}/event-types"
         
         # 🔍 Debug logging
-        print(f"🔍 DEBUG [booking_home] - Calling API: {api_url}")
+        print(f"🔍 DEBUG [booking_home] - Calling API: {internal_api.url('/event-types', subdomain)}")
         
-        response = requests.get(api_url)
+        response = internal_api.get("/event-types", subdomain)
         
         if response.ok:
             data = response.json()
@@ -196,57 +153,22 @@ def book_service(event_type_id):
     subdomain = get_subdomain()
     
     try:
-        # 1. Get event type details พร้อม availability
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/event-types"
-        )
-        if not response.ok:
-            flash('ไม่สามารถโหลดข้อมูลได้', 'error')
-            return redirect(build_url_with_context('booking.booking_home'))
-            
-        data = response.json()
-        event_types = data.get('event_types', [])
-        event_type = next((et for et in event_types if et['id'] == event_type_id), None)
-        
-        if not event_type:
-            flash('ไม่พบประเภทการนัดที่เลือก', 'error')
+        # event type, ตารางเวลา, วันปิด/วันหยุด และจำนวน slot ว่างของเดือนนี้ใน request เดียว
+        service, status_code = fetch_service_page(subdomain, event_type_id)
+        if service is None:
+            if status_code == 404:
+                flash('ไม่พบประเภทการนัดที่เลือก', 'error')
+            else:
+                flash('ไม่สามารถโหลดข้อมูลได้', 'error')
             return redirect(build_url_with_context('booking.booking_home'))
-        
-        # 2. Get availability schedule from template
-        availability_schedule = {}
-        if event_type.get('template_id'):
-            avail_response = requests.get(
-                f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/availability/template/{event_type['template_id']}/details"
-            )
-            if avail_response.ok:
-                avail_data = avail_response.json()
-                availability_schedule = avail_data.get('schedule', {})
-        
-        template_id = event_type.get('template_id')
+
+        event_type = service['event_type']
+        availability_schedule = service.get('schedule') or {}
+        max_advance_days = event_type.get('max_advance_days')
         now = datetime.now()
         today_date = now.date()
-        unavailable_overrides = fetch_unavailable_override_dates(subdomain, template_id)
 
-        max_advance_days = event_type.get('max_advance_days')
-        max_date = None
-        holiday_years: Set[int] = {today_date.year}
-        if isinstance(max_advance_days, int):
-            max_date = today_date + timedelta(days=max_advance_days)
-            holiday_years.add(max_date.year)
-        else:
-            holiday_years.add(today_date.year + 1)
-
-        holiday_dates = fetch_holiday_dates(subdomain, holiday_years)
-
-        calendar_data = generate_calendar_for_booking(
-            now.year,
-            now.month,
-            availability_schedule,
-            unavailable_dates=unavailable_overrides,
-            holiday_dates=holiday_dates,
-            max_advance_days=max_advance_days,
-            today=today_date
-        )
+        calendar_data = render_service_calendar(service, today_date)
         
         return render_template('booking/select_time.html',
                              event_type=event_type,
@@ -271,8 +193,8 @@ def get_availability(event_type_id, date):
     subdomain = get_subdomain()
     
     try:
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/availability/{event_type_id}",
+        response = internal_api.get(
+            f"/booking/availability/{event_type_id}", subdomain,
             params={'date': date}
         )
         
@@ -308,14 +230,13 @@ def confirm_booking():
     provider_error_message = None
     provider_auto_label = 'ไม่ต้องการเลือก (ให้ระบบเลือกให้)'
 
-    fastapi_base = get_fastapi_url()
-    availability_url = f"{fastapi_base}/api/v1/tenants/{subdomain}/booking/availability/{event_type_id}"
-
     try:
-        availability_response = requests.get(availability_url, params={'date': date}, timeout=10)
+        # slot ของวันพร้อมรายชื่อผู้ให้บริการที่ว่างในแต่ละ slot (request เดียว)
+        availability_response = internal_api.get(
+            f"/public/slots/{event_type_id}", subdomain, params={'date': date}, timeout=10
+        )
         if availability_response.ok:
             availability_data = availability_response.json()
-            template_id = availability_data.get('template_id')
             provider_selection_required = bool(availability_data.get('requires_provider_assignment'))
 
             if provider_selection_required:
@@ -326,51 +247,19 @@ def confirm_booking():
                     flash('ช่วงเวลาที่เลือกไม่พร้อมใช้งานแล้ว กรุณาเลือกใหม่อีกครั้ง', 'error')
                     return redirect(build_url_with_context('booking.book_service', event_type_id=event_type_id))
 
-                available_provider_ids = slot_info.get('available_provider_ids') or []
-
-                if template_id and available_provider_ids:
-                    providers_url = f"{fastapi_base}/api/v1/tenants/{subdomain}/availability/templates/{template_id}/providers"
-                    providers_response = requests.get(providers_url, timeout=10)
-
-                    if providers_response.ok:
-                        providers_data = providers_response.json().get('providers', [])
-
-                        print(f"\n{'='*80}")
-                        print(f"🔍 Flask confirm route DEBUG")
-                        print(f"{'='*80}")
-                        print(f"Available provider IDs from slot: {available_provider_ids}")
-                        print(f"Template providers from API ({len(providers_data)} total):")
-                        for p in providers_data:
-                            print(f"  - Provider ID {p.get('provider_id')}: {p.get('name')} (is_active: {p.get('is_active')})")
-                        print(f"{'='*80}\n")
-
-                        for assignment in providers_data:
-                            provider_id = assignment.get('provider_id')
-                            if provider_id not in available_provider_ids:
-                                print(f"  ❌ Skipping provider {provider_id}: not in available_provider_ids")
-                                continue
-                            if assignment.get('is_active') is False:
-                                print(f"  ❌ Skipping provider {provider_id}: is_active = False")
-                                continue
-
-                            print(f"  ✅ Adding provider {provider_id} to choices")
-                            provider_choices.append({
-                                'id': provider_id,
-                                'name': assignment.get('name'),
-                                'title': assignment.get('title'),
-                                'is_primary': assignment.get('is_primary'),
-                                'priority': assignment.get('priority'),
-                                'can_auto_assign': assignment.get('can_auto_assign')
-                            })
-
-                        provider_choices.sort(key=lambda item: (
-                            0 if item.get('is_primary') else 1,
-                            item.get('priority') if item.get('priority') is not None else 999,
-                            (item.get('name') or '').lower()
-                        ))
-                    else:
-                        provider_error_message = 'ไม่สามารถโหลดรายชื่อผู้ให้บริการได้'
-                else:
+                # เรียงตาม primary, priority, ชื่อ มาจาก API แล้ว
+                provider_choices = [
+                    {
+                        'id': provider.get('id'),
+                        'name': provider.get('name'),
+                        'title': provider.get('title'),
+                        'is_primary': provider.get('is_primary'),
+                        'priority': provider.get('priority'),
+                        'can_auto_assign': provider.get('can_auto_assign')
+                    }
+                    for provider in slot_info.get('providers') or []
+                ]
+                if not provider_choices:
                     provider_error_message = 'ไม่มีผู้ให้บริการว่างในช่วงเวลาที่เลือก'
         else:
             provider_error_message = 'ไม่สามารถตรวจสอบความพร้อมของช่วงเวลาที่เลือกได้'
@@ -504,8 +393,8 @@ def create_booking():
     
     # Send to API
     try:
-        response = requests.post(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/create",
+        response = internal_api.post(
+            "/booking/create", subdomain,
             json=booking_data
         )
         
@@ -534,8 +423,8 @@ def success(reference):
     
     # Get booking details
     try:
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/{reference}"
+        response = internal_api.get(
+            f"/booking/{reference}", subdomain
         )
         
         if response.ok:
@@ -572,8 +461,8 @@ def manage_booking(reference):
     reference = reference.upper().strip()
     
     try:
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/{reference}"
+        response = internal_api.get(
+            f"/booking/{reference}", subdomain
         )
         
         if response.ok:
@@ -626,8 +515,8 @@ def reschedule_booking(reference):
         }
         
         try:
-            response = requests.post(
-                f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/reschedule",
+            response = internal_api.post(
+                "/booking/reschedule", subdomain,
                 json=reschedule_data
             )
             
@@ -645,16 +534,18 @@ def reschedule_booking(reference):
     
     # GET - Show reschedule form
     try:
-        # 1. ดึงข้อมูลการจอง
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/{reference}"
+        # ข้อมูลการจองพร้อมปฏิทินของบริการเดิมใน request เดียว
+        response = internal_api.get(
+            f"/public/bookings/{reference}/reschedule", subdomain, timeout=10
         )
         
         if not response.ok:
             flash('ไม่พบข้อมูลการจอง', 'error')
             return redirect(build_url_with_context('booking.booking_home'))
             
-        booking = response.json()
+        data = response.json()
+        booking = data['booking']
+        service = data.get('service')
 
         # จัดรูปแบบวันที่และเวลาให้อ่านง่าย
         dt = datetime.fromisoformat(booking['appointment_datetime'])
@@ -670,75 +561,19 @@ def reschedule_booking(reference):
             flash('ไม่สามารถเลื่อนนัดได้ (ใกล้เวลานัดเกินไป)', 'error')
             return redirect(build_url_with_context('booking.manage_booking', reference=reference))
         
-        # 2. ดึงข้อมูล event type และ availability
-        event_type_id = booking.get('event_type', {}).get('id')
-        event_type_data = None
-        availability_schedule = {}
-        template_id = None
-        
-        if event_type_id:
-            try:
-                # ดึง event type details พร้อม availability schedule
-                evt_response = requests.get(
-                    f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/event-types/{event_type_id}",
-                    timeout=10
-                )
-                if evt_response.ok:
-                    event_type_data = evt_response.json()
-                    booking['event_type_full'] = event_type_data
-                    template_id = event_type_data.get('template_id')
-                    
-                    # ดึง availability schedule จาก template
-                    if template_id:
-                        avail_response = requests.get(
-                            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/availability/template/{template_id}/details",
-                            timeout=10
-                        )
-                        if avail_response.ok:
-                            availability_data = avail_response.json()
-                            availability_schedule = availability_data.get('schedule', {})
-                            booking['availability_schedule'] = availability_schedule
-                        else:
-                            print(f"⚠️ Warning: Failed to fetch availability template {template_id}")
-                    else:
-                        print(f"⚠️ Warning: Event type {event_type_id} has no template_id")
-                else:
-                    print(f"⚠️ Warning: Failed to fetch event type {event_type_id}: {evt_response.status_code}")
-            except Exception as e:
-                print(f"❌ Error fetching event type data: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            print("❌ No event_type_id found in booking data")
+        availability_schedule = service.get('schedule') if service else {}
         
         # ตรวจสอบว่ามีข้อมูลครบหรือไม่
         if not availability_schedule:
             flash('ไม่สามารถโหลดข้อมูลตารางเวลาได้ กรุณาติดต่อผู้ดูแลระบบ', 'error')
             return redirect(build_url_with_context('booking.manage_booking', reference=reference))
-        
-        now = datetime.now()
-        today_date = now.date()
-        unavailable_overrides = fetch_unavailable_override_dates(subdomain, template_id)
 
-        max_advance_days = event_type_data.get('max_advance_days') if event_type_data else None
-        holiday_years: Set[int] = {today_date.year}
-        if isinstance(max_advance_days, int):
-            max_date = today_date + timedelta(days=max_advance_days)
-            holiday_years.add(max_date.year)
-        else:
-            holiday_years.add(today_date.year + 1)
-
-        holiday_dates = fetch_holiday_dates(subdomain, holiday_years)
-
-        calendar_data = generate_calendar_for_booking(
-            now.year,
-            now.month,
-            availability_schedule,
-            unavailable_dates=unavailable_overrides,
-            holiday_dates=holiday_dates,
-            max_advance_days=max_advance_days,
-            today=today_date
-        )
+        booking['event_type_full'] = service['event_type']
+        booking['availability_schedule'] = availability_schedule
+        max_advance_days = service['event_type'].get('max_advance_days')
+        
+        today_date = datetime.now().date()
+        calendar_data = render_service_calendar(service, today_date)
         
         return render_template('booking/reschedule.html',
                              booking=booking,
@@ -764,8 +599,8 @@ def cancel_booking(reference):
     }
     
     try:
-        response = requests.post(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/cancel",
+        response = internal_api.post(
+            "/booking/cancel", subdomain,
             json=cancel_data
         )
         
@@ -911,7 +746,7 @@ def verify_otp():
     
     # Fetch appointments
     try:
-        api_url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/search"
+        api_url = internal_api.url("/booking/search", subdomain)
         payload = {
             'search_type': search_info['type'],
             'search_value': search_info['value']
@@ -920,7 +755,7 @@ def verify_otp():
         print(f"🔍 DEBUG [verify_otp] - Calling API: {api_url}")
         print(f"🔍 DEBUG [verify_otp] - Payload: {payload}")
         
-        response = requests.post(api_url, json=payload)
+        response = internal_api.post("/booking/search", subdomain, json=payload)
         
         if response.ok:
             raw_appointments = response.json()
@@ -1038,13 +873,15 @@ def generate_calendar_for_booking(
     unavailable_dates: Optional[Dict[str, str]] = None,
     holiday_dates: Optional[Dict[str, str]] = None,
     max_advance_days: Optional[int] = None,
-    today: Optional[date] = None
+    today: Optional[date] = None,
+    day_availability: Optional[Dict[str, dict]] = None
 ) -> Dict[str, object]:
     import calendar
 
     today = today or date.today()
     unavailable_dates = unavailable_dates or {}
     holiday_dates = holiday_dates or {}
+    day_availability = day_availability or {}
 
     first_weekday, days_in_month = calendar.monthrange(year, month)
     first_weekday = (first_weekday + 1) % 7
@@ -1108,6 +945,12 @@ def generate_calendar_for_booking(
             disabled_reason = 'holiday'
             disabled_label = holiday_dates.get(iso_date, 'วันหยุด')
 
+        # สรุปจาก /booking/availability/{id}/range (ถ้ามี) — วันที่ไม่เหลือ slot ว่างให้กดไม่ได้
+        day_summary = day_availability.get(iso_date)
+        if disabled_reason is None and day_summary is not None and not day_summary.get('open_slots'):
+            disabled_reason = 'fully_booked'
+            disabled_label = day_summary.get('message') or 'เต็มแล้ว'
+
         has_schedule = str(our_weekday) in availability_schedule
         is_available = has_schedule and disabled_reason is None and not is_past
         
@@ -1143,7 +986,9 @@ def generate_calendar_for_booking(
             'disabled_label': disabled_label,
             'is_holiday': is_holiday,
             'is_special_closure': is_override_closed,
-            'beyond_max_range': beyond_max_range
+            'beyond_max_range': beyond_max_range,
+            'open_slots': day_summary.get('open_slots') if day_summary else None,
+            'first_available': day_summary.get('first_available') if day_summary else None
         })
 
         if len(current_week) == 7:
@@ -1191,75 +1036,23 @@ def get_calendar(year, month):
     
     subdomain = get_subdomain()
     event_type_id = request.args.get('event_type_id', type=int)
-    
-    availability_schedule = {}
-    unavailable_overrides: Dict[str, str] = {}
-    holiday_dates: Dict[str, str] = {}
-    max_advance_days: Optional[int] = None
-    template_id: Optional[int] = None
     today_date = date.today()
-    holiday_years: Set[int] = {year, today_date.year}
     
     print(f"\nฟ้འ️ [Calendar AJAX] event_type_id={event_type_id}, year={year}, month={month}")
     
     if event_type_id:
         try:
-            # ดึง event type และ availability
-            evt_url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/event-types/{event_type_id}"
-            print(f"  ฟມ̩ Fetching event type: {evt_url}")
-            
-            response = requests.get(evt_url, timeout=10)
-            if response.ok:
-                event_type = response.json()
-                max_advance_days = event_type.get('max_advance_days')
-                template_id = event_type.get('template_id')
-                
-                print(f"  ✅ Event type loaded: template_id={template_id}, max_advance_days={max_advance_days}")
-                
-                if template_id:
-                    avail_url = f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/availability/template/{template_id}/details"
-                    print(f"  ฟມ̩ Fetching availability: {avail_url}")
-                    
-                    avail_response = requests.get(avail_url, timeout=10)
-                    if avail_response.ok:
-                        avail_data = avail_response.json()
-                        availability_schedule = avail_data.get('schedule', {})
-                        print(f"  ✅ Availability loaded: {len(availability_schedule)} days configured")
-                        print(f"     Days: {list(availability_schedule.keys())}")
-                    else:
-                        print(f"  ❌ Failed to fetch availability: {avail_response.status_code}")
-                else:
-                    print(f"  ⚠️ No template_id in event type!")
-
-                unavailable_overrides = fetch_unavailable_override_dates(subdomain, template_id)
-                print(f"  ฟྩ️ Date overrides: {len(unavailable_overrides)} dates blocked")
-
-                if isinstance(max_advance_days, int):
-                    max_date = today_date + timedelta(days=max_advance_days)
-                    holiday_years.add(max_date.year)
-                else:
-                    holiday_years.add(today_date.year + 1)
-
-                holiday_dates = fetch_holiday_dates(subdomain, holiday_years)
-                print(f"  ฟྩ‍♂️ Holidays: {len(holiday_dates)} days")
-            else:
-                print(f"  ❌ Failed to fetch event type: {response.status_code}")
+            # ตารางเวลา, วันปิด/วันหยุด และจำนวน slot ว่างของเดือนที่ขอใน request เดียว
+            service, status_code = fetch_service_page(subdomain, event_type_id, year, month)
+            if service is not None:
+                return jsonify(render_service_calendar(service, today_date))
+            print(f"  ❌ Failed to fetch service calendar: {status_code}")
         except Exception as e:
             print(f"  ❌ Error in calendar AJAX: {e}")
             import traceback
             traceback.print_exc()
 
-    print(f"\nฟྣ Generating calendar with availability_schedule: {availability_schedule}\n")
-    
-    calendar_data = generate_calendar_for_booking(
-        year,
-        month,
-        availability_schedule,
-        unavailable_dates=unavailable_overrides,
-        holiday_dates=holiday_dates,
-        max_advance_days=max_advance_days,
-        today=today_date
-    )
+    calendar_data = generate_calendar_for_booking(year, month, {}, today=today_date)
     return jsonify(calendar_data)
 
 def generate_calendar_with_availability(year, month, availability_schedule):
@@ -4,13 +4,13 @@ import os
 import requests
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, render_template, redirect, url_for, g, request, session, flash, jsonify
-from sqlalchemy import text
-# from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, case, func, or_, text, tuple_
+from sqlalchemy.orm import joinedload
 import logging
 from shared_db.models import (Appointment, User, Hospital, 
                               Provider, EventType, Patient, 
                               ServiceType, AvailabilityTemplate,
-                              TemplateProvider, AuditLog)
+                              TemplateProvider, AuditLog, normalize_phone)
 from .auth import login_required, check_tenant_access
 from .utils.logger import log_route_access
 from .utils.url_helper import get_dashboard_url, build_url_with_context
@@ -18,8 +18,11 @@ from .services.appointment_notifications import (
     notify_patient_appointment_change,
     notify_reschedule_request,
 )
-from shared_db.database import SessionLocal, get_db_session
+from shared_db.availability_cache import availability_cache
+from shared_db.database import SessionLocal, get_db_session, use_tenant_schema
+from shared_db.slot_inventory import release_slot
 from .auth import get_current_user
+from .services.internal_api import internal_api
 from .core.tenant_manager import with_tenant, TenantManager
 from flask import current_app
 
@@ -84,6 +87,106 @@ def privacy():
     """นโยบายความเป็นส่วนตัว (PDPA) — หน้าสาธารณะ ไม่ต้อง login"""
     return render_template('legal/privacy.html')
 
+# --- Dashboard (keyset pagination) ---
+
+# จำนวนนัดต่อหน้าของแต่ละแท็บบน dashboard
+DASHBOARD_PAGE_SIZE = 50
+
+
+def _not_cancelled():
+    return or_(Appointment.status.is_(None), Appointment.status != 'cancelled')
+
+
+def _dashboard_tabs(now):
+    """แท็บของ dashboard: (เงื่อนไข, attribute ที่ใช้เรียง, เรียงจากน้อยไปมากหรือไม่)
+
+    (sort key, id) ตรงกับ index ix_appointments_start_id / ix_appointments_cancelled_order
+    """
+    return {
+        'upcoming': (
+            and_(_not_cancelled(), Appointment.start_time >= now), 'start_time', True
+        ),
+        'past': (
+            and_(_not_cancelled(), Appointment.start_time < now), 'start_time', False
+        ),
+        'canceled': (
+            Appointment.status == 'cancelled', 'cancelled_order', False
+        ),
+    }
+
+
+def _encode_cursor(sort_value, appointment_id):
+    return f"{sort_value.isoformat()}_{appointment_id}"
+
+
+def _decode_cursor(cursor):
+    """(sort value, id) จาก cursor — ค่าที่อ่านไม่ได้ถือเป็นหน้าแรก"""
+    try:
+        sort_value, appointment_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(sort_value), int(appointment_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _dashboard_counts(db, now):
+    """จำนวนนัดต่อแท็บ และต่อ (แท็บ, event type) ใน query เดียว"""
+    bucket = case(
+        (Appointment.status == 'cancelled', 'canceled'),
+        (Appointment.start_time >= now, 'upcoming'),
+        else_='past'
+    )
+    tab_counts = {'upcoming': 0, 'past': 0, 'canceled': 0}
+    group_counts = {}
+    for tab, event_type_id, count in db.query(
+        bucket, Appointment.event_type_id, func.count(Appointment.id)
+    ).group_by(bucket, Appointment.event_type_id):
+        group_counts[(tab, event_type_id)] = count
+        tab_counts[tab] += count
+    return tab_counts, group_counts
+
+
+def _dashboard_page(db, condition, sort_attr, ascending, cursor=None):
+    """นัดหนึ่งหน้าของแท็บ ถัดจาก cursor — คืน (รายการ, cursor ของหน้าถัดไปหรือ None)"""
+    sort_key = getattr(Appointment, sort_attr)
+    query = db.query(Appointment).options(
+        joinedload(Appointment.event_type),
+        joinedload(Appointment.provider),
+        joinedload(Appointment.patient)
+    ).filter(condition)
+    if cursor:
+        key = tuple_(sort_key, Appointment.id)
+        query = query.filter(key > tuple_(*cursor) if ascending else key < tuple_(*cursor))
+    if ascending:
+        query = query.order_by(sort_key.asc(), Appointment.id.asc())
+    else:
+        query = query.order_by(sort_key.desc(), Appointment.id.desc())
+
+    appointments = query.limit(DASHBOARD_PAGE_SIZE + 1).all()
+    if len(appointments) <= DASHBOARD_PAGE_SIZE:
+        return appointments, None
+    appointments = appointments[:DASHBOARD_PAGE_SIZE]
+    last = appointments[-1]
+    return appointments, _encode_cursor(getattr(last, sort_attr), last.id)
+
+
+def _group_by_event_type(appointments, tab, group_counts):
+    """จัดกลุ่มนัดในหน้าตาม event type (ลำดับตามนัดแรกของกลุ่ม) — total คือจำนวนทั้งแท็บจาก GROUP BY"""
+    grouped = []
+    group_index = {}
+    for apt in appointments:
+        group = group_index.get(apt.event_type_id)
+        if not group:
+            group = {
+                'event_type_name': apt.event_type.name if apt.event_type else 'ไม่ระบุประเภท',
+                'total': group_counts.get((tab, apt.event_type_id), 0),
+                'appointments': []
+            }
+            group_index[apt.event_type_id] = group
+            grouped.append(group)
+        group['appointments'].append(apt)
+    return grouped
+
+
 @bp.route('/dashboard')
 @log_route_access
 @login_required
@@ -113,25 +216,16 @@ def dashboard():
         return redirect(url_for('auth.logout'))
     
     db = None
-    appointments = []
     
     try:
         db = get_db_session()
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
-        
-        # Query appointments พร้อม relationships
-        appointments = db.query(Appointment)\
-             .order_by(Appointment.start_time.asc())\
-             .all()
-        # เพิ่มการดึงข้อมูล providers และสร้าง dictionary
-        providers = db.query(Provider).all()
-        providers_dict = {provider.id: provider for provider in providers}
+        use_tenant_schema(db, tenant_schema)
 
         # สถานะการตั้งค่าระบบ สำหรับ onboarding checklist บน dashboard
         setup_status = {
             'has_availability': db.query(AvailabilityTemplate.id).first() is not None,
-            'has_provider': any(p.is_active for p in providers),
+            'has_provider': db.query(Provider.id).filter_by(is_active=True).first() is not None,
             'has_event_type': db.query(EventType.id).filter_by(is_active=True).first() is not None,
         }
         setup_status['is_complete'] = all(setup_status.values())
@@ -141,73 +235,44 @@ def dashboard():
 
         hospital_display_name = current_user.hospital.name
         
-        # คำนวณ statistics และแบ่งหมวดหมู่
         today = datetime.now().date()
         now = datetime.now()
-        
-        # แบ่งนัดหมายตามสถานะ
-        def group_appointments_by_event_type(appointment_list):
-            grouped = []
-            group_index = {}
-
-            for apt in appointment_list:
-                event_type_name = apt.event_type.name if getattr(apt, 'event_type', None) else 'ไม่ระบุประเภท'
-
-                group = group_index.get(event_type_name)
-                if not group:
-                    group = {
-                        'event_type_name': event_type_name,
-                        'appointments': []
-                    }
-                    group_index[event_type_name] = group
-                    grouped.append(group)
-
-                group['appointments'].append(apt)
-
-            return grouped
-
-        upcoming_appointments = []
-        past_appointments = []
-        canceled_appointments = []
-        
-        for apt in appointments:
-            # เพิ่ม provider object เข้าไปใน appointment
-            if apt.provider_id and apt.provider_id in providers_dict:
-                apt.provider = providers_dict[apt.provider_id]
-            else:
-                apt.provider = None
-                
-            if apt.status and apt.status.lower() == 'cancelled':
-                canceled_appointments.append(apt)
-            elif apt.start_time and apt.start_time >= now:
-                upcoming_appointments.append(apt)
-            elif apt.start_time:
-                past_appointments.append(apt)
-        
-        # เรียงลำดับ
-        upcoming_appointments.sort(key=lambda x: x.start_time)
-        past_appointments.sort(key=lambda x: x.start_time, reverse=True)
-        canceled_appointments.sort(key=lambda x: x.cancelled_at if x.cancelled_at else x.start_time, reverse=True)
-        
-        upcoming_groups = group_appointments_by_event_type(upcoming_appointments)
-        past_groups = group_appointments_by_event_type(past_appointments)
-        canceled_groups = group_appointments_by_event_type(canceled_appointments)
-
-        today_count = sum(1 for apt in upcoming_appointments 
-                         if apt.start_time.date() == today)
+        tabs = _dashboard_tabs(now)
+
+        # จำนวนนัดต่อแท็บ / ต่อ event type ด้วย GROUP BY (ไม่โหลดนัดทั้งหมดมานับ)
+        tab_counts, group_counts = _dashboard_counts(db, now)
+        today_count = db.query(func.count(Appointment.id)).filter(
+            tabs['upcoming'][0],
+            Appointment.start_time < datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ).scalar()
+        patient_count = db.query(func.count(func.distinct(Appointment.patient_id))).filter(
+            _not_cancelled()
+        ).scalar()
+
+        # แต่ละแท็บโหลดทีละหน้า (keyset) — ?tab=past&cursor=... คือหน้าถัดไปของแท็บนั้น
+        active_tab = request.args.get('tab') if request.args.get('tab') in tabs else 'upcoming'
+        cursor = _decode_cursor(request.args.get('cursor'))
+        groups, next_cursors = {}, {}
+        for tab, (condition, sort_attr, ascending) in tabs.items():
+            page, next_cursors[tab] = _dashboard_page(
+                db, condition, sort_attr, ascending, cursor if tab == active_tab else None
+            )
+            groups[tab] = _group_by_event_type(page, tab, group_counts)
         
         return render_template('dashboard.html',
                              hospital_name=hospital_display_name,
                              subdomain=subdomain,
                              current_user=current_user,
                              setup_status=setup_status,
-                             appointments=appointments,
-                             upcoming_appointments=upcoming_appointments,
-                             past_appointments=past_appointments,
-                             canceled_appointments=canceled_appointments,
-                             upcoming_groups=upcoming_groups,
-                             past_groups=past_groups,
-                             canceled_groups=canceled_groups,
+                             total_count=sum(tab_counts.values()),
+                             tab_counts=tab_counts,
+                             patient_count=patient_count,
+                             upcoming_groups=groups['upcoming'],
+                             past_groups=groups['past'],
+                             canceled_groups=groups['canceled'],
+                             next_cursors=next_cursors,
+                             active_tab=active_tab,
+                             is_first_page=cursor is None,
                              today_count=today_count,
                              now=now)
                              
@@ -234,7 +299,7 @@ def view_appointment(appointment_id):
         tenant_schema = g.tenant_schema
         subdomain = g.subdomain
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         # Query appointment พร้อม relationships
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
@@ -287,8 +352,7 @@ def admin_reschedule_appointment(appointment_id):
         except Exception:
             pass
 
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
-        db.commit()
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
@@ -338,8 +402,8 @@ def admin_reschedule_appointment(appointment_id):
                 'provider_id': provider_id
             }
 
-            response = requests.post(
-                f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/reschedule",
+            response = internal_api.post(
+                "/booking/reschedule", subdomain,
                 json=reschedule_data
             )
             
@@ -439,8 +503,7 @@ def admin_reschedule_availability(appointment_id):
         except Exception:
             pass
 
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
-        db.commit()
+        use_tenant_schema(db, tenant_schema)
 
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         if not appointment:
@@ -478,12 +541,12 @@ def admin_reschedule_availability(appointment_id):
         params['provider_id'] = provider_id
 
     try:
-        fastapi_url = get_fastapi_url()
-        api_endpoint = f"{fastapi_url}/api/v1/tenants/{subdomain}/booking/availability/{event_type_id}"
+        api_endpoint = f"/booking/availability/{event_type_id}"
         current_app.logger.debug(f"Calling FastAPI endpoint: {api_endpoint} with params: {params}")
         
-        response = requests.get(
+        response = internal_api.get(
             api_endpoint,
+            subdomain,
             params=params,
             timeout=10
         )
@@ -538,7 +601,7 @@ def request_reschedule(appointment_id):
         db = get_db_session()
         tenant_schema = g.tenant_schema
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
@@ -558,9 +621,13 @@ def request_reschedule(appointment_id):
         event_name = req_event.name if req_event else None
         reschedule_link = f"{request.host_url.rstrip('/')}/book/reschedule/{booking_reference}?subdomain={g.subdomain}"
 
-        # Update appointment status
+        # Update appointment status (คืนที่ใน slot_inventory ถ้า tenant เปิดใช้)
+        event_type_id = appointment.event_type_id
+        if appointment.status in ('confirmed', 'pending'):
+            release_slot(db, tenant_schema, event_type_id, start_time)
         appointment.status = 'pending_reschedule'
         db.commit()
+        availability_cache.invalidate_days(g.subdomain, [start_time.date()])
 
         # แจ้งผู้รับบริการ: อีเมลพร้อมลิงก์เลือกเวลาใหม่ / เตือนให้โทร / SMS ถ้าเปิด option
         current_user = get_current_user()
@@ -603,8 +670,7 @@ def admin_cancel_appointment(appointment_id):
         except Exception:
             pass
 
-        # SET โดยไม่ commit — ให้อยู่ใน transaction เดียวกับ query (ดู CLAUDE.md กับดัก search_path)
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
 
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
 
@@ -628,13 +694,17 @@ def admin_cancel_appointment(appointment_id):
             cancelled_event = db.query(EventType).filter_by(id=appointment.event_type_id).first()
             event_name = cancelled_event.name if cancelled_event else None
 
-            # อัพเดต appointment
+            # อัพเดต appointment (คืนที่ใน slot_inventory ถ้า tenant เปิดใช้)
+            event_type_id = appointment.event_type_id
+            if appointment.status in ('confirmed', 'pending'):
+                release_slot(db, tenant_schema, event_type_id, start_time)
             appointment.status = 'cancelled'
             appointment.cancelled_at = datetime.now(timezone.utc)
             appointment.cancelled_by = 'admin'
             appointment.cancellation_reason = f"[Admin] {reason}"
 
             db.commit()
+            availability_cache.invalidate_days(subdomain, [start_time.date()])
 
             # แจ้งผู้รับบริการ: มีอีเมลส่งอีเมล / มีแต่เบอร์เตือนให้โทร / SMS ถ้าเปิด option
             current_user = get_current_user()
@@ -689,19 +759,24 @@ def cancel_appointment(appointment_id):
         db = get_db_session()
         tenant_schema = g.tenant_schema
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
         if not appointment:
             return jsonify({'error': 'ไม่พบนัดหมาย'}), 404
         
-        # อัพเดต status เหมือนกับที่ FastAPI ทำ
+        # อัพเดต status เหมือนกับที่ FastAPI ทำ (คืนที่ใน slot_inventory ถ้า tenant เปิดใช้)
+        event_type_id = appointment.event_type_id
+        start_time = appointment.start_time
+        if appointment.status in ('confirmed', 'pending'):
+            release_slot(db, tenant_schema, event_type_id, start_time)
         appointment.status = 'cancelled'  # ใช้ 'cancelled' ตาม database
         appointment.cancelled_at = datetime.now(timezone.utc)
         appointment.cancelled_by = 'admin'
         
         db.commit()
+        availability_cache.invalidate_days(g.subdomain, [start_time.date()])
         
         current_app.logger.info(f"Appointment {appointment_id} cancelled by admin")
         
@@ -723,7 +798,7 @@ def restore_appointment(appointment_id):
         tenant_schema = g.tenant_schema
         subdomain = g.subdomain
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
@@ -740,8 +815,8 @@ def restore_appointment(appointment_id):
         }
 
         try:
-            response = requests.post(
-                f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/restore",
+            response = internal_api.post(
+                "/booking/restore", subdomain,
                 json=payload,
                 timeout=10
             )
@@ -792,7 +867,7 @@ def delete_appointment(appointment_id):
         tenant_schema = g.tenant_schema
         subdomain = g.subdomain
 
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
@@ -803,8 +878,13 @@ def delete_appointment(appointment_id):
             flash(message, 'error')
             return redirect(build_url_with_context('main.dashboard', subdomain=subdomain))
         
+        event_type_id = appointment.event_type_id
+        start_time = appointment.start_time
+        if appointment.status in ('confirmed', 'pending'):
+            release_slot(db, tenant_schema, event_type_id, start_time)
         db.delete(appointment)
         db.commit()
+        availability_cache.invalidate_days(subdomain, [start_time.date()])
 
         success_message = 'ลบนัดหมายเรียบร้อยแล้ว'
 
@@ -832,8 +912,8 @@ def create_appointment():
         subdomain = g.subdomain
         
         # ดึง event types จาก FastAPI
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/event-types"
+        response = internal_api.get(
+            "/event-types", subdomain
         )
         
         if response.ok:
@@ -849,7 +929,7 @@ def create_appointment():
         # ดึงข้อมูลอื่นๆ จาก database
         db = get_db_session()
         tenant_schema = g.tenant_schema
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         patients = db.query(Patient).all()
         providers = db.query(Provider).filter_by(is_active=True).all()
@@ -891,8 +971,8 @@ def store_appointment():
             booking_data['provider_id'] = int(request.form.get('provider_id'))
         
         # เรียก FastAPI
-        response = requests.post(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/create",
+        response = internal_api.post(
+            "/booking/create", subdomain,
             json=booking_data
         )
         
@@ -921,7 +1001,7 @@ def quick_cancel_appointment(appointment_id):
         db = get_db_session()
         tenant_schema = g.tenant_schema
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(id=appointment_id).first()
         
@@ -931,12 +1011,17 @@ def quick_cancel_appointment(appointment_id):
         # Default reason for quick cancel
         reason = request.json.get('reason', 'ยกเลิกโดยเจ้าหน้าที่')
         
+        event_type_id = appointment.event_type_id
+        start_time = appointment.start_time
+        if appointment.status in ('confirmed', 'pending'):
+            release_slot(db, tenant_schema, event_type_id, start_time)
         appointment.status = 'cancelled'
         appointment.cancelled_at = datetime.datetime.now(datetime.timezone.utc)
         appointment.cancelled_by = 'admin'
         appointment.cancellation_reason = reason
         
         db.commit()
+        availability_cache.invalidate_days(g.subdomain, [start_time.date()])
         
         return jsonify({'success': True, 'message': 'ยกเลิกนัดหมายเรียบร้อยแล้ว'})
         
@@ -953,8 +1038,8 @@ def get_appointment_availability(event_type_id, date):
     try:
         subdomain = g.subdomain
         
-        response = requests.get(
-            f"{get_fastapi_url()}/api/v1/tenants/{subdomain}/booking/availability/{event_type_id}",
+        response = internal_api.get(
+            f"/booking/availability/{event_type_id}", subdomain,
             params={'date': date}
         )
         
@@ -977,13 +1062,17 @@ def quick_add_appointment():
         db = get_db_session()
         tenant_schema = g.tenant_schema
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         # สร้าง patient ใหม่หรือหาที่มีอยู่
         patient_name = request.json.get('name')
         patient_phone = request.json.get('phone')
         
-        patient = db.query(Patient).filter_by(phone_number=patient_phone).first()
+        # เทียบเบอร์เฉพาะตัวเลข (ix_patients_phone_normalized) — "081-234-5678" กับ "0812345678" เป็นคนเดียวกัน
+        phone_key = normalize_phone(patient_phone)
+        patient = db.query(Patient).filter(
+            Patient.phone_normalized == phone_key
+        ).order_by(Patient.id).first() if phone_key else None
         if not patient:
             patient = Patient(
                 name=patient_name,
@@ -1027,8 +1116,8 @@ def check_tenant_database_health(tenant_schema):
         # from . import SessionLocal
         db = get_db_session()
         
-        # ตั้งค่า search_path
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        # ผูก session กับ tenant schema
+        use_tenant_schema(db, tenant_schema)
         
         # ตรวจสอบ tables ที่จำเป็น
         required_tables = ['patients', 'appointments', 'providers', 'event_types', 'service_types']
@@ -1134,7 +1223,7 @@ def public_booking(provider_url, event_slug=None):
     try:
         # ตั้งค่า database session สำหรับ tenant นี้
         db = get_db_session()
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         # ค้นหา provider จาก URL
         provider = db.query(Provider).filter_by(
@@ -1183,7 +1272,7 @@ def booking_success(booking_reference):
     
     try:
         db = get_db_session()
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         appointment = db.query(Appointment).filter_by(
             booking_reference=booking_reference
@@ -1246,7 +1335,7 @@ def reveal_data():
         tenant_schema = g.tenant_schema
         current_user = get_current_user()
         
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
+        use_tenant_schema(db, tenant_schema)
         
         data = request.json
         resource_type = data.get('resource_type')
@@ -1274,11 +1363,6 @@ def reveal_data():
         db.add(audit_log)
         db.commit() # Commit log first
         
-        # Re-set search path after commit to ensure it persists for the next query
-        # (Depending on pool/session configuration, commit might reset connection state)
-        current_app.logger.debug(f"Re-setting search path to {tenant_schema} after commit")
-        db.execute(text(f'SET search_path TO "{tenant_schema}", public'))
-
         # 2. ดึงข้อมูลจริง
         result_value = None
         
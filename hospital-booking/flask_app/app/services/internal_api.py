@@ -0,0 +1,258 @@
+# flask_app/app/services/internal_api.py - Shared client สำหรับเรียก FastAPI (HTTP หรือ in-process)
+
+"""
+client กลางที่ทุก blueprint (และ Celery task) ใช้เรียก FastAPI แทน requests.get/post ตรง ๆ
+
+- requests.Session เดียวต่อ process — connection keep-alive ถูก reuse (pool ต่อ host)
+- timeout เดียวกันทุก call (connect, read) ปรับได้ต่อ call ด้วย timeout=
+- retry จำกัดจำนวนเฉพาะ method ที่ idempotent (GET/HEAD/OPTIONS/PUT/DELETE) เมื่อเชื่อมต่อไม่ได้
+  หรือได้ 502/503/504 — POST/PATCH ไม่ retry (อาจสร้างนัดซ้ำ)
+- gather() รันหลาย call พร้อมกันบน thread pool ที่ใช้ร่วมกัน ภายใต้ deadline รวมของทั้งชุด —
+  return_exceptions=True ให้หน้าเว็บแสดงส่วนที่โหลดได้แม้บาง call ล้มเหลวหรือช้าเกิน
+- latency ต่อ endpoint: Histogram internal_api_request_duration_seconds{method, endpoint, status, transport}
+  (ดูที่ GET /metrics ของ Flask) และ log เตือนเมื่อช้ากว่า INTERNAL_API_SLOW_MS
+- transport: เมื่อ Flask กับ FastAPI deploy ร่วมกัน (import fastapi_app ได้) call ถูกส่งตรงไปที่ handler
+  ผ่าน fastapi_app.app.service_layer โดยไม่ผ่าน HTTP — ผลลัพธ์ยังเป็น object ที่มี status_code / ok / json()
+  / raise_for_status() เหมือน requests.Response เมื่อแยก deploy (หรือ route นั้นเรียกตรงไม่ได้) ใช้ HTTP
+
+ตัวแปร environment:
+    FASTAPI_BASE_URL              default http://127.0.0.1:8000
+    INTERNAL_API_CONNECT_TIMEOUT  วินาที (default 3)
+    INTERNAL_API_TIMEOUT          read timeout วินาที (default 10)
+    INTERNAL_API_RETRIES          จำนวน retry ของ call ที่ idempotent (default 2)
+    INTERNAL_API_POOL_SIZE        connection ต่อ host ใน pool (default 20)
+    INTERNAL_API_CONCURRENCY      thread ของ gather() (default 8)
+    INTERNAL_API_FANOUT_DEADLINE  เวลารวมสูงสุดของ gather() หนึ่งชุด วินาที (default 8)
+    INTERNAL_API_SLOW_MS          log warning เมื่อ call ช้ากว่านี้ (default 1000)
+    INTERNAL_API_TRANSPORT        auto | http | inprocess (default auto — in-process เมื่อ import ได้)
+
+ตัวอย่าง:
+    from .services.internal_api import internal_api
+
+    response = internal_api.get("/event-types", subdomain=subdomain)
+    event_types, providers = internal_api.gather(
+        lambda: internal_api.get("/event-types", subdomain),
+        lambda: internal_api.get("/providers", subdomain),
+        return_exceptions=True,
+    )
+    providers = result_or(providers, None)
+
+error ของการเชื่อมต่อยังเป็น requests.exceptions.RequestException เหมือนเดิม — code เดิมที่ catch ไว้ใช้ต่อได้
+"""
+
+import logging
+import os
+import re
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+import requests
+from prometheus_client import Histogram
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = (502, 503, 504)
+
+INTERNAL_API_LATENCY = Histogram(
+    "internal_api_request_duration_seconds", "Latency of Flask -> FastAPI calls",
+    ["method", "endpoint", "status", "transport"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+_TENANT_PREFIX = re.compile(r'^/api/v1/tenants/[^/]+')
+# segment ที่มีตัวเลข (id, วันที่, booking reference) รวมเป็น label เดียว — จำกัด cardinality
+_PARAM_SEGMENT = re.compile(r'/[^/]*\d[^/]*')
+
+
+def endpoint_label(path: str) -> str:
+    """/api/v1/tenants/humnoi/booking/availability/12 -> /api/v1/tenants/{subdomain}/booking/availability/{id}"""
+    path = _TENANT_PREFIX.sub('/api/v1/tenants/{subdomain}', path.split('?', 1)[0])
+    return _PARAM_SEGMENT.sub('/{id}', path)
+
+
+def result_or(result, default=None):
+    """ผลจาก gather(..., return_exceptions=True) — ใช้ค่า default แทน call ที่ล้มเหลวหรือเกิน deadline"""
+    return default if isinstance(result, BaseException) else result
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+class InternalAPIClient:
+    """HTTP client ไป FastAPI ที่ใช้ร่วมกันทั้ง process (สร้าง session ใหม่เองหลัง fork ของ gunicorn/celery)"""
+
+    def __init__(self, base_url: Optional[str] = None):
+        self._base_url = base_url
+        self.timeout = (
+            _env_float('INTERNAL_API_CONNECT_TIMEOUT', 3),
+            _env_float('INTERNAL_API_TIMEOUT', 10),
+        )
+        self.retries = int(os.environ.get('INTERNAL_API_RETRIES', 2))
+        self.pool_size = int(os.environ.get('INTERNAL_API_POOL_SIZE', 20))
+        self.concurrency = int(os.environ.get('INTERNAL_API_CONCURRENCY', 8))
+        self.slow_seconds = _env_float('INTERNAL_API_SLOW_MS', 1000) / 1000
+        self.fanout_deadline = _env_float('INTERNAL_API_FANOUT_DEADLINE', 8)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+        self.transport = os.environ.get('INTERNAL_API_TRANSPORT', 'auto').lower()
+        self._service_layer = None
+        self._service_layer_checked = False
+
+    @property
+    def base_url(self) -> str:
+        return (self._base_url or os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")).rstrip('/')
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=0.2,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _ensure_process_state(self):
+        # session / thread pool ที่สร้างก่อน fork ใช้ข้าม process ไม่ได้
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._session = self._build_session()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix='internal-api'
+                )
+                self._pid = os.getpid()
+
+    @property
+    def session(self) -> requests.Session:
+        self._ensure_process_state()
+        return self._session
+
+    @property
+    def service_layer(self):
+        """fastapi_app.app.service_layer เมื่อเรียก in-process ได้ ไม่เช่นนั้น None (ใช้ HTTP)"""
+        if self.transport == 'http':
+            return None
+        if not self._service_layer_checked:
+            with self._lock:
+                if not self._service_layer_checked:
+                    try:
+                        from fastapi_app.app import service_layer
+                        self._service_layer = service_layer
+                    except ImportError as exc:
+                        if self.transport == 'inprocess':
+                            raise
+                        logger.warning("In-process FastAPI calls unavailable (%s); using HTTP", exc)
+                    self._service_layer_checked = True
+        return self._service_layer
+
+    def _dispatch_in_process(self, method: str, path: str, subdomain: Optional[str], kwargs: dict):
+        service_layer = self.service_layer
+        if service_layer is None:
+            return None
+        return service_layer.dispatch(
+            method, path, subdomain, params=kwargs.get('params'), json_body=kwargs.get('json')
+        )
+
+    def url(self, path: str, subdomain: Optional[str] = None) -> str:
+        """path ที่ขึ้นต้นด้วย / — ถ้าระบุ subdomain จะอยู่ใต้ /api/v1/tenants/{subdomain}"""
+        if subdomain:
+            path = f"/api/v1/tenants/{subdomain}{path}"
+        return f"{self.base_url}{path}"
+
+    def request(self, method: str, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        method = method.upper()
+        url = self.url(path, subdomain)
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint_label(url[len(self.base_url):])
+        status = 'error'
+        transport = 'http'
+        started = time_module.perf_counter()
+        try:
+            response = self._dispatch_in_process(method, path, subdomain, kwargs)
+            if response is not None:
+                transport = 'inprocess'
+            else:
+                response = self.session.request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            elapsed = time_module.perf_counter() - started
+            INTERNAL_API_LATENCY.labels(method, endpoint, status, transport).observe(elapsed)
+            if elapsed >= self.slow_seconds:
+                logger.warning(
+                    "Slow internal API call %s %s -> %s via %s (%.0f ms)",
+                    method, endpoint, status, transport, elapsed * 1000
+                )
+
+    def get(self, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('GET', path, subdomain, **kwargs)
+
+    def post(self, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('POST', path, subdomain, **kwargs)
+
+    def put(self, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('PUT', path, subdomain, **kwargs)
+
+    def patch(self, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('PATCH', path, subdomain, **kwargs)
+
+    def delete(self, path: str, subdomain: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, subdomain, **kwargs)
+
+    def gather(
+        self,
+        *calls: Callable[[], object],
+        deadline: Optional[float] = None,
+        return_exceptions: bool = False
+    ) -> List[object]:
+        """รัน callable (ไม่มี argument) พร้อมกันแล้วคืนผลตามลำดับ
+
+        ทั้งชุดรอได้ไม่เกิน deadline วินาที (default INTERNAL_API_FANOUT_DEADLINE) — call ที่ยังไม่เสร็จ
+        ได้ TimeoutError (thread ของ call นั้นทำงานต่อจนครบ timeout ของ HTTP แต่ผลถูกทิ้ง)
+        return_exceptions=False: exception แรกตามลำดับ call ถูกโยนต่อ
+        return_exceptions=True: exception เป็นผลของ call นั้น — ใช้ result_or() เลือกค่าแทน
+
+        call ทำงานนอก request context ของ Flask (อ่าน g / request ไม่ได้) จึงต้องส่ง subdomain เข้าไปเอง
+        """
+        if not calls:
+            return []
+        deadline = self.fanout_deadline if deadline is None else deadline
+        self._ensure_process_state()
+        futures = [self._executor.submit(call) for call in calls]
+        done, _ = wait(futures, timeout=deadline)
+
+        results = []
+        for future in futures:
+            if future in done:
+                error = future.exception()
+                if error is None:
+                    results.append(future.result())
+                    continue
+            else:
+                future.cancel()
+                error = TimeoutError(f"internal API fan-out exceeded {deadline:.1f}s deadline")
+                logger.warning("Internal API fan-out call abandoned after %.1fs deadline", deadline)
+            if not return_exceptions:
+                raise error
+            results.append(error)
+        return results
+
+
+internal_api = InternalAPIClient()
@@ -3,18 +3,13 @@
 from . import create_app # Import your app factory
 from celery import shared_task
 import requests
-from sqlalchemy import text
 
 from shared_db.database import SessionLocal
 from shared_db.models import Hospital
 from .services.holiday_service import HolidayFetcher
+from .services.internal_api import internal_api
 from datetime import datetime
 
-# Helper to get FastAPI URL from environment within the task
-def get_fastapi_url_task():
-    import os
-    return os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")
-
 @shared_task(name="tasks.sync_all_tenant_holidays")
 def sync_all_tenant_holidays(year=None):
     """
@@ -28,7 +23,6 @@ def sync_all_tenant_holidays(year=None):
         db = SessionLocal()
         try:
             # Query public schema for all tenants
-            db.execute(text('SET search_path TO public'))
             active_tenants = db.query(Hospital).all()
             
             if not active_tenants:
@@ -52,9 +46,11 @@ def sync_all_tenant_holidays(year=None):
             # Loop through tenants and call their FastAPI endpoint
             for tenant in active_tenants:
                 print(f"Syncing for tenant: {tenant.subdomain}...")
-                url = f"{get_fastapi_url_task()}/api/v1/tenants/{tenant.subdomain}/holidays/sync"
                 try:
-                    response = requests.post(url, json=payload, timeout=20)
+                    response = internal_api.post(
+                        "/holidays/sync", tenant.subdomain, json=payload,
+                        timeout=(internal_api.timeout[0], 20)
+                    )
                     if response.status_code == 200:
                         print(f" -> Success for {tenant.subdomain}: {response.json().get('message')}")
                     else:
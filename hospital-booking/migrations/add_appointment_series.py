@@ -0,0 +1,61 @@
+# migrations/add_appointment_series.py
+"""
+เพิ่มนัดต่อเนื่อง (POST /booking/series) ให้ tenant ที่มีอยู่แล้ว
+
+ต่อ tenant schema:
+  - สร้างตาราง appointment_series (ถ้ายังไม่มี)
+  - เพิ่มคอลัมน์ appointments.series_id (FK -> appointment_series.id) พร้อม index
+
+tenant ใหม่ได้ทั้งสองอย่างจาก TenantBase.metadata.create_all อยู่แล้ว
+ต้องรันก่อน deploy โค้ดที่มี Appointment.series_id — ไม่งั้นทุก query ของ appointments จะ error
+
+วิธีใช้:
+  python add_appointment_series.py              # ทุก tenant ใน public.hospitals
+  python add_appointment_series.py humnoi       # เฉพาะ subdomain ที่ระบุ
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from shared_db.database import engine, tenant_schema_map
+from shared_db import models
+
+
+def upgrade_schema(conn, schema: str):
+    conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    models.AppointmentSeries.__table__.create(
+        bind=conn.execution_options(schema_translate_map=tenant_schema_map(schema)),
+        checkfirst=True
+    )
+    conn.execute(text(f'''
+        ALTER TABLE "{schema}".appointments
+        ADD COLUMN IF NOT EXISTS series_id INTEGER REFERENCES "{schema}".appointment_series(id)
+    '''))
+    conn.execute(text(f'''
+        CREATE INDEX IF NOT EXISTS ix_appointments_series_id ON "{schema}".appointments (series_id)
+    '''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('subdomains', nargs='*', help='subdomain ที่ต้องการ (default: ทุก tenant)')
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        with conn.begin():
+            rows = conn.execute(text("SELECT subdomain, schema_name FROM public.hospitals")).all()
+        schemas = [schema for subdomain, schema in rows if not args.subdomains or subdomain in args.subdomains]
+
+        for schema in schemas:
+            print(f"Applying migration to schema: {schema}...")
+            with conn.begin():
+                upgrade_schema(conn, schema)
+            print("  -> appointment_series + appointments.series_id ensured")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# migrations/add_provider_overlap_constraint.py
+"""
+ให้ฐานข้อมูลกันการจองซ้อนของ provider ข้ามทุกบริการ (exclusion constraint บน appointments)
+
+    EXCLUDE USING gist (provider_id WITH =, tsrange(start_time, end_time) WITH &&)
+    WHERE provider_id IS NOT NULL AND status IN ('confirmed', 'pending')
+
+ขั้นตอน:
+  1. CREATE EXTENSION btree_gist (ครั้งเดียวต่อ database — trusted extension เจ้าของ database สร้างได้)
+  2. ต่อ tenant schema: หานัดที่ซ้อนกันอยู่แล้ว — ถ้ามีจะแสดงรายการและข้าม schema นั้น
+     (ต้องให้เจ้าหน้าที่ย้าย/ยกเลิกนัดก่อน แล้วรันใหม่)
+  3. เพิ่ม constraint (ถ้ายังไม่มี) — สร้าง GiST index ระหว่างนั้น ตาราง appointments ถูกล็อกเขียนชั่วครู่
+
+tenant ใหม่ได้ constraint จาก TenantBase.metadata.create_all อยู่แล้ว
+
+วิธีใช้:
+  python add_provider_overlap_constraint.py              # ทุก tenant ใน public.hospitals
+  python add_provider_overlap_constraint.py humnoi       # เฉพาะ subdomain ที่ระบุ
+  python add_provider_overlap_constraint.py --check      # แสดงนัดที่ซ้อนกันเท่านั้น ไม่แก้ไขอะไร
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+from shared_db.database import engine, tenant_schema_map
+from shared_db import models
+
+
+def overlap_constraint():
+    return next(
+        constraint for constraint in models.Appointment.__table__.constraints
+        if constraint.name == models.APPOINTMENT_PROVIDER_OVERLAP
+    )
+
+
+def find_overlaps(conn, schema: str):
+    return conn.execute(text(f'''
+        SELECT a.provider_id, a.booking_reference, a.start_time, b.booking_reference, b.start_time
+        FROM "{schema}".appointments a
+        JOIN "{schema}".appointments b
+          ON a.provider_id = b.provider_id
+         AND a.id < b.id
+         AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time)
+        WHERE a.status IN ('confirmed', 'pending')
+          AND b.status IN ('confirmed', 'pending')
+        ORDER BY a.start_time
+    ''')).all()
+
+
+def constraint_exists(conn, schema: str) -> bool:
+    return conn.execute(text('''
+        SELECT EXISTS (
+            SELECT 1 FROM pg_constraint c
+            JOIN pg_namespace n ON n.oid = c.connamespace
+            WHERE n.nspname = :schema AND c.conname = :name
+        )
+    '''), {'schema': schema, 'name': models.APPOINTMENT_PROVIDER_OVERLAP}).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('subdomains', nargs='*', help='subdomain ที่ต้องการ (default: ทุก tenant)')
+    parser.add_argument('--check', action='store_true', help='แสดงนัดที่ซ้อนกันเท่านั้น')
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        with conn.begin():
+            if not args.check:
+                conn.execute(models.BTREE_GIST_EXTENSION)
+            rows = conn.execute(text("SELECT subdomain, schema_name FROM public.hospitals")).all()
+        schemas = [schema for subdomain, schema in rows if not args.subdomains or subdomain in args.subdomains]
+
+        skipped = []
+        for schema in schemas:
+            print(f"Applying migration to schema: {schema}...")
+            with conn.begin():
+                overlaps = find_overlaps(conn, schema)
+                if overlaps:
+                    print(f"  -> พบนัดที่ provider ซ้อนกัน {len(overlaps)} คู่:")
+                    for provider_id, ref_a, start_a, ref_b, start_b in overlaps:
+                        print(f"     provider {provider_id}: {ref_a} ({start_a}) ทับ {ref_b} ({start_b})")
+                    skipped.append(schema)
+                    continue
+                if args.check:
+                    print("  -> ไม่มีนัดซ้อนกัน")
+                    continue
+                if constraint_exists(conn, schema):
+                    print("  -> constraint มีอยู่แล้ว")
+                    continue
+
+                conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+                conn.execution_options(schema_translate_map=tenant_schema_map(schema)).execute(
+                    AddConstraint(overlap_constraint())
+                )
+                print(f"  -> {models.APPOINTMENT_PROVIDER_OVERLAP} added")
+
+        if skipped:
+            print(f"\nข้าม {len(skipped)} schema ที่มีนัดซ้อนกัน: {', '.join(skipped)} — แก้นัดแล้วรันใหม่")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# migrations/add_tenant_indexes.py
+"""
+สร้าง composite index ของ predicate ที่ใช้บ่อยในการคำนวณ slot ให้ทุก tenant schema (tenant_*)
+
+    appointments       (event_type_id, status, start_time, end_time)
+    provider_schedules (template_id, is_active, effective_date)
+    provider_leaves    (provider_id, start_date, end_date)
+    date_overrides     (date, template_id)
+    holidays           (date, is_active)
+    appointments       (lower(btrim(guest_email)), start_time), (เบอร์โทรเฉพาะตัวเลข, start_time)
+    patients           lower(btrim(email)), เบอร์โทรเฉพาะตัวเลข
+    appointments       (start_time, id), (status, coalesce(cancelled_at, start_time), id) — dashboard
+
+นิยามของ index อยู่ใน shared_db/models.py (tenant ใหม่ได้จาก create_all อยู่แล้ว) — script นี้อ่านจากที่นั่น
+ใช้ CREATE INDEX CONCURRENTLY จึงไม่ล็อกการจองระหว่างสร้าง (ต้องรันนอก transaction — autocommit)
+index ที่ค้างสถานะ invalid จากการรันครั้งก่อนที่ล้มกลางทางจะถูก DROP แล้วสร้างใหม่
+
+ตรวจว่า query ใน booking.py ใช้ index เหล่านี้จริงด้วย: python -m benchmarks explain
+
+วิธีใช้:
+  python add_tenant_indexes.py                 # ทุก schema ที่ขึ้นต้นด้วย tenant_
+  python add_tenant_indexes.py tenant_humnoi   # เฉพาะ schema ที่ระบุ
+  python add_tenant_indexes.py --dry-run       # แสดง statement ที่จะรัน
+"""
+
+import os
+import sys
+import argparse
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from shared_db.database import engine
+from shared_db import models
+
+TENANT_INDEXES = [
+    (models.Appointment, 'ix_appointments_event_status_time'),
+    (models.ProviderSchedule, 'ix_provider_schedules_template_active_effective'),
+    (models.ProviderLeave, 'ix_provider_leaves_provider_dates'),
+    (models.DateOverride, 'ix_date_overrides_date_template'),
+    (models.Holiday, 'ix_holidays_date_active'),
+    # ค้นหานัด / patient ด้วย email และเบอร์โทรแบบ normalize (functional index)
+    (models.Appointment, 'ix_appointments_guest_email_normalized'),
+    (models.Appointment, 'ix_appointments_guest_phone_normalized'),
+    (models.Patient, 'ix_patients_email_normalized'),
+    (models.Patient, 'ix_patients_phone_normalized'),
+    # หน้า dashboard แบบ keyset
+    (models.Appointment, 'ix_appointments_start_id'),
+    (models.Appointment, 'ix_appointments_cancelled_order'),
+]
+
+
+def model_index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+def create_statement(schema: str, model, name: str) -> str:
+    index = model_index(model, name)
+    # column ธรรมดาและ expression (เช่น lower(btrim(email))) render แบบไม่มีชื่อตาราง ค่าคงที่เป็น literal
+    columns = ", ".join(
+        str(expression.compile(dialect=engine.dialect, compile_kwargs={"include_table": False, "literal_binds": True}))
+        for expression in index.expressions
+    )
+    return f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{schema}"."{model.__tablename__}" ({columns})'
+
+
+def index_state(conn, schema: str, name: str):
+    """None = ยังไม่มี, True = ใช้งานได้, False = invalid (CONCURRENTLY ที่ล้มกลางทาง)"""
+    return conn.execute(text('''
+        SELECT i.indisvalid
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE n.nspname = :schema AND c.relname = :name
+    '''), {'schema': schema, 'name': name}).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('schemas', nargs='*', help='schema ที่ต้องการ (default: tenant_* ทั้งหมด)')
+    parser.add_argument('--dry-run', action='store_true', help='แสดง statement เท่านั้น')
+    args = parser.parse_args()
+
+    # CREATE INDEX CONCURRENTLY ทำใน transaction ไม่ได้
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        schemas = args.schemas or [
+            row[0] for row in conn.execute(text(
+                "SELECT nspname FROM pg_namespace WHERE nspname LIKE 'tenant\\_%' ORDER BY nspname"
+            ))
+        ]
+
+        for schema in schemas:
+            print(f"Applying migration to schema: {schema}...")
+            for model, name in TENANT_INDEXES:
+                table_exists = conn.execute(
+                    text("SELECT to_regclass(:table_name) IS NOT NULL"),
+                    {"table_name": f'"{schema}".{model.__tablename__}'}
+                ).scalar()
+                if not table_exists:
+                    print(f"  -> {model.__tablename__}: ไม่มีตาราง ข้าม")
+                    continue
+
+                state = index_state(conn, schema, name)
+                if state:
+                    print(f"  -> {name}: มีอยู่แล้ว")
+                    continue
+
+                statements = []
+                if state is False:
+                    statements.append(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}"')
+                statements.append(create_statement(schema, model, name))
+
+                for statement in statements:
+                    if args.dry_run:
+                        print(f"  {statement};")
+                        continue
+                    started = time.monotonic()
+                    conn.execute(text(statement))
+                    print(f"  -> {statement.split(' ON ')[0]} ({time.monotonic() - started:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
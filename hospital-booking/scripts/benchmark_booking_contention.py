@@ -0,0 +1,144 @@
+"""
+Benchmark การจองพร้อมกัน (ใช้ตรวจ advisory lock ใน fastapi_app/app/slot_locks.py)
+
+ยิง POST /booking/create จาก N client พร้อมกันไปยัง FastAPI ที่รันอยู่:
+    --mode same    ทุก client แย่ง slot เดียวกัน  -> จำนวนที่จองสำเร็จต้องไม่เกิน total_capacity ของ slot
+    --mode spread  client กระจายไปคนละ slot        -> throughput ควรเพิ่มตามจำนวน client (ไม่ถูก serialize)
+
+ตัวอย่าง:
+    python scripts/benchmark_booking_contention.py --subdomain demo --event-type 1 \\
+        --date 2026-12-01 --clients 1,4,16 --mode spread --cleanup
+
+ใช้วันที่ในอนาคต (เกิน min notice และ 4 ชั่วโมงเพื่อให้ --cleanup ยกเลิกนัดได้)
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def api_base(subdomain):
+    base = os.environ.get("FASTAPI_BASE_URL", "http://127.0.0.1:8000")
+    return f"{base}/api/v1/tenants/{subdomain}"
+
+
+def fetch_slots(session, subdomain, event_type_id, target_date):
+    response = session.get(
+        f"{api_base(subdomain)}/booking/availability/{event_type_id}",
+        params={"date": target_date},
+        timeout=30
+    )
+    response.raise_for_status()
+    return [slot for slot in response.json().get("slots", []) if slot.get("available")]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_round(subdomain, event_type_id, target_date, slots, clients, per_client, mode):
+    results = []
+    results_lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(client_index):
+        session = requests.Session()
+        barrier.wait()
+        for attempt in range(per_client):
+            if mode == "same":
+                slot = slots[0]
+            else:
+                slot = slots[(client_index * per_client + attempt) % len(slots)]
+            payload = {
+                "event_type_id": event_type_id,
+                "date": target_date,
+                "time": slot["time"],
+                "guest_name": f"Benchmark {client_index}-{attempt}",
+                "guest_email": f"bench-{uuid.uuid4().hex[:10]}@example.com",
+            }
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{api_base(subdomain)}/booking/create", json=payload, timeout=60)
+                status = response.status_code
+                reference = response.json().get("booking_reference") if response.ok else None
+            except requests.RequestException:
+                status, reference = "error", None
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                results.append((status, elapsed, slot["time"], reference))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - started
+    return results, wall
+
+
+def report(clients, results, wall, slots, mode):
+    latencies = [elapsed for _, elapsed, _, _ in results]
+    by_status = {}
+    for status, _, _, _ in results:
+        by_status[status] = by_status.get(status, 0) + 1
+
+    print(f"\n--- clients={clients} mode={mode} ---")
+    print(f"requests   : {len(results)} in {wall:.2f}s  ({len(results) / wall:.1f} req/s)")
+    print(f"status     : {by_status}")
+    print(f"latency ms : p50={statistics.median(latencies) * 1000:.0f} "
+          f"p95={percentile(latencies, 95) * 1000:.0f} p99={percentile(latencies, 99) * 1000:.0f}")
+
+    if mode == "same":
+        succeeded = by_status.get(200, 0)
+        capacity = slots[0].get("remaining_slots", 0)
+        verdict = "OK" if succeeded <= capacity else "OVERBOOKED"
+        print(f"slot {slots[0]['time']}: booked {succeeded} / remaining before run {capacity} -> {verdict}")
+
+
+def cleanup(subdomain, results):
+    session = requests.Session()
+    references = [reference for _, _, _, reference in results if reference]
+    for reference in references:
+        session.post(
+            f"{api_base(subdomain)}/booking/cancel",
+            json={"booking_reference": reference, "reason": "benchmark cleanup"},
+            timeout=30
+        )
+    print(f"cancelled {len(references)} benchmark bookings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent booking contention benchmark")
+    parser.add_argument("--subdomain", required=True)
+    parser.add_argument("--event-type", type=int, required=True)
+    parser.add_argument("--date", required=True, help="YYYY-MM-DD (future date)")
+    parser.add_argument("--clients", default="1,4,16", help="comma-separated client counts")
+    parser.add_argument("--per-client", type=int, default=5)
+    parser.add_argument("--mode", choices=["same", "spread"], default="spread")
+    parser.add_argument("--cleanup", action="store_true", help="cancel bookings created by each round")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    for clients in [int(value) for value in args.clients.split(",") if value]:
+        slots = fetch_slots(session, args.subdomain, args.event_type, args.date)
+        if not slots:
+            print("no available slots left on that date")
+            break
+        results, wall = run_round(
+            args.subdomain, args.event_type, args.date, slots, clients, args.per_client, args.mode
+        )
+        report(clients, results, wall, slots, args.mode)
+        if args.cleanup:
+            cleanup(args.subdomain, results)
+
+
+if __name__ == "__main__":
+    main()
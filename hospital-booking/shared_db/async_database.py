@@ -0,0 +1,45 @@
+# hospital-booking/shared_db/async_database.py
+"""
+Async engine/session (asyncpg) สำหรับ FastAPI
+
+แยกจาก database.py เพราะ Flask/worker ไม่ต้องติดตั้ง asyncpg
+URL มาจาก ASYNC_DATABASE_URL หรือแปลงจาก DATABASE_URL (postgresql:// -> postgresql+asyncpg://)
+"""
+import os
+from uuid import uuid4
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+load_dotenv()
+
+
+def _async_url(url: str) -> str:
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_url(os.environ.get("DATABASE_URL", ""))
+
+# หลัง PgBouncer แบบ transaction pooling: prepared statement ของ asyncpg ผูกกับ server connection
+# ซึ่งเปลี่ยนได้ทุก transaction — ปิด statement cache และตั้งชื่อ statement ไม่ให้ซ้ำกัน
+_connect_args = {}
+if os.environ.get("PGBOUNCER_TRANSACTION_POOLING", "false").lower() == "true":
+    _connect_args = {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+    pool_pre_ping=True,
+    connect_args=_connect_args,
+)
+
+# expire_on_commit=False: handler ใช้ค่าใน object ต่อหลัง commit ได้โดยไม่ต้องโหลดใหม่
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
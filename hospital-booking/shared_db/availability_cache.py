@@ -0,0 +1,230 @@
+# shared_db/availability_cache.py - Redis cache for booking availability responses
+
+"""
+Cache ผลลัพธ์ของ get_booking_availability ใน Redis
+
+คีย์ของแต่ละ response ประกอบด้วย (tenant, event_type, date, provider) และ "เวอร์ชัน" สองระดับ:
+    availability:{tenant}:ver                        -> เพิ่มเมื่อข้อมูลระดับ tenant เปลี่ยน
+                                                        (template, schedule, leave, capacity, override, holiday)
+    availability:{tenant}:ver:{date}                 -> เพิ่มเมื่อมีการจอง/ยกเลิก/เลื่อนนัดในวันนั้น
+                                                        ของทุก event type — provider คนเดียวกันอยู่ได้หลาย template
+                                                        นัดของบริการหนึ่งจึงเปลี่ยน slot ที่ว่างของบริการอื่นในวันนั้นด้วย
+การ invalidate จึงเป็นแค่ INCR — คีย์เก่าจะไม่ถูกอ่านอีกและหมดอายุเองตาม TTL
+
+ขอบเขตขนาด: เก็บ index (sorted set) ของคีย์ต่อ tenant และตัดคีย์ที่เก่าที่สุดออกเมื่อเกิน
+AVAILABILITY_CACHE_MAX_ENTRIES
+
+ผลลัพธ์ขึ้นกับเวลาปัจจุบัน (วันที่ผ่านมาแล้ว, min_notice_hours, max_advance_days) จึงใส่วันที่ปัจจุบันไว้ในคีย์
+และใช้ TTL สั้นสำหรับวันที่ที่ยังอยู่ในช่วง min notice
+
+ใช้ร่วมกันทั้ง FastAPI (อ่าน/เขียน cache) และ Flask (invalidate หลังเจ้าหน้าที่ยกเลิก/ขอเลื่อนนัด)
+
+ถ้า Redis ใช้งานไม่ได้ cache จะปิดตัวเองชั่วคราว (AVAILABILITY_CACHE_RETRY_SECONDS) และ endpoint คำนวณตามปกติ
+"""
+
+import json
+import os
+import time as time_module
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from .redis_client import LazyRedis
+
+KEY_PREFIX = "availability"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class AvailabilityCache:
+    def __init__(self):
+        self.enabled = os.environ.get('AVAILABILITY_CACHE_ENABLED', 'true').lower() == 'true'
+        self.ttl = _env_int('AVAILABILITY_CACHE_TTL', 300)
+        self.short_ttl = _env_int('AVAILABILITY_CACHE_SHORT_TTL', 30)
+        self.max_entries = _env_int('AVAILABILITY_CACHE_MAX_ENTRIES', 5000)
+        self.retry_seconds = _env_int('AVAILABILITY_CACHE_RETRY_SECONDS', 30)
+
+        self._redis = LazyRedis("Availability cache", self.retry_seconds)
+
+    # --- connection ---
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        if not self.enabled:
+            return None
+        return self._redis.client
+
+    def _backoff(self, exc: Exception):
+        self._redis.backoff(exc)
+
+    # --- keys ---
+
+    @staticmethod
+    def _tenant_version_key(subdomain: str) -> str:
+        return f"{KEY_PREFIX}:{subdomain}:ver"
+
+    @staticmethod
+    def _day_version_key(subdomain: str, target_date: date) -> str:
+        return f"{KEY_PREFIX}:{subdomain}:ver:{target_date.isoformat()}"
+
+    @staticmethod
+    def _index_key(subdomain: str) -> str:
+        return f"{KEY_PREFIX}:{subdomain}:index"
+
+    def _entry_key(
+        self,
+        client: Redis,
+        subdomain: str,
+        event_type_id: int,
+        target_date: date,
+        provider_id: Optional[int]
+    ) -> str:
+        tenant_version, day_version = client.mget(
+            self._tenant_version_key(subdomain),
+            self._day_version_key(subdomain, target_date)
+        )
+        return ":".join([
+            KEY_PREFIX,
+            subdomain,
+            f"v{int(tenant_version or 0)}.{int(day_version or 0)}",
+            str(event_type_id),
+            target_date.isoformat(),
+            str(provider_id or '-'),
+            date.today().isoformat()
+        ])
+
+    def ttl_for(self, target_date: date, min_notice_hours: int = 0) -> int:
+        """TTL สั้นถ้าเส้นตัด min notice ยังเลื่อนผ่าน slot ของวันนั้นได้"""
+        notice_cutoff = datetime.now() + timedelta(hours=min_notice_hours or 0)
+        if target_date <= notice_cutoff.date():
+            return min(self.short_ttl, self.ttl)
+        return self.ttl
+
+    # --- read / write ---
+
+    def get(
+        self,
+        subdomain: str,
+        event_type_id: int,
+        target_date: date,
+        provider_id: Optional[int] = None
+    ) -> Optional[Dict]:
+        client = self.redis
+        if client is None:
+            return None
+        try:
+            key = self._entry_key(client, subdomain, event_type_id, target_date, provider_id)
+            cached = client.get(key)
+            client.hincrby(STATS_KEY, 'hits' if cached is not None else 'misses', 1)
+        except RedisError as exc:
+            self._backoff(exc)
+            return None
+        return json.loads(cached) if cached is not None else None
+
+    def set(
+        self,
+        subdomain: str,
+        event_type_id: int,
+        target_date: date,
+        provider_id: Optional[int],
+        payload: Dict,
+        ttl: Optional[int] = None
+    ):
+        client = self.redis
+        if client is None:
+            return
+        try:
+            key = self._entry_key(client, subdomain, event_type_id, target_date, provider_id)
+            index_key = self._index_key(subdomain)
+
+            pipe = client.pipeline()
+            pipe.set(key, json.dumps(payload, default=str), ex=ttl or self.ttl)
+            pipe.zadd(index_key, {key: time_module.time()})
+            pipe.zcard(index_key)
+            _, _, size = pipe.execute()
+
+            if size > self.max_entries:
+                evicted = client.zpopmin(index_key, size - self.max_entries)
+                if evicted:
+                    client.delete(*[member for member, _ in evicted])
+                    client.hincrby(STATS_KEY, 'evictions', len(evicted))
+        except RedisError as exc:
+            self._backoff(exc)
+
+    # --- invalidation ---
+
+    def invalidate_days(self, subdomain: str, dates: Iterable[date]):
+        """เรียกหลังการจอง/ยกเลิก/เลื่อน/กู้คืนนัดที่กระทบวันเหล่านั้น (ทุก event type ของ tenant)"""
+        client = self.redis
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            for target_date in {d for d in dates if d}:
+                key = self._day_version_key(subdomain, target_date)
+                pipe.incr(key)
+                # version ของวันที่ผ่านไปแล้วไม่ต้องเก็บไว้นาน
+                pipe.expire(key, max(self.ttl, 86400) * 2)
+            pipe.hincrby(STATS_KEY, 'invalidations', 1)
+            pipe.execute()
+        except RedisError as exc:
+            self._backoff(exc)
+
+    def invalidate_tenant(self, subdomain: str):
+        """เรียกหลังแก้ข้อมูลที่กระทบทุก event type ของ tenant (template, schedule, leave, capacity, override, holiday)"""
+        client = self.redis
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.incr(self._tenant_version_key(subdomain))
+            pipe.delete(self._index_key(subdomain))
+            pipe.hincrby(STATS_KEY, 'invalidations', 1)
+            pipe.execute()
+        except RedisError as exc:
+            self._backoff(exc)
+
+    # --- stats ---
+
+    def stats(self) -> Dict:
+        result = {
+            "enabled": self.enabled,
+            "available": False,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "hit_ratio": None,
+            "ttl": self.ttl,
+            "short_ttl": self.short_ttl,
+            "max_entries_per_tenant": self.max_entries
+        }
+        client = self.redis
+        if client is None:
+            return result
+        try:
+            raw = client.hgetall(STATS_KEY)
+        except RedisError as exc:
+            self._backoff(exc)
+            return result
+
+        result["available"] = True
+        for field, value in raw.items():
+            name = field.decode() if isinstance(field, bytes) else field
+            if name in result:
+                result[name] = int(value)
+        lookups = result["hits"] + result["misses"]
+        if lookups:
+            result["hit_ratio"] = round(result["hits"] / lookups, 4)
+        return result
+
+
+availability_cache = AvailabilityCache()
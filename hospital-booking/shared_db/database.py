@@ -1,7 +1,8 @@
 # hospital-booking/shared_db/database.py
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from flask import g
 from dotenv import load_dotenv
 
@@ -18,6 +19,60 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 PublicBase = declarative_base()
 TenantBase = declarative_base()
 
+# --- Tenant Routing ---
+# ตารางของ TenantBase ไม่ระบุ schema — ผูก session กับ tenant ด้วย schema_translate_map
+# ({None: "tenant_xxx"}) ให้ทุก statement (ORM/Core/DDL) เขียนชื่อ schema ลงไปเอง
+# connection จึงไม่มี state ของ tenant (ไม่ต้อง SET search_path) — commit, คืน pool
+# หรือผ่าน PgBouncer แบบ transaction pooling ก็ไม่ทำให้ query วิ่งผิด schema
+# ข้อจำกัด: raw SQL ผ่าน text() ไม่ถูกแปล ต้องเขียน "schema".table เอง
+TENANT_SCHEMA_KEY = 'tenant_schema'
+
+
+def tenant_schema_map(schema_name: Optional[str]) -> Optional[dict]:
+    return {None: schema_name} if schema_name else None
+
+
+def use_tenant_schema(db: Session, schema_name: Optional[str]):
+    """ชี้ TenantBase models ของ session ไปที่ schema_name (None = ไม่มี tenant)
+
+    มีผลทันทีกับ transaction ปัจจุบันและทุก transaction ถัดไปของ session นี้
+    ถ้าสลับไป tenant อื่น object ของ tenant เดิมจะถูก flush แล้วถอดออกจาก session
+    (identity map ไม่รู้จัก schema — id เดียวกันของสอง tenant จะชนกัน)
+    """
+    previous = db.info.get(TENANT_SCHEMA_KEY)
+    if previous and previous != schema_name:
+        if db.new or db.dirty or db.deleted:
+            db.flush()
+        for obj in list(db.identity_map.values()):
+            if isinstance(obj, TenantBase):
+                db.expunge(obj)
+
+    db.info[TENANT_SCHEMA_KEY] = schema_name
+    if db.in_transaction():
+        db.connection().execution_options(schema_translate_map=tenant_schema_map(schema_name))
+
+
+def pg_error_code(exc: BaseException) -> Optional[str]:
+    """SQLSTATE ของ error จากฐานข้อมูล (DBAPIError) — None ถ้าไม่ใช่หรือไม่ทราบ
+
+    psycopg2 เก็บไว้ที่ orig.pgcode ส่วน asyncpg (ผ่าน adapter ของ SQLAlchemy) ที่ orig.sqlstate
+    หรือที่ exception ต้นทางของ asyncpg — error เดียวกันจึงถูกห่อเป็นคนละ class ตาม driver
+    """
+    orig = getattr(exc, 'orig', None)
+    for source in (orig, getattr(orig, '__cause__', None)):
+        code = getattr(source, 'pgcode', None) or getattr(source, 'sqlstate', None)
+        if code:
+            return code
+    return None
+
+
+@event.listens_for(Session, 'after_begin')
+def _route_tenant_schema(session, transaction, connection):
+    """ทุก transaction ใหม่ของ session (รวมถึง AsyncSession) ได้ map ของ tenant ที่ผูกไว้"""
+    schema_name = session.info.get(TENANT_SCHEMA_KEY)
+    if schema_name:
+        connection.execution_options(schema_translate_map=tenant_schema_map(schema_name))
+
 # --- Session Helper ---
 def get_db_session():
     """
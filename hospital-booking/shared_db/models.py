@@ -1,8 +1,10 @@
 # hospital-booking/shared_db/models.py
 
 from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey,
-                        create_engine, event, Boolean,
+                        create_engine, event, Boolean, DDL, Index, func, literal_column, text,
                         Time, Text, Enum as SQLEnum, JSON, Date, UniqueConstraint, ARRAY)
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.ext.hybrid import hybrid_property
 # from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.orm import relationship, foreign
 from sqlalchemy.schema import CreateSchema
@@ -10,6 +12,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 import enum
 import random
+import re
 import string
 from .database import PublicBase, TenantBase
 
@@ -216,6 +219,29 @@ class DateOverride(TenantBase):
     # Relationships
     template = relationship("AvailabilityTemplate", back_populates="date_overrides")
 
+    __table_args__ = (
+        Index('ix_date_overrides_date_template', 'date', 'template_id'),
+    )
+
+# --- Contact normalization ---
+# email / เบอร์โทรเทียบกันด้วยค่า normalize: email ตัดช่องว่างหัวท้าย + ตัวพิมพ์เล็ก, เบอร์โทรเหลือแต่ตัวเลข
+# ฝั่ง SQL เป็น expression เดียวกับ functional index (ค่าคงที่เป็น literal — asyncpg ส่ง bind แยก
+# ถ้าเป็นพารามิเตอร์ planner จะจับคู่กับ index ไม่ได้)
+
+def normalize_email(value):
+    value = (value or '').strip().lower()
+    return value or None
+
+def normalize_phone(value):
+    digits = re.sub(r'[^0-9]', '', value or '')
+    return digits or None
+
+def email_key(column):
+    return func.lower(func.btrim(column))
+
+def phone_key(column):
+    return func.regexp_replace(column, literal_column("'[^0-9]'"), literal_column("''"), literal_column("'g'"))
+
 class Patient(TenantBase):
     __tablename__ = 'patients'
     
@@ -243,6 +269,29 @@ class Patient(TenantBase):
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
 
+    __table_args__ = (
+        Index('ix_patients_email_normalized', email_key(email)),
+        Index('ix_patients_phone_normalized', phone_key(phone_number)),
+    )
+
+    @hybrid_property
+    def email_normalized(self):
+        return normalize_email(self.email)
+
+    @email_normalized.inplace.expression
+    @classmethod
+    def _email_normalized_expression(cls):
+        return email_key(cls.email)
+
+    @hybrid_property
+    def phone_normalized(self):
+        return normalize_phone(self.phone_number)
+
+    @phone_normalized.inplace.expression
+    @classmethod
+    def _phone_normalized_expression(cls):
+        return phone_key(cls.phone_number)
+
 class ServiceType(TenantBase):
     __tablename__ = 'service_types'
     
@@ -317,6 +366,10 @@ class ProviderSchedule(TenantBase):
     provider = relationship("Provider", back_populates="schedules")
     template = relationship("AvailabilityTemplate", back_populates="provider_schedules")
 
+    __table_args__ = (
+        Index('ix_provider_schedules_template_active_effective', 'template_id', 'is_active', 'effective_date'),
+    )
+
 
 class ProviderLeave(TenantBase):
     """Tracks provider unavailability/leave"""
@@ -334,6 +387,10 @@ class ProviderLeave(TenantBase):
 
     provider = relationship("Provider", back_populates="leaves")
 
+    __table_args__ = (
+        Index('ix_provider_leaves_provider_dates', 'provider_id', 'start_date', 'end_date'),
+    )
+
 
 class ResourceCapacity(TenantBase):
     """Defines room/resource availability for templates"""
@@ -376,9 +433,16 @@ class Holiday(TenantBase):
         onupdate=lambda: datetime.datetime.now(datetime.timezone.utc)
     )
 
+    __table_args__ = (
+        Index('ix_holidays_date_active', 'date', 'is_active'),
+    )
+
     def __repr__(self):
         return f"<Holiday(date='{self.date}', name='{self.name}')>"
 
+# exclusion constraint: provider หนึ่งคนมีนัด confirmed/pending ที่เวลาทับกันไม่ได้ ไม่ว่าจะเป็นบริการใด
+APPOINTMENT_PROVIDER_OVERLAP = 'ex_appointments_provider_overlap'
+
 class Appointment(TenantBase):
     __tablename__ = 'appointments'
     
@@ -410,6 +474,9 @@ class Appointment(TenantBase):
     
     rescheduled_from_id = Column(Integer, ForeignKey('appointments.id'))
     reschedule_count = Column(Integer, default=0)
+
+    # นัดที่สร้างจากการจองแบบต่อเนื่อง (RRULE) — NULL สำหรับนัดเดี่ยว
+    series_id = Column(Integer, ForeignKey('appointment_series.id'), index=True)
     
     created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
@@ -419,6 +486,103 @@ class Appointment(TenantBase):
     event_type = relationship("EventType", back_populates="appointments")
     service_type = relationship("ServiceType", back_populates="appointments")
     rescheduled_from = relationship("Appointment", remote_side=[id])
+    series = relationship("AppointmentSeries", back_populates="appointments")
+
+    __table_args__ = (
+        # GiST index ของ constraint นี้ยังใช้ค้นนัดของ provider ข้าม event type (ดู overlapping)
+        ExcludeConstraint(
+            ('provider_id', '='),
+            (func.tsrange(start_time, end_time), '&&'),
+            using='gist',
+            where=text("provider_id IS NOT NULL AND status IN ('confirmed', 'pending')"),
+            name=APPOINTMENT_PROVIDER_OVERLAP,
+        ),
+        # AvailabilityWindow / ensure_slot_capacity: นัด confirmed/pending ของ event type ที่ทับช่วงเวลา
+        Index('ix_appointments_event_status_time', 'event_type_id', 'status', 'start_time', 'end_time'),
+        # ค้นหานัดด้วย email / เบอร์โทร (search_appointments) เรียงตามเวลานัดล่าสุด
+        Index('ix_appointments_guest_email_normalized', email_key(guest_email), start_time),
+        Index('ix_appointments_guest_phone_normalized', phone_key(guest_phone), start_time),
+        # dashboard: หน้าของแท็บ upcoming/past และ canceled เรียงด้วย (sort key, id) แบบ keyset
+        Index('ix_appointments_start_id', start_time, id),
+        Index('ix_appointments_cancelled_order', status, func.coalesce(cancelled_at, start_time), id),
+    )
+
+    @hybrid_property
+    def cancelled_order(self):
+        """ลำดับของนัดที่ยกเลิก: เวลาที่ยกเลิก (นัดเก่าที่ไม่มีค่านี้ใช้เวลานัด)"""
+        return self.cancelled_at or self.start_time
+
+    @cancelled_order.inplace.expression
+    @classmethod
+    def _cancelled_order_expression(cls):
+        return func.coalesce(cls.cancelled_at, cls.start_time)
+
+    @hybrid_property
+    def guest_email_normalized(self):
+        return normalize_email(self.guest_email)
+
+    @guest_email_normalized.inplace.expression
+    @classmethod
+    def _guest_email_normalized_expression(cls):
+        return email_key(cls.guest_email)
+
+    @hybrid_property
+    def guest_phone_normalized(self):
+        return normalize_phone(self.guest_phone)
+
+    @guest_phone_normalized.inplace.expression
+    @classmethod
+    def _guest_phone_normalized_expression(cls):
+        return phone_key(cls.guest_phone)
+
+    @classmethod
+    def overlapping(cls, range_start, range_end):
+        """เงื่อนไข "ทับช่วง [range_start, range_end)" ในรูป tsrange && tsrange — ตรงกับ expression ของ index"""
+        return func.tsrange(cls.start_time, cls.end_time).op('&&')(func.tsrange(range_start, range_end))
+
+class AppointmentSeries(TenantBase):
+    """ชุดนัดต่อเนื่อง (เช่น จ/พ/ศ 12 สัปดาห์) — เก็บ RRULE ที่ใช้สร้าง นัดแต่ละครั้งอ้างกลับด้วย Appointment.series_id"""
+    __tablename__ = 'appointment_series'
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey('patients.id'))
+    event_type_id = Column(Integer, ForeignKey('event_types.id'), nullable=False)
+    provider_id = Column(Integer, ForeignKey('providers.id'))  # provider ที่ผู้จองระบุ (NULL = ให้ระบบเลือกแต่ละครั้ง)
+
+    rrule = Column(String(255), nullable=False)  # เช่น FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=36
+    dtstart = Column(DateTime, nullable=False)
+    occurrence_count = Column(Integer, nullable=False, default=0)  # จำนวนนัดที่สร้างได้จริง
+
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    patient = relationship("Patient")
+    event_type = relationship("EventType")
+    appointments = relationship("Appointment", back_populates="series")
+
+# ExcludeConstraint ของ appointments ใช้ตัวดำเนินการ = ของ integer ใน GiST index (extension btree_gist)
+# ติดตั้งครั้งเดียวต่อ database — btree_gist เป็น trusted extension เจ้าของ database สร้างได้เอง
+BTREE_GIST_EXTENSION = DDL("CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public")
+event.listen(Appointment.__table__, 'before_create', BTREE_GIST_EXTENSION)
+
+class SlotInventory(TenantBase):
+    """จำนวนที่ว่างของแต่ละ slot ที่คำนวณไว้ล่วงหน้า (opt-in ต่อ tenant — มีตารางนี้ = เปิดใช้)
+
+    สร้างจาก template/availability/capacity/override/schedule ในช่วง max_advance_days
+    การจองเพิ่ม booked ด้วย UPDATE แบบมีเงื่อนไข booked < capacity (ดู shared_db/slot_inventory.py)
+    """
+    __tablename__ = 'slot_inventory'
+
+    id = Column(Integer, primary_key=True)
+    event_type_id = Column(Integer, ForeignKey('event_types.id', ondelete='CASCADE'), nullable=False)
+    slot_start = Column(DateTime, nullable=False)
+    slot_end = Column(DateTime, nullable=False)
+    capacity = Column(Integer, nullable=False)
+    booked = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint('event_type_id', 'slot_start', name='uq_slot_inventory_event_slot'),
+    )
 
 class AuditLog(TenantBase):
     """Log sensitive data access and actions"""
@@ -470,6 +634,7 @@ def receive_after_insert(mapper, connection, target):
         DateOverride.__table__,
         ProviderLeave.__table__,
         Holiday.__table__,
+        AppointmentSeries.__table__,
         Appointment.__table__
     ]
     
@@ -477,6 +642,7 @@ def receive_after_insert(mapper, connection, target):
     
     try:
         TenantBase.metadata.schema = schema_name
+        connection.execute(BTREE_GIST_EXTENSION)
         
         for table in tenant_tables_order:
             table_copy = table.tometadata(TenantBase.metadata, schema=schema_name)
@@ -0,0 +1,53 @@
+# shared_db/redis_client.py - Lazy Redis client with back-off, shared by the caches
+
+"""
+Redis client สำหรับ cache ที่ "ไม่มี Redis ก็ทำงานต่อได้" (availability_cache, worker_cache)
+
+    - สร้าง client ครั้งแรกที่ใช้ (REDIS_HOST / REDIS_PORT / REDIS_DB) — import ได้โดยไม่ต้องมี Redis
+    - timeout 0.5s ทั้ง connect และ socket — Redis ช้าต้องไม่ทำให้ request ช้าตาม
+    - หลัง error ผู้เรียกสั่ง backoff(): client คืน None ไป retry_seconds วินาที แล้วค่อยลองใหม่
+
+แต่ละ cache ถือ instance ของตัวเอง (ช่วงพักแยกกัน) แต่ใช้ค่า timeout / การเชื่อมต่อชุดเดียวกัน
+"""
+
+import logging
+import os
+import time as time_module
+from threading import Lock
+from typing import Optional
+
+from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+SOCKET_TIMEOUT = 0.5
+
+
+class LazyRedis:
+    def __init__(self, name: str, retry_seconds: float):
+        self.name = name
+        self.retry_seconds = retry_seconds
+        self._redis: Optional[Redis] = None
+        self._disabled_until = 0.0
+        self._lock = Lock()
+
+    @property
+    def client(self) -> Optional[Redis]:
+        """client ที่พร้อมใช้ หรือ None ระหว่างพักหลัง error"""
+        if time_module.monotonic() < self._disabled_until:
+            return None
+        if self._redis is None:
+            with self._lock:
+                if self._redis is None:
+                    self._redis = Redis(
+                        host=os.environ.get('REDIS_HOST', 'localhost'),
+                        port=int(os.environ.get('REDIS_PORT', 6379)),
+                        db=int(os.environ.get('REDIS_DB', 0)),
+                        socket_connect_timeout=SOCKET_TIMEOUT,
+                        socket_timeout=SOCKET_TIMEOUT
+                    )
+        return self._redis
+
+    def backoff(self, exc: Exception):
+        logger.warning("%s disabled for %ss: %s", self.name, self.retry_seconds, exc)
+        self._disabled_until = time_module.monotonic() + self.retry_seconds
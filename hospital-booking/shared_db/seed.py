@@ -9,10 +9,10 @@
 
 from datetime import date, time
 
-from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from . import models
+from .database import use_tenant_schema
 
 DEFAULT_TEMPLATE_NAME = "เวลาทำการเริ่มต้น"
 
@@ -54,7 +54,7 @@ def seed_tenant_defaults(db: Session, schema_name: str):
     คืนค่า dict สรุปสิ่งที่สร้าง หรือ None ถ้า schema มีข้อมูลอยู่แล้ว (ไม่ seed ซ้ำ)
     """
     try:
-        db.execute(text(f'SET search_path TO "{schema_name}", public'))
+        use_tenant_schema(db, schema_name)
 
         # Idempotency: tenant ที่เคยตั้งค่าแล้วต้องไม่ถูกเขียนทับ
         if db.query(models.AvailabilityTemplate.id).first() is not None:
@@ -107,8 +107,7 @@ def seed_tenant_defaults(db: Session, schema_name: str):
             notes='Default schedule created automatically',
         ))
 
-        # เก็บค่าก่อน commit — หลัง commit attribute จะ expire และ refresh
-        # อาจวิ่งไปคนละ connection ที่ search_path ไม่ใช่ tenant schema นี้แล้ว
+        # เก็บค่าก่อน commit — หลัง commit attribute จะ expire และ refresh ต้องโหลดใหม่
         summary = {
             'template_id': template.id,
             'availabilities': len(WORKING_DAYS),
@@ -122,5 +121,4 @@ def seed_tenant_defaults(db: Session, schema_name: str):
         db.rollback()
         raise
     finally:
-        db.execute(text('SET search_path TO public'))
-        db.commit()
+        use_tenant_schema(db, None)
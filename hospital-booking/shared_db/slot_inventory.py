@@ -0,0 +1,106 @@
+# shared_db/slot_inventory.py
+"""
+ตัวนับที่ว่างของ slot (ตาราง slot_inventory) — opt-in ต่อ tenant
+
+tenant ที่มีตาราง slot_inventory ใน schema ถือว่าเปิดใช้:
+    - จอง      : UPDATE ... SET booked = booked + 1 WHERE booked < capacity (statement เดียว, row lock กันจองเกิน)
+    - ยกเลิก   : booked - 1 (ไม่ต่ำกว่า 0)
+slot ที่ไม่มีแถว (นอกช่วงที่สร้างไว้) คืน None ให้ผู้เรียกใช้การคำนวณแบบเดิม
+
+ใช้ร่วมกันทั้ง FastAPI (booking.py) และ Flask (ยกเลิก/ขอเลื่อนนัดจากฝั่งเจ้าหน้าที่)
+ทุกฟังก์ชันทำงานใน transaction ของผู้เรียกและ session ต้องผูกกับ tenant ไว้แล้ว (use_tenant_schema) — ไม่ commit เอง
+
+สถานะเปิด/ปิดของ tenant cache ไว้ต่อ process ไม่เกิน _ENABLED_CACHE_SECONDS (ทั้งผลบวกและผลลบ)
+การปิดใช้ (DELETE /slot-inventory) ลบตารางทิ้ง — process อื่นที่ยัง cache ว่าเปิดอยู่จะเจอ UndefinedTable
+UPDATE จึงรันใน SAVEPOINT: ตารางหายถือว่าปิดใช้ (ทิ้งค่า cache และคืน None) โดย transaction ของผู้เรียกยังใช้ต่อได้
+"""
+
+import time as time_module
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import pg_error_code
+
+# schema -> (enabled, checked_at) — ตรวจใหม่ทุก _ENABLED_CACHE_SECONDS เพื่อให้เห็นการเปิด/ปิดจาก process อื่น
+_ENABLED_CACHE_SECONDS = 60
+# 42P01 = undefined_table — ตาราง slot_inventory ถูกลบ (ปิดใช้) จาก process อื่น
+_UNDEFINED_TABLE = '42P01'
+_enabled_cache: Dict[str, Tuple[bool, float]] = {}
+_enabled_lock = Lock()
+
+
+def set_inventory_enabled(schema_name: str, enabled: bool):
+    with _enabled_lock:
+        _enabled_cache[schema_name] = (enabled, time_module.monotonic())
+
+
+def inventory_enabled(db: Session, schema_name: str) -> bool:
+    with _enabled_lock:
+        cached = _enabled_cache.get(schema_name)
+    if cached and time_module.monotonic() - cached[1] < _ENABLED_CACHE_SECONDS:
+        return cached[0]
+
+    enabled = db.execute(
+        text("SELECT to_regclass(:table_name) IS NOT NULL"),
+        {"table_name": f'"{schema_name}".slot_inventory'}
+    ).scalar()
+    set_inventory_enabled(schema_name, bool(enabled))
+    return bool(enabled)
+
+
+def _slot_query(db: Session, event_type_id: int, slot_start: datetime):
+    return db.query(models.SlotInventory).filter(
+        models.SlotInventory.event_type_id == event_type_id,
+        models.SlotInventory.slot_start == slot_start
+    )
+
+
+def _update_counter(db: Session, schema_name: str, update) -> Optional[int]:
+    """รัน UPDATE ของตัวนับใน SAVEPOINT — คืนจำนวนแถว หรือ None ถ้าตารางถูกลบไปแล้ว (ปิดใช้)"""
+    try:
+        with db.begin_nested():
+            return update()
+    except DBAPIError as exc:
+        if pg_error_code(exc) != _UNDEFINED_TABLE:
+            raise
+    set_inventory_enabled(schema_name, False)
+    return None
+
+
+def reserve_slot(db: Session, schema_name: str, event_type_id: int, slot_start: datetime) -> Optional[bool]:
+    """จอง 1 ที่ของ slot: True = สำเร็จ, False = เต็ม, None = ไม่ได้เปิดใช้หรือไม่มีแถวของ slot นี้"""
+    if not inventory_enabled(db, schema_name):
+        return None
+
+    updated = _update_counter(db, schema_name, lambda: _slot_query(db, event_type_id, slot_start).filter(
+        models.SlotInventory.booked < models.SlotInventory.capacity
+    ).update(
+        {models.SlotInventory.booked: models.SlotInventory.booked + 1},
+        synchronize_session=False
+    ))
+    if updated is None:
+        return None
+    if updated:
+        return True
+
+    exists = db.query(_slot_query(db, event_type_id, slot_start).exists()).scalar()
+    return False if exists else None
+
+
+def release_slot(db: Session, schema_name: str, event_type_id: Optional[int], slot_start: Optional[datetime]):
+    """คืน 1 ที่ของ slot (เรียกเมื่อนัด confirmed/pending ถูกยกเลิกหรือย้ายออก)"""
+    if not event_type_id or not slot_start or not inventory_enabled(db, schema_name):
+        return
+
+    _update_counter(db, schema_name, lambda: _slot_query(db, event_type_id, slot_start).filter(
+        models.SlotInventory.booked > 0
+    ).update(
+        {models.SlotInventory.booked: models.SlotInventory.booked - 1},
+        synchronize_session=False
+    ))